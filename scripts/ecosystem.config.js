@@ -34,17 +34,8 @@ module.exports = {
       log_date_format: "YYYY-MM-DD HH:mm:ss Z"
     },
     {
-      name: '🫗 Mug Weight',
-      script: './scripts/start_mug_weight.sh',
-      cwd: '/home/maos/Mugsy/dev/Operator',
-      wait_ready: true,
-      listen_timeout: 10000,
-      kill_timeout: 3000,
-      log_date_format: "YYYY-MM-DD HH:mm:ss Z"
-    },
-    {
-      name: '🌀 Cone Weight',
-      script: './scripts/start_cone_weight.sh',
+      name: '⚖️ Scales',
+      script: './scripts/start_scale_service.sh',
       cwd: '/home/maos/Mugsy/dev/Operator',
       wait_ready: true,
       listen_timeout: 10000,
@@ -1,10 +0,0 @@
-#!/bin/bash
-
-# Activate the virtual environment
-source /home/maos/Mugsy/dev/Operator/venv/bin/activate
-
-# Set PYTHONPATH
-export PYTHONPATH=/home/maos/Mugsy/dev/Operator:$PYTHONPATH
-
-# Start watchtower
-python3 src/operator_services/mug_scale_service.py
\ No newline at end of file
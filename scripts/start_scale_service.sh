@@ -6,5 +6,5 @@ source /home/maos/Mugsy/dev/Operator/venv/bin/activate
 # Set PYTHONPATH
 export PYTHONPATH=/home/maos/Mugsy/dev/Operator:$PYTHONPATH
 
-# Start watchtower
-python3 src/operator_services/cone_scale_service.py
\ No newline at end of file
+# Start the scale service (serves every scale in hardware_config.ini)
+python3 src/operator_services/scale_service.py
\ No newline at end of file
@@ -19,6 +19,7 @@ setup(
         'httpx==0.27.0',
         'idna==3.7',
         'iniconfig==2.0.0',
+        'numpy==1.24.4',
         'packaging==24.0',
         'pigpio==1.78',
         'pluggy==1.5.0',
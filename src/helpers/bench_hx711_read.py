@@ -0,0 +1,59 @@
+import argparse
+import statistics
+import sys
+import os
+import time
+import pigpio
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'operator_services'))
+from libs.hx711 import HX711
+
+# Compares the bit-banged and pigpio-script read paths of libs/hx711.py.
+# "clock out" is the time spent transferring the 24 bits once DOUT is ready,
+# which is the part the read mode changes; "samples/s" is end to end and is
+# capped by the chip's output data rate (10 or 80 SPS).
+#
+# Usage: python src/helpers/bench_hx711_read.py --dout 5 --sck 6 --samples 200
+
+def bench(pi, args, read_mode: str) -> None:
+    hx = HX711(pi, args.dout, args.sck, ready_mode=args.ready_mode, read_mode=read_mode)
+    clock_out_bits = hx._clock_out_script if read_mode == 'script' else hx._clock_out_bitbang
+    clock_out = []
+    failures = 0
+    try:
+        start = time.perf_counter()
+        for _ in range(args.samples):
+            if not hx.wait_ready():
+                failures += 1
+                continue
+            t0 = time.perf_counter()
+            if clock_out_bits() is False:
+                failures += 1
+                continue
+            clock_out.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - start
+    finally:
+        hx.cleanup()
+
+    ms = sorted(t * 1000 for t in clock_out)
+    print(f"{read_mode:<8} samples/s={len(clock_out) / elapsed:7.1f} "
+          f"clock out mean={statistics.mean(ms):6.3f}ms p50={statistics.median(ms):6.3f}ms "
+          f"max={ms[-1]:6.3f}ms failures={failures}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HX711 read path microbenchmark")
+    parser.add_argument("--dout", type=int, default=5)
+    parser.add_argument("--sck", type=int, default=6)
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--ready-mode", choices=["poll", "callback"], default="callback")
+    args = parser.parse_args()
+
+    pi = pigpio.pi()
+    if not pi.connected:
+        print("Failed to connect to pigpio daemon.")
+        sys.exit(1)
+    try:
+        for mode in ("bitbang", "script"):
+            bench(pi, args, mode)
+    finally:
+        pi.stop()
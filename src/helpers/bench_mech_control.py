@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+# Throughput and latency of the mech-control socket. Run it against the real
+# board or against src/helpers/mech_control_emulator.py (with --time-scale to
+# shorten the moves). "single" sends one command per request and reports the
+# round trip; "batch" and "pipelined" send the whole sequence in one request
+# and report the total time, so the two show what streaming ahead saves.
+#
+# Usage: python src/helpers/bench_mech_control.py --count 50 --steps 200 --speed 4000
+
+async def request(reader, writer, payload):
+    writer.write((json.dumps(payload) + '\n').encode())
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+def count_errors(responses) -> int:
+    return sum(1 for response in responses if response.get('status') == 'error')
+
+async def main(args) -> None:
+    reader, writer = await asyncio.open_unix_connection(args.socket)
+    move = {'command': 'move_cone', 'steps': args.steps, 'speed': args.speed, 'direction': 0}
+    try:
+        latencies = []
+        errors = 0
+        for _ in range(args.count):
+            t0 = time.perf_counter()
+            errors += count_errors(await request(reader, writer, move))
+            latencies.append((time.perf_counter() - t0) * 1000)
+        latencies.sort()
+        print(f"single     n={args.count} p50={statistics.median(latencies):8.2f}ms "
+              f"p95={latencies[int(len(latencies) * 0.95) - 1]:8.2f}ms "
+              f"total={sum(latencies) / 1000:6.2f}s errors={errors}")
+
+        for mode, payload in (("batch", [move] * args.count),
+                              ("pipelined", {'pipelined': True, 'commands': [move] * args.count})):
+            t0 = time.perf_counter()
+            responses = await request(reader, writer, payload)
+            elapsed = time.perf_counter() - t0
+            print(f"{mode:<10} n={args.count} total={elapsed:6.2f}s "
+                  f"per command={elapsed / args.count * 1000:8.2f}ms errors={count_errors(responses)}")
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="mech-control socket benchmark")
+    parser.add_argument("--socket", default="/tmp/mech-control.sock")
+    parser.add_argument("--count", type=int, default=50)
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--speed", type=int, default=4000)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,72 @@
+import argparse
+import asyncio
+import json
+import os
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+from operator_app.api.v1.pump.pump_service_client import PumpServiceClient
+
+# How long pump calls stall the API's event loop. A ticker task measures how
+# late each 1 ms sleep wakes up while pump commands run on the same loop:
+# "blocking" is the old client (synchronous connect/send/recv called straight
+# from an async handler), "async" is the pooled asyncio client. Stall time is
+# the total lateness beyond the tick, i.e. time other handlers (like the
+# weight WebSockets) could not run.
+#
+# Usage: python src/helpers/bench_pump_client_stall.py --commands 500
+
+TICK = 0.001
+
+def blocking_send(path: str, command: dict) -> dict:
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        client.connect(path)
+        client.sendall((json.dumps(command) + '\n').encode('utf-8'))
+        with client.makefile('rb') as stream:
+            return json.loads(stream.readline())
+
+async def ticker(stop: asyncio.Event, lateness: list) -> None:
+    while not stop.is_set():
+        t0 = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lateness.append(max(0.0, time.perf_counter() - t0 - TICK))
+
+async def run(mode: str, args) -> None:
+    command = {'action': 'status'}
+    client = PumpServiceClient(args.socket)
+    stop = asyncio.Event()
+    lateness = []
+    tick_task = asyncio.create_task(ticker(stop, lateness))
+    await asyncio.sleep(0.05)
+
+    async def one_request():
+        if mode == 'blocking':
+            blocking_send(args.socket, command)
+        else:
+            await client.send_command(command)
+
+    start = time.perf_counter()
+    for _ in range(args.commands // args.concurrency):
+        await asyncio.gather(*(one_request() for _ in range(args.concurrency)))
+        # Give the ticker a turn between batches, as real handlers would
+        await asyncio.sleep(0)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    await client.close()
+
+    print(f"{mode:<9} commands={args.commands} total={elapsed:.3f}s "
+          f"loop stall={sum(lateness) * 1000:8.2f}ms worst tick={max(lateness) * 1000:6.2f}ms")
+
+async def main(args) -> None:
+    for mode in ('blocking', 'async'):
+        await run(mode, args)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Event-loop stall caused by pump client calls")
+    parser.add_argument("--socket", default="/tmp/pump_control.sock")
+    parser.add_argument("--commands", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=4)
+    asyncio.run(main(parser.parse_args()))
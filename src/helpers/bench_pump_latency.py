@@ -0,0 +1,65 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+# Latency of pump speed changes while other clients poll the pump status,
+# e.g. the dashboard polling while a recipe adjusts the flow rate. Pollers keep
+# persistent connections and hammer "status"; the measured client sends
+# control_speed commands and records each round trip. --reconnect opens a new
+# connection per command, which is what every client used to do.
+#
+# Usage: python src/helpers/bench_pump_latency.py --pollers 4 --commands 200
+
+async def call(reader, writer, command):
+    writer.write((json.dumps(command) + '\n').encode())
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+async def poll_status(path: str, stop: asyncio.Event, counter: list) -> None:
+    reader, writer = await asyncio.open_unix_connection(path)
+    try:
+        while not stop.is_set():
+            await call(reader, writer, {'action': 'status'})
+            counter[0] += 1
+    finally:
+        writer.close()
+
+async def measure(args) -> None:
+    stop = asyncio.Event()
+    polls = [0]
+    pollers = [asyncio.create_task(poll_status(args.socket, stop, polls)) for _ in range(args.pollers)]
+    command = {'action': 'control_speed', 'params': {'direction': 'forward', 'speed': args.speed}}
+
+    latencies = []
+    reader, writer = await asyncio.open_unix_connection(args.socket)
+    start = time.perf_counter()
+    try:
+        for _ in range(args.commands):
+            t0 = time.perf_counter()
+            if args.reconnect:
+                writer.close()
+                reader, writer = await asyncio.open_unix_connection(args.socket)
+            await call(reader, writer, command)
+            latencies.append((time.perf_counter() - t0) * 1000)
+        elapsed = time.perf_counter() - start
+        await call(reader, writer, {'action': 'stop'})
+    finally:
+        writer.close()
+        stop.set()
+        await asyncio.gather(*pollers, return_exceptions=True)
+
+    latencies.sort()
+    print(f"pollers={args.pollers} reconnect={args.reconnect} "
+          f"p50={statistics.median(latencies):.3f}ms p95={latencies[int(len(latencies) * 0.95) - 1]:.3f}ms "
+          f"max={latencies[-1]:.3f}ms status polls/s={polls[0] / elapsed:.0f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Pump service latency under concurrent status polling")
+    parser.add_argument("--socket", default="/tmp/pump_control.sock")
+    parser.add_argument("--pollers", type=int, default=4)
+    parser.add_argument("--commands", type=int, default=200)
+    parser.add_argument("--speed", type=int, default=60)
+    parser.add_argument("--reconnect", action="store_true", help="Open a new connection for every command")
+    asyncio.run(measure(parser.parse_args()))
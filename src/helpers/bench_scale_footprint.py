@@ -0,0 +1,99 @@
+import argparse
+import asyncio
+import os
+import time
+
+# Reports resident memory and CPU use of the scale service processes, in total
+# and per scale, optionally while a client streams from every scale socket.
+# Run it once against the old per-scale processes and once against the
+# combined scale_service.py to compare the two setups.
+#
+# Usage:
+#   python src/helpers/bench_scale_footprint.py --match scale_service --scales 2 \
+#       --stream /tmp/cone_scale_service.sock /tmp/mug_scale_service.sock
+
+CLOCK_TICKS = os.sysconf(os.sysconf_names['SC_CLK_TCK'])
+
+def find_pids(pattern: str) -> list:
+    pids = []
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f'/proc/{entry}/cmdline', 'rb') as f:
+                argv = f.read().decode(errors='ignore').split('\0')
+        except OSError:
+            continue
+        cmdline = ' '.join(argv)
+        # Only the interpreters themselves: wrappers such as pm2's shell scripts or
+        # `timeout` carry the same command line but none of the footprint
+        if 'python' not in os.path.basename(argv[0]):
+            continue
+        if pattern in cmdline and 'bench_scale_footprint' not in cmdline:
+            pids.append(int(entry))
+    return pids
+
+def rss_kb(pid: int) -> int:
+    with open(f'/proc/{pid}/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1])
+    return 0
+
+def cpu_seconds(pid: int) -> float:
+    with open(f'/proc/{pid}/stat') as f:
+        fields = f.read().rsplit(')', 1)[1].split()
+    # utime and stime are fields 14 and 15 of /proc/<pid>/stat
+    return (int(fields[11]) + int(fields[12])) / CLOCK_TICKS
+
+async def stream(socket_path: str) -> None:
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    writer.write(b"stream_start\n")
+    await writer.drain()
+    try:
+        while await reader.readline():
+            pass
+    finally:
+        writer.close()
+
+async def main(args) -> None:
+    pids = args.pids or []
+    for pattern in args.match or []:
+        pids.extend(find_pids(pattern))
+    if not pids:
+        raise SystemExit("No matching processes found")
+
+    streams = [asyncio.create_task(stream(path)) for path in args.stream or []]
+    await asyncio.sleep(args.warmup)
+
+    start_cpu = {pid: cpu_seconds(pid) for pid in pids}
+    start = time.monotonic()
+    await asyncio.sleep(args.duration)
+    elapsed = time.monotonic() - start
+
+    for task in streams:
+        task.cancel()
+    # Let the streams close their connections before the loop goes away
+    await asyncio.gather(*streams, return_exceptions=True)
+
+    total_rss = 0
+    total_cpu = 0.0
+    for pid in pids:
+        rss = rss_kb(pid)
+        cpu = (cpu_seconds(pid) - start_cpu[pid]) / elapsed * 100
+        total_rss += rss
+        total_cpu += cpu
+        print(f"pid {pid:<8} rss={rss / 1024:7.1f} MiB cpu={cpu:6.2f}%")
+
+    print(f"total         rss={total_rss / 1024:7.1f} MiB cpu={total_cpu:6.2f}%")
+    print(f"per scale     rss={total_rss / 1024 / args.scales:7.1f} MiB cpu={total_cpu / args.scales:6.2f}%")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scale service memory and CPU footprint")
+    parser.add_argument("--pids", nargs="+", type=int)
+    parser.add_argument("--match", nargs="+", help="Substrings of the service command lines")
+    parser.add_argument("--scales", type=int, default=2, help="Number of scales served by the processes")
+    parser.add_argument("--stream", nargs="+", help="Scale sockets to stream from during the measurement")
+    parser.add_argument("--warmup", type=float, default=2.0)
+    parser.add_argument("--duration", type=float, default=30.0)
+    asyncio.run(main(parser.parse_args()))
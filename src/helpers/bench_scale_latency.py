@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+# Measures how long scale service commands take to answer, first with the
+# service idle and then while another client is streaming. With the reads on
+# the acquisition thread both runs should report roughly the same latency.
+#
+# Usage: python src/helpers/bench_scale_latency.py --socket /tmp/mug_scale_service.sock
+
+async def send_command(reader, writer, command: str) -> float:
+    start = time.perf_counter()
+    writer.write((command + "\n").encode())
+    await writer.drain()
+    response = await reader.readline()
+    elapsed = time.perf_counter() - start
+    if not response:
+        raise ConnectionError("Scale service closed the connection")
+    json.loads(response.decode())
+    return elapsed
+
+async def measure(socket_path: str, command: str, iterations: int) -> list:
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    try:
+        return [await send_command(reader, writer, command) for _ in range(iterations)]
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def stream(socket_path: str, ready: asyncio.Event) -> int:
+    reader, writer = await asyncio.open_unix_connection(socket_path)
+    frames = 0
+    try:
+        writer.write(b"stream_start\n")
+        await writer.drain()
+        while True:
+            if not await reader.readline():
+                break
+            frames += 1
+            ready.set()
+    except asyncio.CancelledError:
+        pass
+    finally:
+        writer.close()
+    return frames
+
+def summarize(label: str, samples: list) -> None:
+    ms = sorted(s * 1000 for s in samples)
+    p95 = ms[int(len(ms) * 0.95) - 1] if len(ms) >= 20 else ms[-1]
+    print(f"{label:<28} n={len(ms):<4} mean={statistics.mean(ms):8.2f}ms "
+          f"p50={statistics.median(ms):8.2f}ms p95={p95:8.2f}ms max={ms[-1]:8.2f}ms")
+
+async def main(args) -> None:
+    for command in args.commands:
+        summarize(f"{command} (idle)", await measure(args.socket, command, args.iterations))
+
+    ready = asyncio.Event()
+    stream_task = asyncio.create_task(stream(args.socket, ready))
+    await asyncio.wait_for(ready.wait(), timeout=30)
+    try:
+        for command in args.commands:
+            summarize(f"{command} (streaming)", await measure(args.socket, command, args.iterations))
+    finally:
+        stream_task.cancel()
+        frames = await stream_task
+    print(f"Streaming client received {frames} frames during the run")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Scale service command latency benchmark")
+    parser.add_argument("--socket", default="/tmp/mug_scale_service.sock")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--commands", nargs="+", default=["ping", "single_read"])
+    asyncio.run(main(parser.parse_args()))
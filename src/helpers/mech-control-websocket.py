@@ -2,6 +2,7 @@ import asyncio
 import websockets
 import json
 import os
+import itertools
 import logging
 from typing import Any, Dict, List
 
@@ -9,28 +10,108 @@ from typing import Any, Dict, List
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+RECONNECT_DELAYS = (0.1, 0.25, 0.5, 1.0, 2.0)
+
 class WebSocketRelayServer:
     def __init__(self, websocket_port: int = 8765, unix_socket_path: str = "/tmp/mech-control.sock"):
         self.websocket_port = websocket_port
         self.unix_socket_path = unix_socket_path
 
-    async def send_to_unix_socket(self, message: str) -> str:
+        # One long-lived connection to the mech-control service shared by every WebSocket
+        # client. Requests are tagged with an id and replies are routed back by it.
+        self._reader = None
+        self._writer = None
+        self._read_task = None
+        # Made on first use: before Python 3.10 a lock made here binds to the wrong loop
+        self._connect_lock = None
+        self._request_ids = itertools.count(1)
+        self._pending: Dict[int, asyncio.Queue] = {}
+
+    async def connect(self) -> None:
+        if self._connect_lock is None:
+            self._connect_lock = asyncio.Lock()
+        async with self._connect_lock:
+            if self._writer is not None and not self._writer.is_closing():
+                return
+            for attempt, delay in enumerate(RECONNECT_DELAYS, start=1):
+                try:
+                    self._reader, self._writer = await asyncio.open_unix_connection(self.unix_socket_path)
+                    break
+                except OSError as e:
+                    # The mech service may be restarting
+                    if attempt == len(RECONNECT_DELAYS):
+                        raise ConnectionError(f"Could not connect to {self.unix_socket_path}: {e}")
+                    await asyncio.sleep(delay)
+            self._read_task = asyncio.create_task(self._read_responses(self._reader))
+            logger.info(f"Connected to {self.unix_socket_path}")
+
+    async def _read_responses(self, reader: asyncio.StreamReader) -> None:
         try:
-            reader, writer = await asyncio.open_unix_connection(self.unix_socket_path)
-            try:
-                writer.write((message + '\n').encode())
-                await writer.drain()
-
-                response = await reader.readline()
-                if not response:
-                    raise ConnectionError("No response from UNIX socket")
-                return response.decode().strip()
-            finally:
-                writer.close()
-                await writer.wait_closed()
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                data = json.loads(line)
+                queue = self._pending.get(data.pop('id', None)) if isinstance(data, dict) else None
+                if queue is None:
+                    logger.warning(f"Dropping response with no waiting request: {data}")
+                    continue
+                queue.put_nowait(data)
         except Exception as e:
-            logger.error(f"Error communicating with UNIX socket: {e}", exc_info=True)
-            raise
+            logger.error(f"Error reading from UNIX socket: {e}", exc_info=True)
+        finally:
+            logger.warning("Connection to the mech-control service closed; reconnecting on next request")
+            if self._writer is not None:
+                self._writer.close()
+            self._writer = None
+            # Requests in flight cannot be resumed on a new connection
+            for queue in self._pending.values():
+                queue.put_nowait(ConnectionError("Connection to the mech-control service was lost"))
+
+    async def _exchange(self, request: Any):
+        """
+        Send a request on the shared connection and yield the replies tagged with its id.
+        """
+        await self.connect()
+        request_id = next(self._request_ids)
+        if isinstance(request, list):
+            request = {'commands': request}
+        request = dict(request, id=request_id)
+
+        queue = asyncio.Queue()
+        self._pending[request_id] = queue
+        try:
+            self._writer.write((json.dumps(request) + '\n').encode())
+            await self._writer.drain()
+            while True:
+                reply = await queue.get()
+                if isinstance(reply, Exception):
+                    raise reply
+                yield reply
+        finally:
+            del self._pending[request_id]
+
+    async def send_to_unix_socket(self, request: Any) -> Any:
+        # Close the exchange as soon as the reply is in, so its id is released
+        replies = self._exchange(request)
+        try:
+            async for reply in replies:
+                return reply.get('responses', reply)
+        finally:
+            await replies.aclose()
+
+    async def stream_from_unix_socket(self, request: Dict[str, Any]):
+        """
+        Yield each line of a streamed batch, ending with its summary (or an error).
+        """
+        replies = self._exchange(request)
+        try:
+            async for reply in replies:
+                yield reply
+                if 'summary' in reply or 'error' in reply:
+                    break
+        finally:
+            await replies.aclose()
 
     async def handle_websocket(self, websocket: websockets.WebSocketServerProtocol) -> None:
         try:
@@ -40,16 +121,26 @@ class WebSocketRelayServer:
                     commands = json.loads(message)
                     logger.info(f"Received WebSocket message: {commands}")
 
-                    # Convert single command to list if necessary
-                    if not isinstance(commands, list):
+                    # Batches with options ({"pipelined": true, "commands": [...]}) are forwarded as is
+                    request = commands
+                    if isinstance(commands, dict) and 'commands' in commands:
+                        commands = commands['commands']
+                    elif not isinstance(commands, list):
+                        # Convert single command to list if necessary
                         commands = [commands]
+                        request = commands
 
-                    # Forward to Unix socket
-                    response = await self.send_to_unix_socket(json.dumps(commands))
-                    logger.info(f"Received response from UNIX socket: {response}")
+                    if isinstance(request, dict) and request.get('stream'):
+                        # Forward per-command progress as it arrives
+                        async for update in self.stream_from_unix_socket(request):
+                            await websocket.send(json.dumps(update))
+                        continue
 
-                    # Parse the response from UNIX socket
-                    response_data = json.loads(response)
+                    # Forward to Unix socket
+                    response_data = await self.send_to_unix_socket(request)
+                    logger.info(f"Received response from UNIX socket: {response_data}")
+                    if isinstance(response_data, dict) and 'error' in response_data:
+                        raise Exception(response_data['error'])
 
                     # Create ack message
                     total_commands = len(commands)
@@ -0,0 +1,203 @@
+import argparse
+import logging
+import os
+import pty
+import select
+import struct
+import sys
+import time
+import tty
+from collections import deque
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'operator_services'))
+from mech_motion import HOMING_BACKOFF_DEGREES, HOMING_SPEED, SPOUT_STEPS_PER_DEGREE, move_duration
+
+# Emulates microcontroller/mech-control.ino on a pseudo-terminal so the
+# mech-control service and its benchmarks can run without an Arduino. It
+# speaks the same CmdMessenger command table and binary argument format, keeps
+# the firmware's 20-entry command ring (19 usable slots), dequeues only when
+# both steppers are idle and acknowledges a move when it starts, as the
+# firmware does. Motion times come from the AccelStepper profile in
+# mech_motion; zero_spout blocks the loop while homing, like zeroSpoutStepper().
+#
+# Usage: python src/helpers/mech_control_emulator.py --link /tmp/mech-control-tty
+#        MECH_CONTROL_SERIAL_PORT=/tmp/mech-control-tty python src/operator_services/mech_control.service.py
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+FIELD_SEP = ord(',')
+COMMAND_SEP = ord(';')
+ESCAPE = ord('/')
+
+# Command ids and binary argument formats, in the firmware's enum order
+MOVE_CONE, CONE_DONE, MOVE_SPOUT, SPOUT_DONE, MOVE_BOTH, BOTH_DONE, ZERO_SPOUT, ZERO_DONE, ERROR = range(9)
+# (ArduinoBoard sizes: int is 2 bytes, long is 4, little-endian)
+ARG_FORMATS = {
+    MOVE_CONE: 'lhh',
+    MOVE_SPOUT: 'lhh',
+    MOVE_BOTH: 'lhlhh',
+    ZERO_SPOUT: '',
+}
+ACKS = {MOVE_CONE: CONE_DONE, MOVE_SPOUT: SPOUT_DONE, MOVE_BOTH: BOTH_DONE, ZERO_SPOUT: ZERO_DONE}
+
+QUEUE_SIZE = 20
+SPOUT_MAX_SPEED = 2000
+
+def escape(data: bytes) -> bytes:
+    out = bytearray()
+    for byte in data:
+        if byte in (FIELD_SEP, COMMAND_SEP, ESCAPE):
+            out.append(ESCAPE)
+        out.append(byte)
+    return bytes(out)
+
+class FirmwareEmulator:
+    """
+    State machine for one emulated board, talking over the pty master `fd`.
+    time_scale < 1 runs the motion faster than real time, and
+    spout_start_degrees is where the spout sits at power-on, before homing.
+    """
+    def __init__(self, fd: int, time_scale: float = 1.0, spout_start_degrees: float = 0.0):
+        self.fd = fd
+        self.time_scale = time_scale
+        self.queue = deque()
+        self.zeroed = False
+        self.cone_busy_until = 0.0
+        self.spout_busy_until = 0.0
+        self.spout_position = spout_start_degrees * SPOUT_STEPS_PER_DEGREE
+        self.spout_max_speed = SPOUT_MAX_SPEED
+        self._fields = [bytearray()]
+        self._escaped = False
+        self.running = True
+
+    def send(self, command_id: int, *fields: bytes) -> None:
+        frame = b','.join([str(command_id).encode('ascii')] + [escape(f) for f in fields]) + b';'
+        os.write(self.fd, frame)
+
+    def feed(self, data: bytes) -> None:
+        for byte in data:
+            if self._escaped:
+                self._fields[-1].append(byte)
+                self._escaped = False
+            elif byte == ESCAPE:
+                self._escaped = True
+            elif byte == FIELD_SEP:
+                self._fields.append(bytearray())
+            elif byte == COMMAND_SEP:
+                fields, self._fields = self._fields, [bytearray()]
+                self.on_command(fields)
+            else:
+                self._fields[-1].append(byte)
+
+    def on_command(self, fields) -> None:
+        try:
+            command_id = int(fields[0].strip())
+            formats = ARG_FORMATS[command_id]
+        except (ValueError, KeyError):
+            logger.warning(f"Ignoring unknown command frame: {fields}")
+            return
+        if len(self.queue) >= QUEUE_SIZE - 1:
+            self.send(ERROR, b"Queue full")
+            return
+        if command_id in (MOVE_SPOUT, MOVE_BOTH) and not self.zeroed:
+            self.send(ERROR, b"Spout not zeroed")
+            return
+        try:
+            args = [struct.unpack('<' + fmt, bytes(field))[0] for fmt, field in zip(formats, fields[1:])]
+        except struct.error:
+            logger.warning(f"Ignoring malformed arguments: {fields}")
+            return
+        self.queue.append((command_id, args))
+
+    def idle(self, now: float) -> bool:
+        return now >= self.cone_busy_until and now >= self.spout_busy_until
+
+    def next_wakeup(self, now: float) -> float:
+        if not self.queue:
+            return None
+        return max(0.0, self.cone_busy_until - now, self.spout_busy_until - now)
+
+    def step(self, now: float) -> None:
+        if self.queue and self.idle(now):
+            command_id, args = self.queue.popleft()
+            self.execute(command_id, args, now)
+
+    def move_spout_to(self, degrees: int, speed: int, now: float) -> None:
+        target = int(degrees * SPOUT_STEPS_PER_DEGREE)
+        self.spout_max_speed = abs(speed)
+        self.spout_busy_until = now + move_duration(target - self.spout_position, speed) * self.time_scale
+        self.spout_position = target
+
+    def execute(self, command_id: int, args, now: float) -> None:
+        if command_id == ZERO_SPOUT:
+            self.home_spout()
+        elif command_id == MOVE_CONE:
+            steps, speed, _ = args
+            self.cone_busy_until = now + move_duration(steps, speed) * self.time_scale
+        elif command_id == MOVE_SPOUT:
+            degrees, speed, _ = args
+            self.move_spout_to(degrees, speed, now)
+        elif command_id == MOVE_BOTH:
+            cone_steps, cone_speed, spout_degrees, spout_speed, _ = args
+            self.cone_busy_until = now + move_duration(cone_steps, cone_speed) * self.time_scale
+            self.move_spout_to(spout_degrees, spout_speed, now)
+        self.send(ACKS[command_id])
+
+    def home_spout(self) -> None:
+        # Run at constant speed up to the switch, then back off 41° and call that zero;
+        # the firmware loop is blocked the whole time, so serial input just piles up
+        switch = HOMING_BACKOFF_DEGREES * SPOUT_STEPS_PER_DEGREE
+        seconds = abs(switch - self.spout_position) / HOMING_SPEED
+        seconds += move_duration(switch, self.spout_max_speed)
+        time.sleep(seconds * self.time_scale)
+        self.spout_position = 0
+        self.zeroed = True
+
+    def stop(self) -> None:
+        # run() notices on its next wakeup; closing the pty slave wakes it straight away
+        self.running = False
+
+    def run(self) -> None:
+        while self.running:
+            now = time.monotonic()
+            self.step(now)
+            ready, _, _ = select.select([self.fd], [], [], self.next_wakeup(time.monotonic()))
+            if ready:
+                try:
+                    data = os.read(self.fd, 1024)
+                except OSError:
+                    # The other end closed the port; wait for it to be reopened
+                    time.sleep(0.05)
+                    continue
+                self.feed(data)
+
+def open_pty(link: str = None):
+    master, slave = pty.openpty()
+    tty.setraw(slave)
+    path = os.ttyname(slave)
+    if link:
+        if os.path.lexists(link):
+            os.unlink(link)
+        os.symlink(path, link)
+        path = link
+    # Keep the slave open so the port stays usable between client connections
+    return master, slave, path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="mech-control firmware emulator on a pseudo-terminal")
+    parser.add_argument("--link", help="Create a symlink to the emulated port at this path")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Multiply all motion times by this factor")
+    parser.add_argument("--spout-start", type=float, default=90.0,
+                        help="Spout position at power-on, in degrees from zero")
+    args = parser.parse_args()
+
+    master, slave, path = open_pty(args.link)
+    logger.info(f"Emulated mech-control board on {path}")
+    try:
+        FirmwareEmulator(master, args.time_scale, args.spout_start).run()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if args.link and os.path.islink(args.link):
+            os.unlink(args.link)
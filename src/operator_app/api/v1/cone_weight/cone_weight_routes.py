@@ -1,6 +1,6 @@
 import logging
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from .cone_weight_service import start_weight_stream, get_current_weight, zero_scale
+from .cone_weight_service import start_weight_stream, get_current_weight, zero_scale, wait_for_settled, get_flow_rate
 
 router = APIRouter()
 
@@ -21,6 +21,14 @@ async def websocket_endpoint(websocket: WebSocket):
 async def get_weight():
     return await get_current_weight()
 
+@router.get("/flow-rate")
+async def get_weight_flow_rate(window: float = 1.0):
+    return await get_flow_rate(window)
+
+@router.get("/settled")
+async def get_settled_weight(tolerance: float = 0.1, duration: float = 0.5, timeout: float = 10.0):
+    return await wait_for_settled(tolerance, duration, timeout)
+
 @router.post("/zero")
 async def zero_weight_scale():
     return await zero_scale()
\ No newline at end of file
@@ -9,13 +9,24 @@ logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %
 
 class Settings(BaseSettings):
     WEIGHT_SERVICE_SOCKET: str = "/tmp/mug_scale_service.sock"
+    STREAM_MAX_RATE: float = 10.0
+    STREAM_MIN_DELTA: float = 0.05
+    STREAM_HEARTBEAT: float = 1.0
 
 settings = Settings()
 
 async def start_weight_stream(websocket):
     try:
         reader, writer = await asyncio.open_unix_connection(settings.WEIGHT_SERVICE_SOCKET)
-        writer.write(b"stream_start\n")
+        # The dashboard shows weight from zero when the stream opens, so ask for the tare
+        command = {
+            "command": "stream_start",
+            "zero": True,
+            "max_rate": settings.STREAM_MAX_RATE,
+            "min_delta": settings.STREAM_MIN_DELTA,
+            "heartbeat": settings.STREAM_HEARTBEAT,
+        }
+        writer.write((json.dumps(command) + "\n").encode())
         await writer.drain()
         
         while True:
@@ -108,4 +119,51 @@ async def zero_scale():
         return {"error": "Invalid response from weight service"}
     except Exception as e:
         logging.error(f"Error zeroing scale: {e}", exc_info=True)
-        return {"error": "Failed to zero scale"}
\ No newline at end of file
+        return {"error": "Failed to zero scale"}
+
+async def wait_for_settled(tolerance: float = 0.1, duration: float = 0.5, timeout: float = 10.0):
+    try:
+        reader, writer = await asyncio.open_unix_connection(settings.WEIGHT_SERVICE_SOCKET)
+        command = {"command": "wait_settled", "tolerance": tolerance, "duration": duration, "timeout": timeout}
+        writer.write((json.dumps(command) + "\n").encode())
+        await writer.drain()
+
+        response = await asyncio.wait_for(reader.readline(), timeout=timeout + 5.0)
+
+        writer.close()
+        await writer.wait_closed()
+
+        data = json.loads(response.decode().strip())
+        return data
+    except asyncio.TimeoutError:
+        logging.error("Timeout while waiting for weight service response")
+        return {"error": "Weight service timed out"}
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding JSON: {e}")
+        return {"error": "Invalid response from weight service"}
+    except Exception as e:
+        logging.error(f"Error waiting for scale to settle: {e}", exc_info=True)
+        return {"error": "Failed to wait for scale to settle"}
+
+async def get_flow_rate(window: float = 1.0):
+    try:
+        reader, writer = await asyncio.open_unix_connection(settings.WEIGHT_SERVICE_SOCKET)
+        writer.write((json.dumps({"command": "flow_rate", "window": window}) + "\n").encode())
+        await writer.drain()
+
+        response = await asyncio.wait_for(reader.readline(), timeout=5.0)
+
+        writer.close()
+        await writer.wait_closed()
+
+        data = json.loads(response.decode().strip())
+        return data
+    except asyncio.TimeoutError:
+        logging.error("Timeout while waiting for weight service response")
+        return {"error": "Weight service timed out"}
+    except json.JSONDecodeError as e:
+        logging.error(f"Error decoding JSON: {e}")
+        return {"error": "Invalid response from weight service"}
+    except Exception as e:
+        logging.error(f"Error getting flow rate: {e}", exc_info=True)
+        return {"error": "Failed to get flow rate"}
\ No newline at end of file
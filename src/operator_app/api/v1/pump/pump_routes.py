@@ -3,12 +3,16 @@ from fastapi import APIRouter, HTTPException, Depends
 from operator_app.auth import auth_handler
 from pydantic import BaseModel, Field
 from enum import Enum
+from typing import Literal
 import configparser
-from .pump_service_client import PumpControl, PumpSpeedControl, control_pump, control_pump_speed, get_pump_status
+import os
+from .pump_service_client import (PumpControl, PumpSpeedControl, PumpRamp, PourToWeight, Dispense, control_pump,
+                                  control_pump_speed, dispense, get_pump_calibration, get_pump_status,
+                                  pour_to_weight, ramp_pump)
 
 # Load configurations
 config = configparser.ConfigParser()
-config.read('hardware_config.ini')
+config.read(os.path.join('src', 'operator_app', 'hardware_config.ini'))
 min_flow_rate = config.getint('PUMP', 'MIN_FLOW_RATE', fallback=40)
 
 class PumpDirection(str, Enum):
@@ -21,14 +25,30 @@ class PumpControl(BaseModel):
 
 class PumpSpeedControl(BaseModel):
     direction: PumpDirection
-    speed: int = Field(..., ge=min_flow_rate, le=100, description=f"Flow rate from {min_flow_rate} to 100")
+    speed: float = Field(..., ge=min_flow_rate, le=100, description=f"Flow rate from {min_flow_rate} to 100")
+
+class PumpRamp(BaseModel):
+    direction: Literal[PumpDirection.forward, PumpDirection.reverse]
+    speed: float = Field(..., ge=0, le=100, description="Speed to ramp to; 0 ramps down and stops the pump")
+    duration: float = Field(..., gt=0, description="Seconds the ramp takes")
+    profile: Literal['soft_start', 'linear', 's_curve'] = 's_curve'
+
+class PourToWeight(BaseModel):
+    target_weight: float = Field(..., gt=0, description="Grams of water to pour into the mug")
+    flow_rate: float = Field(..., gt=0, description="Flow rate to hold while pouring, in g/s")
+    timeout: float = Field(120.0, gt=0, description="Give up after this many seconds")
+
+class Dispense(BaseModel):
+    ml: float = Field(..., gt=0, description="Millilitres to dispense")
+    speed: float = Field(..., ge=min_flow_rate, le=100, description=f"Pump speed from {min_flow_rate} to 100")
+    learn: bool = Field(True, description="Weigh the run on the mug scale and update the calibration table")
 
 router = APIRouter()
 
 @router.post("/")
 async def route_control_pump(pump: PumpControl, payload=Depends(auth_handler.decode_token)):
     try:
-        result = control_pump(pump)
+        result = await control_pump(pump)
         return {"status": f"Pump set to {pump.direction}", "result": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error controlling pump: {str(e)}")
@@ -36,15 +56,47 @@ async def route_control_pump(pump: PumpControl, payload=Depends(auth_handler.dec
 @router.post("/flow-rate")
 async def route_control_pump_speed(pump: PumpSpeedControl, payload=Depends(auth_handler.decode_token)):
     try:
-        result = control_pump_speed(pump)
+        result = await control_pump_speed(pump)
         return {"status": f"Pump set to {pump.direction} at {pump.speed}% speed", "result": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error controlling pump speed: {str(e)}")
 
+@router.post("/ramp")
+async def route_ramp_pump(ramp: PumpRamp, payload=Depends(auth_handler.decode_token)):
+    try:
+        result = await ramp_pump(ramp)
+        return {"status": f"Ramping pump {ramp.direction} to {ramp.speed}% over {ramp.duration}s", "result": result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error ramping pump: {str(e)}")
+
+@router.post("/pour")
+async def route_pour_to_weight(pour: PourToWeight, payload=Depends(auth_handler.decode_token)):
+    try:
+        result = await pour_to_weight(pour)
+        return {"status": f"Poured {result['pour']['final_weight']}g of {pour.target_weight}g",
+                "report": result['pour']}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error pouring to weight: {str(e)}")
+
+@router.post("/dispense")
+async def route_dispense(request: Dispense, payload=Depends(auth_handler.decode_token)):
+    try:
+        result = await dispense(request)
+        return {"status": f"Dispensed {request.ml}ml at {request.speed}% speed", "report": result['dispense']}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error dispensing: {str(e)}")
+
+@router.get("/calibration")
+async def route_get_pump_calibration(payload=Depends(auth_handler.decode_token)):
+    try:
+        return await get_pump_calibration()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error getting pump calibration: {str(e)}")
+
 @router.get("/status")
 async def route_get_pump_status(payload=Depends(auth_handler.decode_token)):
     try:
-        status = get_pump_status()
+        status = await get_pump_status()
         return status.model_dump()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting pump status: {str(e)}")
\ No newline at end of file
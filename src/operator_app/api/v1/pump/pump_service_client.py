@@ -1,10 +1,22 @@
-import socket
+import asyncio
 import json
+from collections import deque
 from pydantic import BaseModel
+from pydantic_settings import BaseSettings
 from enum import Enum
 import logging
 
-SOCKET_PATH = '/tmp/pump_control.sock'
+class Settings(BaseSettings):
+    PUMP_SERVICE_SOCKET: str = '/tmp/pump_control.sock'
+    PUMP_POOL_SIZE: int = 2
+    PUMP_REQUEST_TIMEOUT: float = 2.0
+    # Added to a pour's own timeout while waiting for its report (the scale settling)
+    PUMP_POUR_MARGIN: float = 20.0
+    PUMP_DISPENSE_TIMEOUT: float = 120.0
+
+settings = Settings()
+
+SOCKET_PATH = settings.PUMP_SERVICE_SOCKET
 
 class PumpDirection(str, Enum):
     forward = "forward"
@@ -16,39 +28,139 @@ class PumpControl(BaseModel):
 
 class PumpSpeedControl(BaseModel):
     direction: PumpDirection
-    speed: int
+    speed: float
+
+class PumpRamp(BaseModel):
+    direction: PumpDirection
+    speed: float
+    duration: float
+    profile: str = 's_curve'
 
 class PumpStatus(BaseModel):
     direction: PumpDirection
-    speed: int
+    speed: float
     status_flag: bool
+    ramping: bool = False
+
+class PourToWeight(BaseModel):
+    target_weight: float
+    flow_rate: float
+    timeout: float = 120.0
+
+class Dispense(BaseModel):
+    ml: float
+    speed: float
+    learn: bool = True
+
+class PumpServiceClient:
+    """
+    Keeps up to pool_size open connections to the pump service and reuses
+    them, one request at a time per connection. Requests beyond the pool size
+    wait for a free connection instead of opening more.
+    """
+    def __init__(self, socket_path: str = SOCKET_PATH, pool_size: int = settings.PUMP_POOL_SIZE,
+                 timeout: float = settings.PUMP_REQUEST_TIMEOUT):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.pool_size = pool_size
+        # The module-level client is built at import, before the server's loop exists;
+        # before Python 3.10 a semaphore made then binds to the wrong loop
+        self._slots = None
+        self._idle = deque()
+
+    async def _exchange(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, command: dict) -> bytes:
+        writer.write((json.dumps(command) + '\n').encode('utf-8'))
+        await writer.drain()
+        return await reader.readline()
+
+    async def send_command(self, command: dict, timeout: float = None) -> dict:
+        """
+        timeout overrides the client's request timeout for the reply, for
+        commands like a pour that only answer when they finish.
+        """
+        reply_timeout = timeout or self.timeout
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.pool_size)
+        async with self._slots:
+            reused = bool(self._idle)
+            reader, writer = self._idle.pop() if reused else \
+                await asyncio.wait_for(asyncio.open_unix_connection(self.socket_path), self.timeout)
+            try:
+                response = await asyncio.wait_for(self._exchange(reader, writer, command), reply_timeout)
+                if not response and reused:
+                    # The pooled connection went stale (e.g. the service restarted); retry on a fresh one
+                    writer.close()
+                    reader, writer = await asyncio.wait_for(
+                        asyncio.open_unix_connection(self.socket_path), self.timeout)
+                    response = await asyncio.wait_for(self._exchange(reader, writer, command), reply_timeout)
+                if not response:
+                    raise ConnectionError("Pump service closed the connection")
+            except BaseException:
+                writer.close()
+                raise
+            self._idle.append((reader, writer))
+
+        reply = json.loads(response)
+        if 'error' in reply:
+            raise RuntimeError(reply['error'])
+        return reply
+
+    async def close(self) -> None:
+        while self._idle:
+            _, writer = self._idle.pop()
+            writer.close()
 
-def send_command(command: dict) -> dict:
+client = PumpServiceClient()
+
+async def send_command(command: dict, timeout: float = None) -> dict:
     try:
-        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
-            client.connect(SOCKET_PATH)
-            client.send(json.dumps(command).encode('utf-8'))
-            response = client.recv(1024).decode('utf-8')
-            return json.loads(response) if response else {}
+        return await client.send_command(command, timeout)
+    except asyncio.TimeoutError:
+        logging.error("Timed out communicating with pump service")
+        raise TimeoutError("Pump service timed out")
     except Exception as e:
         logging.error(f"Error communicating with pump service: {e}")
         raise
 
-def control_pump(pump: PumpControl) -> dict:
+async def control_pump(pump: PumpControl) -> dict:
     command = {
         'action': 'control',
-        'params': pump.dict()
+        'params': pump.model_dump(mode='json')
     }
-    return send_command(command)
+    return await send_command(command)
 
-def control_pump_speed(pump: PumpSpeedControl) -> dict:
+async def control_pump_speed(pump: PumpSpeedControl) -> dict:
     command = {
         'action': 'control_speed',
-        'params': pump.model_dump()
+        'params': pump.model_dump(mode='json')
+    }
+    return await send_command(command)
+
+async def ramp_pump(ramp: PumpRamp) -> dict:
+    command = {
+        'action': 'ramp',
+        'params': ramp.model_dump(mode='json')
     }
-    return send_command(command)
+    return await send_command(command)
 
-def get_pump_status() -> PumpStatus:
+async def dispense(request: Dispense) -> dict:
+    command = {
+        'action': 'dispense',
+        'params': request.model_dump(mode='json')
+    }
+    return await send_command(command, timeout=settings.PUMP_DISPENSE_TIMEOUT)
+
+async def get_pump_calibration() -> dict:
+    return (await send_command({'action': 'calibration'}))['calibration']
+
+async def get_pump_status() -> PumpStatus:
     command = {'action': 'status'}
-    status_dict = send_command(command)
-    return PumpStatus(**status_dict)
\ No newline at end of file
+    status_dict = await send_command(command)
+    return PumpStatus(**status_dict)
+
+async def pour_to_weight(pour: PourToWeight) -> dict:
+    command = {
+        'action': 'pour_to_weight',
+        'params': pour.model_dump(mode='json')
+    }
+    return await send_command(command, timeout=pour.timeout + settings.PUMP_POUR_MARGIN)
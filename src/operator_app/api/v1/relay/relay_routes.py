@@ -51,9 +51,22 @@ async def set_relay_off_after_timer(gpio_pin: int, timer: int):
     await asyncio.sleep(timer)
     pi.write(gpio_pin, 1)  # Turn off relay
 
+async def wait_for_cone_settled(tolerance: float = 0.1, duration: float = 0.5, timeout: float = 5.0) -> dict:
+    reader, writer = await asyncio.open_unix_connection(CONE_SCALE_SOCKET_PATH)
+    try:
+        command = {"command": "wait_settled", "tolerance": tolerance, "duration": duration, "timeout": timeout}
+        writer.write((json.dumps(command) + "\n").encode())
+        await writer.drain()
+        response = await asyncio.wait_for(reader.readline(), timeout=timeout + 1.0)
+        return json.loads(response.decode().strip())
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
 async def grind_to_weight(gpio_pin: int, target_weight: float, timeout: int = 30):
     reader = None
     writer = None
+    target_reached = False
     
     try:
         logging.info(f"Zeroing scale before grinding to target weight: {target_weight}")
@@ -102,6 +115,7 @@ async def grind_to_weight(gpio_pin: int, target_weight: float, timeout: int = 30
                 if current_weight >= target_weight:
                     logging.info(f"Target weight reached: {current_weight} >= {target_weight}")
                     pi.write(gpio_pin, 1)  #turn off the relay
+                    target_reached = True
                     
                     try:
                         writer.write(b"stream_stop\n")
@@ -117,8 +131,16 @@ async def grind_to_weight(gpio_pin: int, target_weight: float, timeout: int = 30
             except Exception as e:
                 logging.error(f"Error in weight streaming: {e}", exc_info=True)
                 break
-                        
-            await asyncio.sleep(0.1)
+            # No sleep between reads: the scale sends a frame per conversion (up to 80 SPS), and
+            # pausing here lets them pile up in the socket so the grinder acts on old weights
+
+        if target_reached:
+            settled = await wait_for_cone_settled()
+            if "weight" in settled:
+                logging.info(f"Grind settled at {settled['weight']:.2f} (target {target_weight}, "
+                             f"overshoot {settled['weight'] - target_weight:+.2f})")
+            else:
+                logging.warning(f"Could not read settled grind weight: {settled.get('error')}")
             
     except Exception as e:
         logging.error(f"Unexpected error in grind_to_weight: {e}", exc_info=True)
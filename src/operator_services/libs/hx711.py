@@ -28,26 +28,130 @@
 # OR TORT (INCLUDING NEGLIGENCE OR OTHERWISE) ARISING IN ANY WAY OUT OF THE USE
 # OF THIS SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 
+import numpy as np
 import pigpio
-import statistics as stat
+import threading
 import time
 
+# Raw values the HX711 clocks out when a read goes wrong (saturated or DOUT stuck)
+GLITCH_VALUES = (0x7FFFFF, -0x800000)
+MAD_TO_SIGMA = 1.4826
+RECENT_SAMPLES = 128
+
+def reject_outliers(values, threshold=3.5):
+    """
+    Drop values further than `threshold` robust standard deviations (MAD based)
+    from the median. A single glitched 24-bit read is far outside that band.
+    """
+    values = np.asarray(values, dtype=float)
+    if len(values) < 3:
+        return values
+    median = np.median(values)
+    mad = np.median(np.abs(values - median)) * MAD_TO_SIGMA
+    if mad == 0:
+        return values[values == median]
+    return values[np.abs(values - median) <= threshold * mad]
+
+def trimmed_mean(values, proportion=0.2):
+    """
+    Mean of the values left after cutting `proportion` of them off each end.
+    """
+    values = np.sort(np.asarray(values, dtype=float))
+    cut = int(len(values) * proportion)
+    if len(values) - 2 * cut < 1:
+        return float(np.median(values))
+    return float(values[cut:len(values) - cut].mean())
+
+def median_of_means(values, groups=5):
+    """
+    Split the values into `groups` blocks and return the median of the block means.
+    """
+    values = np.asarray(values, dtype=float)
+    groups = max(1, min(groups, len(values)))
+    return float(np.median([block.mean() for block in np.array_split(values, groups)]))
+
+ESTIMATORS = {
+    'trimmed_mean': trimmed_mean,
+    'median_of_means': median_of_means,
+}
+
+# pigpio script that clocks out one conversion inside pigpiod and leaves the
+# 24 raw bits in p0, followed by the extra pulses that select gain/channel.
+READ_SCRIPT = """
+ld p0 0
+ld v0 24
+tag 1
+trig {sck} 1 1
+r {dout}
+sta v1
+lda p0
+rla 1
+or v1
+sta p0
+dcr v0
+lda v0
+jnz 1
+ld v0 {extra}
+tag 2
+trig {sck} 1 1
+dcr v0
+lda v0
+jnz 2
+halt
+"""
+
 class HX711:
 
-    def __init__(self, pi, dout_pin, pd_sck_pin, gain_channel_A=128, select_channel='A'):
+    def __init__(self, pi, dout_pin, pd_sck_pin, gain_channel_A=128, select_channel='A',
+                 ready_mode='poll', ready_timeout=1.0, read_mode='bitbang', estimator='trimmed_mean'):
         """
         Initialize a new instance of HX711 using pigpio for GPIO control.
+
+        ready_mode selects how read() waits for a conversion: 'poll' checks
+        DOUT every millisecond, 'callback' sleeps until pigpio reports the
+        DOUT falling edge. Either way read() gives up after ready_timeout
+        seconds and returns False.
+
+        read_mode selects how the bits are clocked out: 'bitbang' pulses and
+        reads each bit over the pigpiod socket (about 50 round trips per
+        sample), 'script' runs a stored pigpio script that does the whole
+        transfer inside the daemon (a handful of round trips).
+
+        estimator ('trimmed_mean' or 'median_of_means') is used by zero() and
+        get_weight() after outliers have been rejected.
         """
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"estimator must be one of {', '.join(ESTIMATORS)}")
+        if ready_mode not in ('poll', 'callback'):
+            raise ValueError("ready_mode must be 'poll' or 'callback'")
+        if read_mode not in ('bitbang', 'script'):
+            raise ValueError("read_mode must be 'bitbang' or 'script'")
         self.pi = pi
         self.dout = dout_pin
         self.pd_sck = pd_sck_pin
         self.gain_channel_A = gain_channel_A
         self.selected_channel = select_channel  # Rename this
+        self.ready_mode = ready_mode
+        self.ready_timeout = ready_timeout
+        self.read_mode = read_mode
+        self.estimator = estimator
+        self._script_id = None
+
+        # Ring of recent valid raw reads, used by zero(max_age=...)
+        self._recent_values = np.zeros(RECENT_SAMPLES)
+        self._recent_times = np.zeros(RECENT_SAMPLES)
+        self._recent_index = 0
+        self._recent_count = 0
 
         # Initialize pins
         self.pi.set_mode(self.pd_sck, pigpio.OUTPUT)
         self.pi.set_mode(self.dout, pigpio.INPUT)
 
+        self._ready = threading.Event()
+        self._callback = None
+        if ready_mode == 'callback':
+            self._callback = self.pi.callback(self.dout, pigpio.FALLING_EDGE, self._on_dout_falling)
+
         # Set the gain and select the channel initially
         self.set_gain(gain_channel_A)
         self.select_channel(select_channel)
@@ -59,6 +163,8 @@ class HX711:
         Set the gain; 128 or 64 for channel A, 32 for channel B
         """
         self.gain_channel_A = gain
+        if self.read_mode == 'script':
+            self._store_script()
         self.read()  # Discard the reading after changing the gain as it might be garbage.
 
     def select_channel(self, channel):
@@ -69,26 +175,100 @@ class HX711:
         self.read()  # Discard the reading after changing the channel as it might be garbage.
 
 
-    def zero(self, readings=30):
+    def zero(self, readings=30, max_age=None):
       """
       Set the current data as an offset for the particular channel, also known as taring the scale.
+
+      With max_age set, raw reads buffered within the last max_age seconds count
+      towards `readings`, and only the shortfall is read fresh from the chip.
       """
-      values = [self.read() for _ in range(readings)]
-      values = [x for x in values if x is not False]  # Filter out invalid readings
+      values = self.recent_values(max_age)[-readings:] if max_age else np.empty(0)
+      values = np.concatenate([values, self._read_values(readings - len(values))])
+      estimate = self._estimate(values)
 
-      if values:
-        self.offset = stat.mean(values)
+      if estimate is not None:
+        self.offset = estimate
         return None  # Return None if successful
       else:
         return "Tare is unsuccessful."  # Return an error message if unsuccessful
 
+    def recent_values(self, max_age):
+        """
+        Raw reads buffered within the last max_age seconds, oldest first.
+        """
+        order = (np.arange(self._recent_count) + self._recent_index - self._recent_count) % RECENT_SAMPLES
+        fresh = self._recent_times[order] >= time.monotonic() - max_age
+        return self._recent_values[order][fresh]
+
+    def _remember(self, value):
+        self._recent_values[self._recent_index] = value
+        self._recent_times[self._recent_index] = time.monotonic()
+        self._recent_index = (self._recent_index + 1) % RECENT_SAMPLES
+        self._recent_count = min(self._recent_count + 1, RECENT_SAMPLES)
+
+    def _read_values(self, readings):
+        values = (self.read() for _ in range(max(0, readings)))
+        return np.array([x for x in values if x is not False], dtype=float)  # Filter out invalid readings
+
+    def _estimate(self, values):
+        """
+        Robust central value of raw reads, or None if nothing usable is left.
+        """
+        values = reject_outliers(values)
+        if not len(values):
+            return None
+        return ESTIMATORS[self.estimator](values)
+
+    def _on_dout_falling(self, gpio, level, tick):
+        self._ready.set()
+
+    def wait_ready(self, timeout=None):
+        """
+        Wait until DOUT is low, meaning a conversion is ready to be clocked out.
+        Returns False if the chip is not ready within the timeout.
+        """
+        timeout = self.ready_timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+
+        if self.ready_mode == 'poll':
+            while self.pi.read(self.dout) == 1:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(0.001)
+            return True
+
+        while True:
+            # Clear before checking the level so an edge arriving in between is not lost.
+            # Stale edges from clocking out the previous value only cost one extra check.
+            self._ready.clear()
+            if self.pi.read(self.dout) == 0:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self._ready.wait(remaining)
+
     def read(self):
         """
-        Read a single raw value from the HX711.
+        Read a single raw value from the HX711, or False if the chip never became ready.
         """
-        while self.pi.read(self.dout) == 1:
-            time.sleep(0.001)
+        if not self.wait_ready():
+            return False
+
+        data = self._clock_out_script() if self.read_mode == 'script' else self._clock_out_bitbang()
+        if data is False:
+            return False
+
+        if data & 0x800000:  # if sign bit is set
+            data -= 0x1000000
+
+        if data in GLITCH_VALUES:
+            return False
+
+        self._remember(data)
+        return data
 
+    def _clock_out_bitbang(self):
         data = 0
         for _ in range(24):
             self.pi.gpio_trigger(self.pd_sck, 1, 1)
@@ -99,21 +279,46 @@ class HX711:
         for _ in range(self.gain_channel_A // 32):
             self.pi.gpio_trigger(self.pd_sck, 1, 1)
 
-        if data & 0x800000:  # if sign bit is set
-            data -= 0x1000000
-
         return data
 
+    def _store_script(self):
+        """
+        Store the read script for the current gain, replacing any previous one.
+        """
+        self._delete_script()
+        script = READ_SCRIPT.format(sck=self.pd_sck, dout=self.dout, extra=self.gain_channel_A // 32)
+        self._script_id = self.pi.store_script(script.encode())
+        deadline = time.monotonic() + 1.0
+        while self.pi.script_status(self._script_id)[0] == pigpio.PI_SCRIPT_INITING:
+            if time.monotonic() >= deadline:
+                raise TimeoutError("pigpio read script did not initialise")
+            time.sleep(0.001)
+
+    def _delete_script(self):
+        if self._script_id is not None:
+            self.pi.delete_script(self._script_id)
+            self._script_id = None
+
+    def _clock_out_script(self):
+        self.pi.run_script(self._script_id)
+        deadline = time.monotonic() + self.ready_timeout
+        while True:
+            status, params = self.pi.script_status(self._script_id)
+            if status == pigpio.PI_SCRIPT_HALTED:
+                return params[0] & 0xFFFFFF
+            if status == pigpio.PI_SCRIPT_FAILED or time.monotonic() >= deadline:
+                return False
+            time.sleep(0.0001)
+
     def get_weight(self, readings=5):
         """
         Capture several readings to stabilize the result and calculate the weight.
         """
-        values = [self.read() for _ in range(readings)]
-        values = [x for x in values if x is not False]  # Filter out invalid readings
-        if not values:
+        estimate = self._estimate(self._read_values(readings))
+        if estimate is None:
             return False
 
-        return (stat.mean(values) - self.offset) / self.ratio
+        return (estimate - self.offset) / self.ratio
 
     def set_scale_ratio(self, known_weight):
         """
@@ -140,3 +345,11 @@ class HX711:
         self.pi.write(self.pd_sck, 0)
         time.sleep(0.01)  # Wait for the HX711 to settle after powering up
 
+    def cleanup(self):
+        """
+        Cancel the DOUT callback and delete the read script, if either was registered.
+        """
+        if self._callback is not None:
+            self._callback.cancel()
+            self._callback = None
+        self._delete_script()
@@ -0,0 +1,218 @@
+import threading
+import time
+from dataclasses import dataclass, fields
+import numpy as np
+import pigpio
+
+# Simulated HX711 load cells for running the scale services and their
+# benchmarks without a Raspberry Pi. LoadModel describes the mass on the scale
+# over time, SimulatedChip turns it into raw 24-bit counts at the chip's
+# conversion rate, and the two front ends mimic the interfaces the services
+# use: SimulatedSimpleHX711 for the HX711 C++ wrapper and SimulatedPi for
+# libs.hx711.HX711 (which then bit-bangs the simulated chip as it would a real one).
+
+GLITCH_VALUE = 0x7FFFFF
+
+@dataclass
+class LoadModel:
+    """
+    Mass on the scale, in grams, as a function of seconds since the model started.
+    Each phase adds mass at a constant rate for its duration; drips land at
+    random after the pour ends. With period > 0 the whole profile repeats.
+    """
+    base_mass: float = 0.0
+    grind_rate: float = 0.0
+    grind_start: float = 5.0
+    grind_duration: float = 0.0
+    pour_rate: float = 0.0
+    pour_start: float = 5.0
+    pour_duration: float = 0.0
+    drip_rate: float = 0.0
+    drip_mass: float = 0.05
+    drip_duration: float = 10.0
+    noise: float = 0.05
+    drift: float = 0.0
+    sps: float = 10.0
+    glitch_probability: float = 0.001
+    period: float = 0.0
+    seed: int = 0
+
+    def __post_init__(self):
+        self.rng = np.random.default_rng(self.seed)
+        drips = self.rng.exponential(1.0 / self.drip_rate, size=int(self.drip_rate * self.drip_duration * 2) + 1) \
+            if self.drip_rate > 0 else np.empty(0)
+        drip_times = np.cumsum(drips)
+        self._drip_times = drip_times[drip_times <= self.drip_duration] + self.pour_start + self.pour_duration
+
+    @classmethod
+    def from_config(cls, section, prefix: str) -> 'LoadModel':
+        """
+        Read any <prefix><field> keys (e.g. mug_scale_sim_pour_rate) from a config section.
+        """
+        kwargs = {}
+        for field in fields(cls):
+            key = f'{prefix}{field.name}'
+            if key in section:
+                kwargs[field.name] = field.type(section.get(key)) if field.type is int else section.getfloat(key)
+        return cls(**kwargs)
+
+    def mass(self, t: float) -> float:
+        if self.period > 0:
+            t = t % self.period
+        grind = self.grind_rate * np.clip(t - self.grind_start, 0, self.grind_duration)
+        pour = self.pour_rate * np.clip(t - self.pour_start, 0, self.pour_duration)
+        drips = self.drip_mass * np.searchsorted(self._drip_times, t, side='right')
+        return float(self.base_mass + grind + pour + drips)
+
+class SimulatedChip:
+    """
+    Produces raw counts for a LoadModel the way an HX711 would: one conversion
+    every 1/sps seconds, with gaussian noise, slow drift and occasional
+    saturated glitch reads.
+    """
+    def __init__(self, model: LoadModel, reference_unit: float, offset: float):
+        self.model = model
+        self.reference_unit = reference_unit
+        self.offset = offset
+        self.started = time.monotonic()
+        self._last_conversion = -1
+
+    def conversion_index(self, now: float = None) -> int:
+        elapsed = (now if now is not None else time.monotonic()) - self.started
+        return int(elapsed * self.model.sps)
+
+    def is_ready(self) -> bool:
+        return self.conversion_index() > self._last_conversion
+
+    def wait_for_conversion(self) -> None:
+        """
+        Block until a conversion that has not been read yet is available.
+        """
+        next_index = self._last_conversion + 1
+        ready_at = self.started + next_index / self.model.sps
+        delay = ready_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def take_conversion(self) -> int:
+        index = self.conversion_index()
+        self._last_conversion = index
+        if self.model.rng.random() < self.model.glitch_probability:
+            return GLITCH_VALUE
+        t = index / self.model.sps
+        grams = self.model.mass(t) + self.model.drift * t + self.model.rng.normal(0, self.model.noise)
+        return int(np.clip(round(self.offset + grams * self.reference_unit), -0x800000, 0x7FFFFF))
+
+    def read(self) -> int:
+        self.wait_for_conversion()
+        return self.take_conversion()
+
+class SimulatedSimpleHX711:
+    """
+    Stand-in for HX711.SimpleHX711 covering the calls the scale service makes.
+    weight() returns grams as a float, using the median of the requested reads.
+    """
+    def __init__(self, data_pin: int, clock_pin: int, ref_unit: float, offset: float, model: LoadModel = None):
+        self.data_pin = data_pin
+        self.clock_pin = clock_pin
+        self.chip = SimulatedChip(model or LoadModel(), ref_unit, offset)
+        self.ref_unit = ref_unit
+        self.offset = offset
+        self.unit = None
+
+    def setUnit(self, unit) -> None:
+        self.unit = unit
+
+    def read_raw(self, samples: int) -> float:
+        reads = [self.chip.read() for _ in range(max(1, samples))]
+        return float(np.median(reads))
+
+    def zero(self, samples: int = 15) -> None:
+        self.offset = self.read_raw(samples)
+
+    def weight(self, samples: int = 1) -> float:
+        return (self.read_raw(samples) - self.offset) / self.ref_unit
+
+class _SimulatedCallback:
+    def __init__(self, pi: 'SimulatedPi', gpio: int, func):
+        self.pi = pi
+        self.gpio = gpio
+        self.func = func
+
+    def cancel(self) -> None:
+        self.pi._callbacks.discard(self)
+
+class SimulatedPi:
+    """
+    Minimal pigpio.pi stand-in wired to a SimulatedChip on (dout, sck), so
+    libs.hx711.HX711 can run its poll, callback, bit-bang and script paths
+    against simulated conversions.
+    """
+    connected = True
+
+    def __init__(self, dout: int, sck: int, chip: SimulatedChip):
+        self.dout = dout
+        self.sck = sck
+        self.chip = chip
+        self._value = 0
+        self._pulses = 0
+        self._callbacks = set()
+        self._script = None
+        self._stopped = threading.Event()
+        threading.Thread(target=self._edge_loop, name="hx711-sim-edges", daemon=True).start()
+
+    def set_mode(self, gpio, mode) -> None:
+        pass
+
+    def write(self, gpio, level) -> None:
+        pass
+
+    def read(self, gpio) -> int:
+        if gpio != self.dout:
+            return 0
+        if 0 < self._pulses <= 24:
+            return (self._value >> (24 - self._pulses)) & 1
+        self._pulses = 0
+        return 0 if self.chip.is_ready() else 1
+
+    def gpio_trigger(self, gpio, pulse_len=10, level=1) -> None:
+        if gpio != self.sck:
+            return
+        if self._pulses == 0:
+            self._value = self.chip.take_conversion() & 0xFFFFFF
+        self._pulses += 1
+
+    def callback(self, gpio, edge=pigpio.RISING_EDGE, func=None) -> _SimulatedCallback:
+        cb = _SimulatedCallback(self, gpio, func)
+        self._callbacks.add(cb)
+        return cb
+
+    def store_script(self, script: bytes) -> int:
+        self._script = script
+        return 0
+
+    def delete_script(self, script_id: int) -> None:
+        self._script = None
+
+    def run_script(self, script_id: int, params=None) -> None:
+        self._value = self.chip.take_conversion() & 0xFFFFFF
+
+    def script_status(self, script_id: int):
+        if self._script is None:
+            return pigpio.PI_SCRIPT_FAILED, [0] * 10
+        return pigpio.PI_SCRIPT_HALTED, [self._value] + [0] * 9
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _edge_loop(self) -> None:
+        # Fire DOUT falling-edge callbacks at each conversion boundary
+        last = self.chip.conversion_index()
+        while not self._stopped.wait(0.5 / self.chip.model.sps):
+            index = self.chip.conversion_index()
+            if index != last:
+                last = index
+                tick = int(time.monotonic() * 1e6) & 0xFFFFFFFF
+                for cb in list(self._callbacks):
+                    if cb.gpio == self.dout:
+                        cb.func(self.dout, 0, tick)
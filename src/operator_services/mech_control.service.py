@@ -3,16 +3,63 @@ import asyncio
 import json
 import os
 import logging
-from typing import Any, List, Dict
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import AsyncExitStack, asynccontextmanager
+from typing import Any, List, Dict, Optional
+from mech_motion import HOMING_TIMEOUT, KinematicState, MotionSchedule, compile_pattern, estimate_seconds
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Command type -> (required integer fields, acknowledgment sent by the firmware)
+COMMAND_SPECS = {
+    'move_cone': (['steps', 'speed', 'direction'], 'cone_done'),
+    'move_spout': (['degrees', 'speed', 'direction'], 'spout_done'),
+    'move_both': (['cone_steps', 'cone_speed', 'spout_degrees', 'spout_speed', 'direction'], 'both_done'),
+    'zero_spout': ([], 'zero_done'),
+}
+
+# Absolute moves planned from the tracked position: type -> required fields
+GOTO_SPECS = {
+    'goto_cone': ['angle', 'speed'],
+    'goto_spout': ['degrees', 'speed'],
+}
+
+# Stepper axes each command moves; locks are always taken in this order
+AXES = ('cone', 'spout')
+COMMAND_AXES = {
+    'move_cone': ('cone',),
+    'move_spout': ('spout',),
+    'move_both': ('cone', 'spout'),
+    'zero_spout': ('spout',),
+    'goto_cone': ('cone',),
+    'goto_spout': ('spout',),
+}
+
+# Firmware errors that only certain commands can raise, so they can be matched to the right one
+ERROR_SOURCES = {
+    'Spout not zeroed': ('spout_done', 'both_done'),
+}
+
+SERIAL_PORT = os.environ.get('MECH_CONTROL_SERIAL_PORT', '/dev/tty.usbserial-11330')
+
+# commandQueue[20] in mech-control.ino is a ring that keeps one slot empty
+FIRMWARE_QUEUE_SLOTS = 19
+# A command past its deadline is still queued on the board, so it keeps its slot until it is
+# acknowledged. It is given up on as lost once it is this many times its expected duration
+# overdue, but never sooner than STALL_LIMIT_MIN seconds, which covers serial and loop jitter.
+STALL_LIMIT_FACTOR = 5.0
+STALL_LIMIT_MIN = 2.0
+
 class MechControlService:
-    def __init__(self, socket_path: str = "/tmp/mech-control.sock"):
+    def __init__(self, socket_path: str = "/tmp/mech-control.sock", serial_port: str = SERIAL_PORT):
         # Initialize Arduino
-        self.arduino = PyCmdMessenger.ArduinoBoard("/dev/tty.usbserial-11330", baud_rate=9600)
+        self.arduino = PyCmdMessenger.ArduinoBoard(serial_port, baud_rate=9600)
         
         # Command definitions
         self.commands = [
@@ -29,134 +76,480 @@ class MechControlService:
         
         self.messenger = PyCmdMessenger.CmdMessenger(self.arduino, self.commands)
         self.socket_path = socket_path
+        # Opening the port resets the Arduino, so the spout starts out unzeroed
+        self.state = KinematicState()
+        # Predicted start time of every queued command, which gives each one its acknowledgment deadline
+        self.schedule = MotionSchedule()
+        self._scheduled = {}
+
+        # Commands sent to the Arduino and still waiting for their acknowledgment, oldest first
+        self._pending = deque()
+        # Created by start_server(): before Python 3.10 asyncio primitives bind to the loop
+        # that exists when they are made, which is not the one asyncio.run() starts
+        self._credits = None
+        self._axis_locks = None
+        self._serial_ready = None
+        # Credits taken by commands the firmware has not dequeued yet
+        self._credits_held = 0
+        # A single writer thread keeps frames from different clients from interleaving
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="mech-serial-writer")
+        self._loop = None
+        self._reader_stopped = threading.Event()
+        self._reader_thread = None
+
+    def start_reader(self) -> None:
+        """
+        Start the serial reader thread. It owns messenger.receive() and hands
+        every frame to the event loop, where it resolves the waiting command.
+        """
+        self._loop = asyncio.get_running_loop()
+        self._reader_stopped.clear()
+        self._reader_thread = threading.Thread(target=self._read_serial, name="mech-serial-reader", daemon=True)
+        self._reader_thread.start()
 
-    async def wait_for_response(self, expected_done_cmd: str, timeout: float = 30) -> List[Any]:
+    def _read_serial(self) -> None:
+        while not self._reader_stopped.is_set():
+            try:
+                response = self.messenger.receive()
+            except Exception as e:
+                if self._reader_stopped.is_set():
+                    break
+                logger.error(f"Error reading from Arduino: {e}")
+                continue
+            if response is not None:
+                self._loop.call_soon_threadsafe(self._dispatch_response, response)
+
+    def _dispatch_response(self, response: List[Any]) -> None:
+        logger.debug(f"Received response: {response}")
+        # receive() gives (name, [args], time); an error frame's only argument is its message
+        name = response[0]
+        message = response[1][0] if name == 'error' and response[1] else None
+        sources = ERROR_SOURCES.get(message)
+        for entry in self._pending:
+            done_cmd, future = entry
+            # The firmware's error frames do not say which command failed; blame the oldest one
+            # waiting that could have raised it
+            if name == done_cmd or (name == 'error' and (sources is None or done_cmd in sources)):
+                self._pending.remove(entry)
+                if not future.done():
+                    if name == 'error':
+                        future.set_exception(Exception(f"Arduino error: {message}"))
+                    else:
+                        future.set_result(response)
+                return
+        logger.warning(f"Unexpected response from Arduino: {response}")
+
+    async def submit(self, done_cmd: str, *args) -> asyncio.Future:
+        """
+        Send a command once the firmware queue has room for it and return the
+        future its acknowledgment will resolve.
+        """
+        await self._credits.acquire()
+        self._credits_held += 1
+        try:
+            await self._serial_ready.wait()
+        except BaseException:
+            # Cancelled while the serial link was held back (e.g. the client went away): nothing
+            # was sent, so the credit goes straight back instead of shrinking the queue for good
+            self._return_credit()
+            raise
         loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        entry = (done_cmd, future)
+        future.add_done_callback(lambda _: self._release(entry))
+        if done_cmd == 'zero_done':
+            self._serial_ready.clear()
+            future.add_done_callback(lambda _: self._serial_ready.set())
+        # Register before sending so an immediate acknowledgment cannot be missed
+        self._pending.append(entry)
         try:
-            while True:
-                response = await loop.run_in_executor(None, self.messenger.receive)
-                if response is not None:
-                    logger.debug(f"Received response: {response}")
-                    if response[0] == "error":
-                        raise Exception(f"Arduino error: {response[1]}")
-                    if response[0] == expected_done_cmd:
-                        return response
-                await asyncio.sleep(0.1)
-        except asyncio.CancelledError:
-            raise TimeoutError(f"Timeout waiting for {expected_done_cmd}")
+            await loop.run_in_executor(self._writer, self.messenger.send, *args)
+        except BaseException:
+            future.cancel()
+            raise
+        return future
+
+    def _release(self, entry) -> None:
+        if entry in self._pending:
+            self._pending.remove(entry)
+        self._return_credit()
+
+    def _return_credit(self) -> None:
+        self._credits_held -= 1
+        self._credits.release()
+
+    @property
+    def available_credits(self) -> int:
+        """
+        Free slots in the firmware command queue, as far as the service knows.
+        """
+        return FIRMWARE_QUEUE_SLOTS - self._credits_held
+
+    @asynccontextmanager
+    async def lock_axes(self, commands: List[Dict[str, Any]]):
+        """
+        Hold the locks for every axis the commands move, taken in a fixed order so
+        two batches can never deadlock. Commands on other axes keep running.
+        """
+        axes = {axis for command in commands for axis in COMMAND_AXES[command['command']]}
+        async with AsyncExitStack() as stack:
+            for axis in AXES:
+                if axis in axes:
+                    await stack.enter_async_context(self._axis_locks[axis])
+            yield
+
+    async def wait_for_ack(self, cmd_type: str, future: asyncio.Future, deadline,
+                           stall_limit: float = STALL_LIMIT_MIN, on_stall=None) -> List[Any]:
+        """
+        Wait for an acknowledgment until deadline(), which is re-read whenever it
+        passes since acknowledgments of earlier commands keep moving it. A missed
+        deadline is a stall: on_stall(late_by) is awaited straight away, but the
+        command stays pending and keeps its queue credit, so its late
+        acknowledgment still resolves it rather than the command behind it. It
+        is given up on stall_limit seconds after the deadline.
+        """
+        stalled = False
+        while True:
+            remaining = deadline() + (stall_limit if stalled else 0) - time.time()
+            if remaining <= 0:
+                if stalled:
+                    future.cancel()
+                    raise TimeoutError(f"Timeout waiting for {cmd_type} acknowledgment")
+                late_by = time.time() - deadline()
+                logger.warning(f"{cmd_type} missed its acknowledgment deadline; the board may have stalled")
+                stalled = True
+                if on_stall:
+                    await on_stall(late_by)
+                continue
+            done, _ = await asyncio.wait([future], timeout=remaining)
+            if done:
+                return future.result()
+
+    def resolve_command(self, command: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Turn absolute moves into firmware commands using the tracked position.
+        Returns None when there is nothing to do: the axis is already at the
+        target, or the spout is still trusted from its last homing (send
+        "force": true to home anyway).
+        """
+        cmd_type = command['command']
+        if cmd_type == 'goto_cone':
+            return self.state.goto_cone(command['angle'], command['speed'])
+        if cmd_type == 'goto_spout':
+            return self.state.goto_spout(command['degrees'], command['speed'])
+        if cmd_type == 'zero_spout' and self.state.spout_trusted and not command.get('force'):
+            return None
+        return command
+
+    async def submit_command(self, command: Dict[str, Any]) -> asyncio.Future:
+        resolved = self.resolve_command(command)
+        if resolved is None:
+            logger.info(f"Skipping {command['command']}: the tracked position already satisfies it")
+            future = asyncio.get_running_loop().create_future()
+            future.set_result(['skipped', None])
+            return future
+
+        cmd_type = resolved['command']
+        required_fields, done_cmd = COMMAND_SPECS[cmd_type]
+        args = [resolved[field] for field in required_fields]
+        params = ", ".join(f"{field}={resolved[field]}" for field in required_fields)
+        logger.info(f"Sending command: {cmd_type}" + (f" with {params}" if params else ""))
+        duration = estimate_seconds(resolved, self.state.spout_target)
+        future = await self.submit(done_cmd, cmd_type, *args)
+        ack_delay = HOMING_TIMEOUT if cmd_type == 'zero_spout' else 0.0
+        self._scheduled[future] = self.schedule.add(cmd_type, duration, time.time(), ack_delay)
+        # Track the position as of the moment the move is queued, so the next goto plans from
+        # there; a failure on the command drops trust in its axes instead
+        self.state.apply(resolved)
+        return future
+
+    async def wait_for_command(self, command: Dict[str, Any], future: asyncio.Future,
+                               on_stall=None) -> List[Any]:
+        """
+        Wait for a submitted command's acknowledgment. If it misses its deadline,
+        on_stall(info) is awaited with the expected duration, how late it is and
+        how long it will still be waited for.
+        """
+        cmd_type = command['command']
+        move = self._scheduled.pop(future, None)
+        deadline = (lambda: self.schedule.deadline(move)) if move else (lambda: math.inf)
+        stall_limit = max(STALL_LIMIT_MIN, STALL_LIMIT_FACTOR * move.duration) if move else STALL_LIMIT_MIN
+
+        async def stalled(late_by):
+            if on_stall:
+                await on_stall({'expected_seconds': round(move.duration, 3), 'late_by': round(late_by, 3),
+                                'limit_seconds': round(stall_limit, 3)})
+
+        try:
+            response = await self.wait_for_ack(cmd_type, future, deadline, stall_limit, stalled)
+        except Exception as e:
+            logger.error(f"Error executing command {cmd_type}: {str(e)}")
+            if move:
+                self.schedule.dropped(move)
+            self.state.invalidate(COMMAND_AXES[cmd_type])
+            return ['error', str(e)]
+        if move is None:
+            return response
+
+        # response[2] is when the reader thread received the acknowledgment
+        late = response[2] - self.schedule.deadline(move)
+        measured = self.schedule.acknowledged(move, response[2])
+        if measured:
+            logger.info(f"{measured.command} ran {measured.actual:.3f}s (expected {measured.duration:.3f}s)")
+        data = {'expected_seconds': round(move.duration, 3)}
+        if late > 0:
+            data['stalled_seconds'] = round(late, 3)
+        return [response[0], data]
+
+    @staticmethod
+    def _stall_callback(on_stall, index: int, command: Dict[str, Any]):
+        # Bind a batch's on_stall(index, command, info) to one of its commands
+        if on_stall is None:
+            return None
+        return lambda info: on_stall(index, command, info)
 
     def validate_command_parameters(self, command: Dict[str, Any]) -> None:
         cmd_type = command.get('command')
-        if cmd_type == 'move_cone':
-            required_fields = ['steps', 'speed', 'direction']
-        elif cmd_type == 'move_spout':
-            required_fields = ['degrees', 'speed', 'direction']
-        elif cmd_type == 'move_both':
-            required_fields = ['cone_steps', 'cone_speed', 'spout_degrees', 'spout_speed', 'direction']
-        elif cmd_type == 'zero_spout':
-            required_fields = []
+        if cmd_type in GOTO_SPECS:
+            required_fields = GOTO_SPECS[cmd_type]
+        elif cmd_type in COMMAND_SPECS:
+            required_fields, _ = COMMAND_SPECS[cmd_type]
         else:
             raise ValueError(f"Unknown command type: {cmd_type}")
 
         for field in required_fields:
-            if field not in command or not isinstance(command[field], int):
+            numeric = (int, float) if field == 'angle' else int
+            if field not in command or not isinstance(command[field], numeric):
                 raise ValueError(f"Invalid or missing '{field}' in command.")
 
-    async def execute_command(self, command: Dict[str, Any]) -> List[Any]:
+    async def execute_command(self, command: Dict[str, Any], on_stall=None) -> List[Any]:
         cmd_type = command.get('command')
-        loop = asyncio.get_running_loop()
+        if cmd_type == 'pour_pattern':
+            return await self.execute_pattern(command)
+        if cmd_type == 'get_state':
+            return ['state', self.state.as_dict()]
         self.validate_command_parameters(command)
 
+        async with self.lock_axes([command]):
+            try:
+                future = await self.submit_command(command)
+            except Exception as e:
+                logger.error(f"Error executing command {cmd_type}: {str(e)}", exc_info=True)
+                self.state.invalidate(COMMAND_AXES[cmd_type])
+                return ['error', str(e)]
+            return await self.wait_for_command(command, future, on_stall)
+
+    async def execute_sequential(self, commands: List[Dict[str, Any]], on_result=None,
+                                 on_stall=None) -> List[List[Any]]:
+        responses = []
+        for index, command in enumerate(commands):
+            response = await self.execute_command(command, self._stall_callback(on_stall, index, command))
+            responses.append(response)
+            if on_result:
+                await on_result(index, command, response)
+        return responses
+
+    async def execute_pipelined(self, commands: List[Dict[str, Any]], on_result=None,
+                                on_stall=None) -> List[List[Any]]:
+        """
+        Stream commands into the firmware queue ahead of the motion, limited by
+        the queue credits, so the next move is already queued when the current
+        one starts. Acknowledgments are collected in order while sending continues,
+        and on_result(index, command, response) is awaited for each as it arrives;
+        on_stall(index, command, info) is awaited when one misses its deadline.
+        """
+        for command in commands:
+            self.validate_command_parameters(command)
+
+        submitted = asyncio.Queue()
+
+        async def send_all():
+            for command in commands:
+                try:
+                    future = await self.submit_command(command)
+                except Exception as e:
+                    future = asyncio.get_running_loop().create_future()
+                    future.set_exception(e)
+                await submitted.put(future)
+
+        async with self.lock_axes(commands):
+            sender = asyncio.create_task(send_all())
+            responses = []
+            try:
+                for index, command in enumerate(commands):
+                    future = await submitted.get()
+                    response = await self.wait_for_command(
+                        command, future, self._stall_callback(on_stall, index, command))
+                    responses.append(response)
+                    if on_result:
+                        await on_result(index, command, response)
+            finally:
+                sender.cancel()
+            return responses
+
+    async def execute_pattern(self, command: Dict[str, Any]) -> List[Any]:
+        """
+        Compile a high-level pour pattern, e.g.
+        {"command": "pour_pattern", "pattern": "spiral", "radius": 20, "revolutions": 3, "duration": 30},
+        and run the resulting moves pipelined.
+        """
+        params = {key: value for key, value in command.items() if key not in ('command', 'pattern')}
+        try:
+            plan = compile_pattern(command.get('pattern'), **params)
+        except ValueError as e:
+            return ['error', str(e)]
+
+        logger.info(f"Running {command.get('pattern')} pattern as {len(plan)} moves")
+        responses = await self.execute_pipelined(list(plan))
+        errors = [response[1] for response in responses if response and response[0] == 'error']
+        if errors:
+            return ['error', f"{len(errors)} of {len(plan)} moves failed: {errors[0]}"]
+        return ['pattern_done', {'moves': len(plan)}]
+
+    @staticmethod
+    def format_response(command: Dict[str, Any], response: List[Any]) -> Dict[str, Any]:
+        return {
+            'command': command['command'],
+            'status': response[0] if response else 'no_response',
+            'data': response[1] if response and len(response) > 1 else None
+        }
+
+    async def stream_batch(self, commands: List[Dict[str, Any]], pipelined: bool, send) -> None:
+        """
+        Send one JSON line per command as soon as it is acknowledged, then a
+        summary line. elapsed is seconds since the batch arrived and interval is
+        seconds since the previous acknowledgment, which is roughly how long the
+        previous move ran since the firmware acknowledges a move when it starts.
+        A command that misses its acknowledgment deadline gets a "stalled" line
+        straight away, and its own line later if the acknowledgment does come.
+        """
+        # Reject a bad batch before anything moves rather than part way through the stream
+        for command in commands:
+            if pipelined or command.get('command') != 'pour_pattern':
+                self.validate_command_parameters(command)
+
+        started = last = time.perf_counter()
+        errors = 0
+
+        async def emit(index, command, response):
+            nonlocal last, errors
+            now = time.perf_counter()
+            line = self.format_response(command, response)
+            line.update(index=index, elapsed=round(now - started, 4), interval=round(now - last, 4))
+            last = now
+            if line['status'] == 'error':
+                errors += 1
+            await send(line)
+
+        async def stalled(index, command, info):
+            await send({'command': command['command'], 'status': 'stalled', 'data': info, 'index': index,
+                        'elapsed': round(time.perf_counter() - started, 4)})
+
+        if pipelined:
+            await self.execute_pipelined(commands, on_result=emit, on_stall=stalled)
+        else:
+            await self.execute_sequential(commands, on_result=emit, on_stall=stalled)
+
+        summary = {
+            'total': len(commands),
+            'completed': len(commands) - errors,
+            'errors': errors,
+            'elapsed': round(time.perf_counter() - started, 4),
+        }
+        await send({'summary': summary})
+
+    async def handle_request(self, received_data: Any, send) -> None:
+        """
+        Run one request line and send its response line(s). Requests carrying an
+        "id" get it echoed on every line they produce, with batch results wrapped
+        as {"id": ..., "responses": [...]}.
+        """
+        request_id = received_data.get('id') if isinstance(received_data, dict) else None
+
+        async def reply(payload):
+            if request_id is not None:
+                payload = {'id': request_id, 'responses': payload} if isinstance(payload, list) \
+                    else {'id': request_id, **payload}
+            await send(payload)
+
         try:
-            if cmd_type == 'zero_spout':
-                await loop.run_in_executor(None, self.messenger.send, 'zero_spout')
-                logger.info(f"Sent command: zero_spout")
-                response = await asyncio.wait_for(self.wait_for_response('zero_done'), timeout=30)
-
-            elif cmd_type == 'move_cone':
-                steps = command['steps']
-                speed = command['speed']
-                direction = command['direction']
-                await loop.run_in_executor(None, self.messenger.send, 'move_cone', steps, speed, direction)
-                logger.info(f"Sent command: move_cone with steps={steps}, speed={speed}, direction={direction}")
-                response = await asyncio.wait_for(self.wait_for_response('cone_done'), timeout=30)
-
-            elif cmd_type == 'move_spout':
-                degrees = command['degrees']
-                speed = command['speed']
-                direction = command['direction']
-                await loop.run_in_executor(None, self.messenger.send, 'move_spout', degrees, speed, direction)
-                logger.info(f"Sent command: move_spout with degrees={degrees}, speed={speed}, direction={direction}")
-                response = await asyncio.wait_for(self.wait_for_response('spout_done'), timeout=30)
-
-            elif cmd_type == 'move_both':
-                cone_steps = command['cone_steps']
-                cone_speed = command['cone_speed']
-                spout_degrees = command['spout_degrees']
-                spout_speed = command['spout_speed']
-                direction = command['direction']
-                await loop.run_in_executor(
-                    None,
-                    self.messenger.send,
-                    'move_both',
-                    cone_steps,
-                    cone_speed,
-                    spout_degrees,
-                    spout_speed,
-                    direction
-                )
-                logger.info(f"Sent command: move_both with cone_steps={cone_steps}, cone_speed={cone_speed}, "
-                            f"spout_degrees={spout_degrees}, spout_speed={spout_speed}, direction={direction}")
-                response = await asyncio.wait_for(self.wait_for_response('both_done'), timeout=30)
+            responses = []
 
+            if isinstance(received_data, dict) and 'commands' in received_data:
+                # Batch with options: {"pipelined": true, "stream": true, "commands": [...]}
+                commands = received_data['commands']
+                if received_data.get('stream'):
+                    await self.stream_batch(commands, received_data.get('pipelined', False), reply)
+                    return
+                if received_data.get('pipelined'):
+                    results = await self.execute_pipelined(commands)
+                else:
+                    results = await self.execute_sequential(commands)
+                responses = [self.format_response(command, response)
+                             for command, response in zip(commands, results)]
+            elif isinstance(received_data, list):
+                # Handle array of commands
+                for command in received_data:
+                    response = await self.execute_command(command)
+                    responses.append(self.format_response(command, response))
             else:
-                raise ValueError(f"Unknown command type: {cmd_type}")
+                # Handle single command
+                response = await self.execute_command(received_data)
+                responses.append(self.format_response(received_data, response))
 
-            return response
+            # Send response back to client
+            await reply(responses)
 
         except Exception as e:
-            logger.error(f"Error executing command {cmd_type}: {str(e)}", exc_info=True)
-            return ['error', str(e)]
+            logger.error(f"Error handling command: {e}", exc_info=True)
+            await reply({'error': str(e)})
 
     async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
-        while True:
+        in_flight = set()
+
+        async def send(payload):
+            # Each response is written as a single line, so concurrent requests can share the connection
+            writer.write((json.dumps(payload) + '\n').encode())
             try:
-                data = await reader.readline()
-                if not data:
-                    break
+                await writer.drain()
+            except ConnectionError as e:
+                logger.warning(f"Client went away before its response was sent: {e}")
+
+        while True:
+            data = await reader.readline()
+            if not data:
+                break
 
+            try:
                 received_data = json.loads(data.decode())
-                responses = []
-
-                if isinstance(received_data, list):
-                    # Handle array of commands
-                    for command in received_data:
-                        response = await self.execute_command(command)
-                        responses.append({
-                            'command': command['command'],
-                            'status': response[0] if response else 'no_response',
-                            'data': response[1] if response and len(response) > 1 else None
-                        })
-                else:
-                    # Handle single command
-                    response = await self.execute_command(received_data)
-                    responses.append({
-                        'command': received_data['command'],
-                        'status': response[0] if response else 'no_response',
-                        'data': response[1] if response and len(response) > 1 else None
-                    })
-
-                # Send response back to client
-                writer.write((json.dumps(responses) + '\n').encode())
-                await writer.drain()
+            except json.JSONDecodeError as e:
+                await send({'error': f"Invalid JSON: {e}"})
+                continue
 
-            except Exception as e:
-                logger.error(f"Error handling command: {e}", exc_info=True)
-                error_response = json.dumps({'error': str(e)})
-                writer.write((error_response + '\n').encode())
-                await writer.drain()
+            if isinstance(received_data, dict) and 'id' in received_data:
+                # Requests with an id may run concurrently; responses can come back in any order
+                task = asyncio.create_task(self.handle_request(received_data, send))
+                in_flight.add(task)
+                task.add_done_callback(in_flight.discard)
+            else:
+                await self.handle_request(received_data, send)
+
+        # Moves already queued on the board carry on, so let their requests finish
+        if in_flight:
+            await asyncio.wait(in_flight)
 
     async def start_server(self) -> None:
+        # One credit per free slot in the firmware command queue; an acknowledgment means
+        # the command was dequeued, so it hands its credit back
+        self._credits = asyncio.Semaphore(FIRMWARE_QUEUE_SLOTS)
+        # asyncio locks are FIFO, so conflicting requests queue in arrival order
+        self._axis_locks = {axis: asyncio.Lock() for axis in AXES}
+        # Cleared while the spout homes: zero_spout blocks the firmware loop, which stops reading
+        # serial until zero_done, so writes are held back rather than overrunning its buffer
+        self._serial_ready = asyncio.Event()
+        self._serial_ready.set()
+        self.start_reader()
+
         try:
             if os.path.exists(self.socket_path):
                 os.unlink(self.socket_path)
@@ -174,6 +567,8 @@ class MechControlService:
             await server.serve_forever()
 
     def cleanup(self) -> None:
+        self._reader_stopped.set()
+        self._writer.shutdown(wait=False)
         self.arduino.close()
         try:
             if os.path.exists(self.socket_path):
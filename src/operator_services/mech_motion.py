@@ -0,0 +1,398 @@
+import math
+import os
+from collections import deque
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+# Spout geometry and motion settings mirrored from microcontroller/mech-control.ino:
+# a 0.9° stepper at 1/32 microstepping behind a 40:20 pulley.
+STEP_ANGLE = 0.9
+MICROSTEPS = 32
+PULLEY_RATIO = 40.0 / 20.0
+SPOUT_STEPS_PER_DEGREE = (1.0 / STEP_ANGLE) * MICROSTEPS * PULLEY_RATIO
+# The firmware moves the cone in raw steps and defines no ratio for it. This default assumes the
+# same stepper, microstepping and 40:20 pulley as the spout; until it has been measured on the
+# hardware, set MECH_CONTROL_CONE_STEPS_PER_REV to the steps one full cone turn really takes.
+CONE_STEPS_PER_REV = int(os.environ.get('MECH_CONTROL_CONE_STEPS_PER_REV', round(360 * SPOUT_STEPS_PER_DEGREE)))
+ACCELERATION = 10000
+# Speeds travel as 2-byte ints over CmdMessenger
+MAX_SPEED = 32767
+# AccelStepper's run() manages about 4000 steps/s on a 16 MHz Uno; compiled patterns stay under it
+MAX_STEP_RATE = 4000
+# Spout max speed set in the firmware's setup(); used when a segment only has to hold position
+SPOUT_TRAVEL_SPEED = 2000
+# zeroSpoutStepper(): constant speed up to the limit switch, then back off 41° and call it zero
+HOMING_SPEED = 3000
+HOMING_BACKOFF_DEGREES = 41
+# Homing distance depends on where the spout was, so its acknowledgment gets a fixed allowance
+HOMING_TIMEOUT = 30.0
+# Slack on every acknowledgment deadline for serial transfer at 9600 baud and loop jitter
+ACK_MARGIN = 0.3
+
+DEFAULT_SEGMENTS_PER_REV = 8
+# Per-segment rounding of steps and speeds may run a compiled pattern this much over its duration
+DURATION_TOLERANCE = 0.02
+
+def cruise_speed(steps: float, seconds: float, acceleration: float = ACCELERATION) -> int:
+    """
+    Max speed (steps/s) that makes an AccelStepper move of `steps` take
+    `seconds`, accounting for the accelerate/decelerate ramps. Moves too short
+    to fit the ramps in that time get the speed that makes them triangular.
+    """
+    steps = abs(steps)
+    if steps == 0:
+        return 1
+    if seconds <= 0:
+        return MAX_SPEED
+    # seconds = steps / v + v / a  =>  v^2 - a*t*v + a*steps = 0
+    discriminant = (acceleration * seconds) ** 2 - 4 * acceleration * steps
+    if discriminant < 0:
+        speed = math.sqrt(acceleration * steps)
+    else:
+        speed = (acceleration * seconds - math.sqrt(discriminant)) / 2
+    return int(min(MAX_SPEED, max(1, math.ceil(speed))))
+
+def move_duration(steps: float, max_speed: float, acceleration: float = ACCELERATION) -> float:
+    """
+    Seconds an AccelStepper takes to move `steps` from rest to rest: a
+    trapezoidal profile when there is room to reach max_speed, otherwise a
+    triangular one.
+    """
+    steps = abs(steps)
+    max_speed = abs(max_speed)
+    if steps == 0:
+        return 0.0
+    if max_speed == 0:
+        return math.inf
+    if steps >= max_speed ** 2 / acceleration:
+        return steps / max_speed + max_speed / acceleration
+    return 2 * math.sqrt(steps / acceleration)
+
+def estimate_seconds(command: Dict[str, Any], spout_target: int = 0) -> float:
+    """
+    How long a firmware command keeps the steppers busy once it starts.
+    spout_target is the firmware's spout position (in degrees) before the
+    command, since spout moves are absolute.
+    """
+    kind = command['command']
+    if kind == 'move_cone':
+        return move_duration(command['steps'], command['speed'])
+    if kind == 'move_spout':
+        return move_duration((command['degrees'] - spout_target) * SPOUT_STEPS_PER_DEGREE, command['speed'])
+    if kind == 'move_both':
+        return max(move_duration(command['cone_steps'], command['cone_speed']),
+                   move_duration((command['spout_degrees'] - spout_target) * SPOUT_STEPS_PER_DEGREE,
+                                 command['spout_speed']))
+    return 0.0
+
+@dataclass
+class ScheduledMove:
+    command: str
+    expected_start: float
+    duration: float
+    # zero_spout is acknowledged when homing ends rather than when it starts
+    ack_delay: float = 0.0
+    # Sent while earlier motion was still running, so it starts the moment that motion ends
+    queued_behind: bool = False
+    started: float = None
+    actual: float = None
+
+class MotionSchedule:
+    """
+    Predicts when each queued command will be dequeued by the firmware, which
+    is when it is acknowledged, so every command gets its own deadline instead
+    of a fixed timeout. Each acknowledgment re-anchors the commands behind it
+    to the real clock, and a command acknowledged straight after the previous
+    one finished gives that previous move's actual duration.
+    """
+    def __init__(self, ack_margin: float = ACK_MARGIN):
+        self.ack_margin = ack_margin
+        self.queued = deque()
+        self.busy_until = 0.0
+        self.last_started = None
+
+    def add(self, command: str, duration: float, now: float, ack_delay: float = 0.0) -> ScheduledMove:
+        start = max(now, self.busy_until)
+        move = ScheduledMove(command, start, duration, ack_delay, queued_behind=start > now)
+        self.busy_until = start + ack_delay + duration
+        self.queued.append(move)
+        return move
+
+    def deadline(self, move: ScheduledMove) -> float:
+        return move.expected_start + move.ack_delay + self.ack_margin
+
+    def _shift_after(self, move: ScheduledMove, delta: float) -> None:
+        index = self.queued.index(move)
+        for later in list(self.queued)[index + 1:]:
+            later.expected_start += delta
+        self.busy_until += delta
+        del self.queued[index]
+
+    def acknowledged(self, move: ScheduledMove, now: float) -> Optional[ScheduledMove]:
+        """
+        Record that `move` started at `now`. Returns the previous move if this
+        acknowledgment measured how long it actually ran.
+        """
+        if move in self.queued:
+            self._shift_after(move, now - (move.expected_start + move.ack_delay))
+        move.started = now
+        previous, self.last_started = self.last_started, move
+        if previous is not None and move.queued_behind and previous.actual is None:
+            previous.actual = now - previous.started
+            return previous
+        return None
+
+    def dropped(self, move: ScheduledMove) -> None:
+        """
+        The firmware rejected the command or it timed out; stop counting its motion.
+        """
+        if move in self.queued:
+            self._shift_after(move, -(move.ack_delay + move.duration))
+
+def move_both(cone_steps: int, cone_speed: int, spout_degrees: int, spout_speed: int, direction: int) -> Dict[str, Any]:
+    return {
+        'command': 'move_both',
+        'cone_steps': cone_steps,
+        'cone_speed': cone_speed,
+        'spout_degrees': spout_degrees,
+        'spout_speed': spout_speed,
+        'direction': direction,
+    }
+
+def optimize_plan(commands: List[Dict[str, Any]], spout_position: Optional[int] = None) -> List[Dict[str, Any]]:
+    """
+    Drop moves that go nowhere, reduce single-axis move_both commands to
+    move_cone / move_spout, and merge adjacent moves: consecutive cone moves
+    at the same speed become one, and a cone move next to a spout move
+    becomes a single move_both. Spout targets are absolute, so a spout move
+    to where the spout already is counts as zero-length; pass spout_position
+    if it is known before the plan starts.
+    """
+    plan = []
+    spout = spout_position
+    for command in commands:
+        command = dict(command)
+        kind = command['command']
+        if kind == 'move_both':
+            still_cone = command['cone_steps'] == 0
+            still_spout = command['spout_degrees'] == spout
+            if still_cone and still_spout:
+                continue
+            if still_cone:
+                command = {'command': 'move_spout', 'degrees': command['spout_degrees'],
+                           'speed': command['spout_speed'], 'direction': command['direction']}
+            elif still_spout:
+                command = {'command': 'move_cone', 'steps': command['cone_steps'],
+                           'speed': command['cone_speed'], 'direction': command['direction']}
+        elif kind == 'move_cone' and command['steps'] == 0:
+            continue
+        elif kind == 'move_spout' and command['degrees'] == spout:
+            continue
+
+        kind = command['command']
+        previous = plan[-1] if plan else None
+        if previous is not None and previous.get('direction') == command.get('direction'):
+            pair = {previous['command'], kind}
+            if kind == previous['command'] == 'move_cone' and command['speed'] == previous['speed']:
+                previous['steps'] += command['steps']
+                continue
+            if pair == {'move_cone', 'move_spout'}:
+                cone, spout_move = (previous, command) if previous['command'] == 'move_cone' else (command, previous)
+                plan[-1] = move_both(cone['steps'], cone['speed'], spout_move['degrees'],
+                                     spout_move['speed'], command['direction'])
+                spout = spout_move['degrees']
+                continue
+
+        if kind == 'move_spout':
+            spout = command['degrees']
+        elif kind == 'move_both':
+            spout = command['spout_degrees']
+        elif kind == 'zero_spout':
+            spout = 0
+        plan.append(command)
+    return plan
+
+def plan_seconds(commands: List[Dict[str, Any]], spout_start: int = 0) -> float:
+    """
+    Total time the steppers spend on `commands` run back to back, starting
+    with the firmware's spout target at spout_start.
+    """
+    total = 0.0
+    spout = spout_start
+    for command in commands:
+        total += estimate_seconds(command, spout)
+        spout = command.get('spout_degrees', command.get('degrees', spout))
+    return total
+
+def _sweep(spout_targets: List[int], revolutions: float, duration: float, spout_start: int,
+           direction: int) -> List[Dict[str, Any]]:
+    """
+    Split a pattern into equal-time move_both segments: the cone turns
+    `revolutions` evenly across them while the spout steps through spout_targets.
+    Every segment starts and stops at rest, so a plan can take longer than
+    `duration` when its segments are too short or need more than MAX_STEP_RATE.
+    """
+    segments = len(spout_targets)
+    segment_time = duration / segments
+    cone_total = round(revolutions * CONE_STEPS_PER_REV)
+    commands = []
+    previous_spout = spout_start
+    for i, spout in enumerate(spout_targets, start=1):
+        cone_steps = round(cone_total * i / segments) - round(cone_total * (i - 1) / segments)
+        spout_steps = abs(spout - previous_spout) * SPOUT_STEPS_PER_DEGREE
+        spout_speed = min(cruise_speed(spout_steps, segment_time), MAX_STEP_RATE) if spout_steps else SPOUT_TRAVEL_SPEED
+        commands.append(move_both(cone_steps, min(cruise_speed(cone_steps, segment_time), MAX_STEP_RATE),
+                                  spout, spout_speed, direction))
+        previous_spout = spout
+    return commands
+
+def _fits(commands: List[Dict[str, Any]], duration: float, spout_start: int) -> bool:
+    return plan_seconds(commands, spout_start) <= duration * (1 + DURATION_TOLERANCE)
+
+def compile_spiral(radius: float, revolutions: float, duration: float, start_radius: float = 0,
+                   segments_per_rev: float = DEFAULT_SEGMENTS_PER_REV, direction: int = 0) -> List[Dict[str, Any]]:
+    """
+    Spiral from start_radius out to radius (both in spout degrees) while the
+    cone turns `revolutions` times over `duration` seconds. If the stop-start
+    segments can't fit in `duration`, the spiral uses fewer, longer ones;
+    ValueError if even a single segment is too slow.
+    """
+    start = round(start_radius)
+    plan = []
+    for segments in range(max(1, round(revolutions * segments_per_rev)), 0, -1):
+        targets = [round(start_radius + (radius - start_radius) * i / segments) for i in range(1, segments + 1)]
+        plan = _sweep(targets, revolutions, duration, start, direction)
+        if _fits(plan, duration, start):
+            return plan
+    raise ValueError(f"Spiral needs at least {plan_seconds(plan, start):.1f}s, not {duration}s")
+
+def compile_pulse(radius: float, pulses: int, duration: float, revolutions: float = 0,
+                  start_radius: float = 0, direction: int = 0) -> List[Dict[str, Any]]:
+    """
+    Swing the spout out to radius and back to start_radius `pulses` times
+    over `duration` seconds, optionally turning the cone meanwhile.
+    ValueError if the swings can't fit in `duration`.
+    """
+    start = round(start_radius)
+    targets = [round(radius), start] * max(1, int(pulses))
+    plan = _sweep(targets, revolutions, duration, start, direction)
+    if not _fits(plan, duration, start):
+        raise ValueError(f"{len(targets) // 2} pulses need at least {plan_seconds(plan, start):.1f}s, not {duration}s")
+    return plan
+
+class KinematicState:
+    """
+    Host-side model of where each axis ends up once every command sent so far
+    has run. The cone has no home switch, so its position counts from when the
+    service started; the spout is known only after zero_spout. An axis stops
+    being trusted when a command on it fails or times out, since the firmware
+    may or may not have queued it.
+
+    direction == 1 inverts the driver's direction pin, so it flips the
+    physical direction of a move without changing the firmware's own position
+    counter. The spout keeps both: `spout_target` is the firmware's absolute
+    target in degrees and `spout` the physical position in degrees from zero.
+    """
+    def __init__(self):
+        self.cone = 0
+        self.cone_trusted = True
+        self.spout = 0
+        self.spout_target = 0
+        self.spout_trusted = False
+
+    def apply(self, command: Dict[str, Any]) -> None:
+        kind = command['command']
+        sign = -1 if command.get('direction') == 1 else 1
+        if kind == 'move_cone':
+            self.cone += sign * command['steps']
+        elif kind == 'move_spout':
+            self._move_spout(command['degrees'], sign)
+        elif kind == 'move_both':
+            self.cone += sign * command['cone_steps']
+            self._move_spout(command['spout_degrees'], sign)
+        elif kind == 'zero_spout':
+            self.spout = self.spout_target = 0
+            self.spout_trusted = True
+
+    def _move_spout(self, degrees: int, sign: int) -> None:
+        self.spout += sign * (degrees - self.spout_target)
+        self.spout_target = degrees
+
+    def invalidate(self, axes) -> None:
+        if 'cone' in axes:
+            self.cone_trusted = False
+        if 'spout' in axes:
+            self.spout_trusted = False
+
+    def goto_cone(self, angle: float, speed: int) -> Optional[Dict[str, Any]]:
+        """
+        Shortest move_cone to `angle` degrees (relative to the service's start
+        position), or None if the cone is already there.
+        """
+        if not self.cone_trusted:
+            raise ValueError("Cone position is unknown")
+        target = round(angle % 360 / 360 * CONE_STEPS_PER_REV)
+        delta = (target - self.cone) % CONE_STEPS_PER_REV
+        if delta > CONE_STEPS_PER_REV // 2:
+            delta -= CONE_STEPS_PER_REV
+        if delta == 0:
+            return None
+        return {'command': 'move_cone', 'steps': abs(delta), 'speed': speed, 'direction': 1 if delta < 0 else 0}
+
+    def goto_spout(self, degrees: int, speed: int) -> Optional[Dict[str, Any]]:
+        """
+        move_spout that brings the spout to `degrees` from zero, or None if it is already there.
+        """
+        if not self.spout_trusted:
+            raise ValueError("Spout position is unknown; run zero_spout first")
+        if degrees == self.spout:
+            return None
+        return {'command': 'move_spout', 'degrees': self.spout_target + degrees - self.spout,
+                'speed': speed, 'direction': 0}
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'cone_steps': self.cone,
+            'cone_angle': round(self.cone % CONE_STEPS_PER_REV / CONE_STEPS_PER_REV * 360, 3),
+            'cone_trusted': self.cone_trusted,
+            'spout_degrees': self.spout,
+            'spout_trusted': self.spout_trusted,
+        }
+
+PATTERNS = {
+    'spiral': compile_spiral,
+    'pulse': compile_pulse,
+}
+
+def plan_key(pattern: str, params: Dict[str, Any]) -> Tuple[str, Tuple]:
+    """
+    Normalise pattern parameters into a hashable cache key, so 3 and 3.0 hit the same plan.
+    """
+    return pattern, tuple(sorted((name, float(value)) for name, value in params.items()))
+
+@lru_cache(maxsize=128)
+def _compile_cached(pattern: str, params: Tuple) -> Tuple[Dict[str, Any], ...]:
+    kwargs = dict(params)
+    if 'direction' in kwargs:
+        kwargs['direction'] = int(kwargs['direction'])
+    if 'pulses' in kwargs:
+        kwargs['pulses'] = int(kwargs['pulses'])
+    try:
+        commands = PATTERNS[pattern](**kwargs)
+    except TypeError as e:
+        raise ValueError(f"Invalid parameters for {pattern} pattern: {e}")
+    # The spout may not be at start_radius yet, so the first spout move is always kept
+    return tuple(optimize_plan(commands))
+
+def compile_pattern(pattern: str, **params) -> Tuple[Dict[str, Any], ...]:
+    """
+    Compile a pour pattern into firmware commands. Plans are cached by their
+    parameters; treat the returned commands as read-only.
+    """
+    if pattern not in PATTERNS:
+        raise ValueError(f"Unknown pattern: {pattern}")
+    try:
+        return _compile_cached(*plan_key(pattern, params))
+    except (TypeError, ValueError) as e:
+        raise ValueError(str(e))
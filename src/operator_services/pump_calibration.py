@@ -0,0 +1,88 @@
+import configparser
+import os
+from dataclasses import dataclass
+from typing import Any, Dict
+import numpy as np
+
+WATER_DENSITY = 1.0  # g/ml
+DEFAULT_NOMINAL_FLOW = 10.0  # ml/s at 100%, only used until a speed has been measured
+MAX_SAMPLES = 10
+SPEED_RESOLUTION = 1.0
+
+@dataclass
+class CalibrationPoint:
+    flow: float
+    samples: int
+
+class CalibrationTable:
+    """
+    Effective flow rate (ml/s) against pump speed, learned from measured
+    runs. Each run updates the point for its speed (rounded to
+    SPEED_RESOLUTION) with a running mean over at most MAX_SAMPLES runs, so
+    the table follows slow drift such as a changing head pressure. Speeds
+    between points are interpolated; outside the measured range, flow is
+    taken as proportional to speed from the nearest point.
+    """
+    def __init__(self, path: str, nominal_flow: float = DEFAULT_NOMINAL_FLOW):
+        self.path = path
+        self.nominal_flow = nominal_flow
+        self.points: Dict[float, CalibrationPoint] = {}
+
+    @classmethod
+    def load(cls, path: str, nominal_flow: float = DEFAULT_NOMINAL_FLOW) -> 'CalibrationTable':
+        table = cls(path, nominal_flow)
+        config = configparser.ConfigParser()
+        config.read(path)
+        for section in config.sections():
+            table.points[config.getfloat(section, 'speed')] = CalibrationPoint(
+                config.getfloat(section, 'flow_rate'), config.getint(section, 'samples', fallback=1))
+        return table
+
+    def save(self) -> None:
+        config = configparser.ConfigParser()
+        for speed, point in sorted(self.points.items()):
+            config[f'speed_{speed:g}'] = {'speed': f'{speed:g}', 'flow_rate': f'{point.flow:.4f}',
+                                         'samples': str(point.samples)}
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Write beside the table and swap it in, so a crash never leaves half a file
+        temporary = self.path + '.tmp'
+        with open(temporary, 'w') as configfile:
+            config.write(configfile)
+        os.replace(temporary, self.path)
+
+    def flow_rate(self, speed: float) -> float:
+        if not self.points:
+            return self.nominal_flow * speed / 100
+        speeds = np.array(sorted(self.points))
+        flows = np.array([self.points[s].flow for s in speeds])
+        if speed <= speeds[0]:
+            return float(flows[0] * speed / speeds[0])
+        if speed >= speeds[-1]:
+            return float(flows[-1] * speed / speeds[-1])
+        return float(np.interp(speed, speeds, flows))
+
+    def duration_for(self, ml: float, speed: float) -> float:
+        return ml / self.flow_rate(speed)
+
+    def update(self, speed: float, seconds: float, ml: float) -> CalibrationPoint:
+        """
+        Fold in one run that delivered `ml` in `seconds` at `speed`.
+        """
+        measured = ml / seconds
+        key = round(speed / SPEED_RESOLUTION) * SPEED_RESOLUTION
+        point = self.points.get(key)
+        if point is None:
+            point = self.points[key] = CalibrationPoint(measured, 1)
+        else:
+            point.samples = min(point.samples + 1, MAX_SAMPLES)
+            point.flow += (measured - point.flow) / point.samples
+        return point
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            'nominal_flow_rate': self.nominal_flow,
+            'points': [{'speed': speed, 'flow_rate': round(point.flow, 4), 'samples': point.samples}
+                       for speed, point in sorted(self.points.items())],
+        }
@@ -0,0 +1,118 @@
+from typing import Any, Dict, Optional
+
+DEFAULT_KP = 2.0
+DEFAULT_KI = 1.0
+DEFAULT_KD = 0.0
+DEFAULT_BASE_SPEED = 70.0
+DEFAULT_IN_FLIGHT = 0.5
+DEFAULT_FLOW_WINDOW = 0.5
+DEFAULT_POUR_TIMEOUT = 120.0
+
+class PIDController:
+    """
+    PID with a fixed bias (the feed-forward output) and output limits. The
+    integral only accumulates while the output is unsaturated or the error
+    pulls it back inside the limits, so a long saturated stretch at the start
+    of a pour doesn't wind it up.
+    """
+    def __init__(self, kp: float, ki: float, kd: float, output_min: float, output_max: float,
+                 bias: float = 0.0):
+        self.kp = kp
+        self.ki = ki
+        self.kd = kd
+        self.output_min = output_min
+        self.output_max = output_max
+        self.bias = bias
+        self.integral = 0.0
+        self.last_error: Optional[float] = None
+
+    def update(self, error: float, dt: float) -> float:
+        derivative = 0.0
+        if self.last_error is not None and dt > 0:
+            derivative = (error - self.last_error) / dt
+        self.last_error = error
+
+        integral = self.integral + error * dt
+        output = self.bias + self.kp * error + self.ki * integral + self.kd * derivative
+        if output > self.output_max:
+            if error < 0:
+                self.integral = integral
+            return self.output_max
+        if output < self.output_min:
+            if error > 0:
+                self.integral = integral
+            return self.output_min
+        self.integral = integral
+        return output
+
+class PourController:
+    """
+    Turns mug-scale stream frames into pump speeds for one pour: PID on the
+    measured flow rate towards target_flow, and a cutoff as soon as the
+    weight plus the water still in flight (flow rate × in_flight seconds)
+    reaches the target. Weights are relative to the mug's weight at the start
+    of the pour.
+    """
+    def __init__(self, target_weight: float, target_flow: float, pid: PIDController,
+                 in_flight: float = DEFAULT_IN_FLIGHT):
+        self.target_weight = target_weight
+        self.target_flow = target_flow
+        self.pid = pid
+        self.in_flight = in_flight
+        self.started_at: Optional[float] = None
+        self.last_timestamp: Optional[float] = None
+        self.last_weight = 0.0
+        self.cutoff: Optional[Dict[str, float]] = None
+
+    def update(self, weight: float, flow: Optional[float], timestamp: float) -> Optional[float]:
+        """
+        Feed one frame; returns the pump speed in percent, or None once the
+        pump should stop.
+        """
+        if self.started_at is None:
+            self.started_at = timestamp
+        dt = timestamp - self.last_timestamp if self.last_timestamp is not None else 0.0
+        self.last_timestamp = timestamp
+        self.last_weight = weight
+
+        rate = max(flow or 0.0, 0.0)
+        predicted = weight + rate * self.in_flight
+        if predicted >= self.target_weight:
+            self.cutoff = {'weight': weight, 'flow_rate': rate, 'predicted': predicted,
+                           'elapsed': timestamp - self.started_at}
+            return None
+        # No flow estimate until the scale has a window of samples: run open loop
+        if flow is None:
+            return self.pid.bias
+        return self.pid.update(self.target_flow - flow, dt)
+
+    def report(self, final_weight: Optional[float], duration: float, status: str) -> Dict[str, Any]:
+        """
+        Accuracy and overshoot of the pour. final_weight is the settled weight
+        (None if the scale never settled, in which case the last streamed
+        weight stands in for it).
+        """
+        settled = final_weight is not None
+        final = final_weight if settled else self.last_weight
+        error = final - self.target_weight
+        report = {
+            'status': status,
+            'target_weight': self.target_weight,
+            'final_weight': round(final, 2),
+            'settled': settled,
+            'error': round(error, 2),
+            'overshoot': round(max(error, 0.0), 2),
+            'accuracy_pct': round(100.0 * (1 - abs(error) / self.target_weight), 2),
+            'target_flow_rate': self.target_flow,
+            'duration': round(duration, 3),
+        }
+        if self.cutoff:
+            cutoff = self.cutoff
+            report['cutoff_weight'] = round(cutoff['weight'], 2)
+            report['cutoff_flow_rate'] = round(cutoff['flow_rate'], 3)
+            if cutoff['elapsed'] > 0:
+                report['mean_flow_rate'] = round(cutoff['weight'] / cutoff['elapsed'], 3)
+            # What in_flight should have been for this pour to land exactly on target
+            if cutoff['flow_rate'] > 0:
+                report['observed_in_flight'] = round((final - cutoff['weight']) / cutoff['flow_rate'], 3)
+        return report
@@ -0,0 +1,40 @@
+from typing import Callable, Dict
+
+DEFAULT_RAMP_INTERVAL = 0.01
+HARDWARE_DUTY_RANGE = 1_000_000
+SOFTWARE_DUTY_RANGE = 255
+
+def soft_start(x: float) -> float:
+    # Gentle at first, so the motor doesn't see a current spike, then quicker
+    return x * x
+
+def linear(x: float) -> float:
+    return x
+
+def s_curve(x: float) -> float:
+    # Smoothstep: zero slope at both ends, so there is no jerk starting or finishing
+    return x * x * (3 - 2 * x)
+
+RAMP_PROFILES: Dict[str, Callable[[float], float]] = {
+    'soft_start': soft_start,
+    'linear': linear,
+    's_curve': s_curve,
+}
+
+def ramp_speed(profile: str, start: float, end: float, duration: float, elapsed: float) -> float:
+    """
+    Speed `elapsed` seconds into a ramp from start to end. It depends on
+    elapsed time rather than on a step count, so a late timer tick lands on
+    the right point of the curve instead of falling behind it.
+    """
+    if duration <= 0 or elapsed >= duration:
+        return end
+    fraction = RAMP_PROFILES[profile](max(elapsed, 0.0) / duration)
+    return start + (end - start) * fraction
+
+def duty_cycle(speed: float, duty_range: int) -> int:
+    """
+    Map a speed in percent onto a PWM duty cycle: 0–255 for pigpio's
+    software PWM, 0–1e6 for hardware PWM.
+    """
+    return int(round(speed * duty_range / 100))
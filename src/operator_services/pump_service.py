@@ -1,25 +1,50 @@
+import asyncio
 import configparser
-import socket
 import os
-import sys
 import signal
-import time
 import logging
 import json
+import time
 from enum import Enum
+from typing import Literal, Optional
 import pigpio
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, Field, field_validator
+from pump_pour import (DEFAULT_BASE_SPEED, DEFAULT_FLOW_WINDOW, DEFAULT_IN_FLIGHT, DEFAULT_KD, DEFAULT_KI,
+                       DEFAULT_KP, DEFAULT_POUR_TIMEOUT, PIDController, PourController)
+from pump_calibration import DEFAULT_NOMINAL_FLOW, WATER_DENSITY, CalibrationTable
+from pump_ramp import DEFAULT_RAMP_INTERVAL, HARDWARE_DUTY_RANGE, SOFTWARE_DUTY_RANGE, duty_cycle, ramp_speed
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
 # Load configurations
 config = configparser.ConfigParser()
-config.read('hardware_config.ini')
+config_path = os.path.join('src', 'operator_app', 'hardware_config.ini')
+config.read(config_path)
 MIN_FLOW_RATE = config.getint('PUMP', 'MIN_FLOW_RATE', fallback=40)
 FORWARD_PIN = config.getint('PUMP', 'FORWARD_PIN', fallback=13)
 REVERSE_PIN = config.getint('PUMP', 'REVERSE_PIN', fallback=19)
+# "software" is pigpio's 0-255 PWM on any pin; "hardware" drives the SoC PWM
+# with 1e6 duty steps at PWM_FREQUENCY. GPIO13 and GPIO19 share a PWM channel,
+# which is fine because only the pin for the current direction is ever driven.
+PWM_MODE = config.get('PUMP', 'PWM_MODE', fallback='software')
+PWM_FREQUENCY = config.getint('PUMP', 'PWM_FREQUENCY', fallback=20000)
+RAMP_INTERVAL = config.getfloat('PUMP', 'RAMP_INTERVAL', fallback=DEFAULT_RAMP_INTERVAL)
 SOCKET_PATH = config.get('SERVICE', 'SOCKET_PATH', fallback='/tmp/pump_control.sock')
+POUR_SCALE_SOCKET = config.get('PUMP', 'POUR_SCALE_SOCKET', fallback='/tmp/mug_scale_service.sock')
+POUR_KP = config.getfloat('PUMP', 'POUR_KP', fallback=DEFAULT_KP)
+POUR_KI = config.getfloat('PUMP', 'POUR_KI', fallback=DEFAULT_KI)
+POUR_KD = config.getfloat('PUMP', 'POUR_KD', fallback=DEFAULT_KD)
+POUR_BASE_SPEED = config.getfloat('PUMP', 'POUR_BASE_SPEED', fallback=DEFAULT_BASE_SPEED)
+POUR_IN_FLIGHT = config.getfloat('PUMP', 'POUR_IN_FLIGHT', fallback=DEFAULT_IN_FLIGHT)
+POUR_FLOW_WINDOW = config.getfloat('PUMP', 'POUR_FLOW_WINDOW', fallback=DEFAULT_FLOW_WINDOW)
+CALIBRATION_PATH = config.get('PUMP', 'CALIBRATION_FILE',
+                              fallback=os.path.join('src', 'operator_services', 'config', 'pump_calibration.ini'))
+NOMINAL_FLOW_RATE = config.getfloat('PUMP', 'NOMINAL_FLOW_RATE', fallback=DEFAULT_NOMINAL_FLOW)
+SCALE_TIMEOUT = 5.0
+SETTLE_TOLERANCE = 0.2
+SETTLE_DURATION = 1.0
+SETTLE_TIMEOUT = 10.0
 
 class PumpDirection(str, Enum):
     forward = "forward"
@@ -31,19 +56,48 @@ class PumpControl(BaseModel):
 
 class PumpSpeedControl(BaseModel):
     direction: PumpDirection
-    speed: int = Field(..., ge=MIN_FLOW_RATE, le=100, description="Flow rate from MIN_FLOW_RATE to 100")
+    speed: float = Field(..., ge=MIN_FLOW_RATE, le=100, description="Flow rate from MIN_FLOW_RATE to 100")
+
+class PumpRamp(BaseModel):
+    direction: Literal[PumpDirection.forward, PumpDirection.reverse]
+    speed: float = Field(..., ge=0, le=100, description="Speed to ramp to; 0 ramps down and stops the pump")
+    duration: float = Field(..., gt=0, description="Seconds the ramp takes")
+    profile: Literal['soft_start', 'linear', 's_curve'] = 's_curve'
+
+    @field_validator('speed')
+    @classmethod
+    def runnable_speed(cls, speed: float) -> float:
+        if 0 < speed < MIN_FLOW_RATE:
+            raise ValueError(f"speed must be 0 or between {MIN_FLOW_RATE} and 100")
+        return speed
 
 class PumpStatus(BaseModel):
     direction: PumpDirection
-    speed: int
+    speed: float
     status_flag: bool
+    ramping: bool = False
+
+class PourToWeight(BaseModel):
+    target_weight: float = Field(..., gt=0, description="Grams of water to pour into the mug")
+    flow_rate: float = Field(..., gt=0, description="Flow rate to hold while pouring, in g/s")
+    timeout: float = Field(DEFAULT_POUR_TIMEOUT, gt=0, description="Give up after this many seconds")
+
+class Dispense(BaseModel):
+    ml: float = Field(..., gt=0, description="Millilitres to dispense")
+    speed: float = Field(..., ge=MIN_FLOW_RATE, le=100, description="Pump speed from MIN_FLOW_RATE to 100")
+    learn: bool = Field(True, description="Weigh the run on the mug scale and update the calibration table")
 
 class PumpControlService:
-    def __init__(self):
-        self.pi = pigpio.pi()
+    def __init__(self, pi: pigpio.pi = None, calibration: CalibrationTable = None):
+        self.pi = pi or pigpio.pi()
+        self.calibration = calibration or CalibrationTable.load(CALIBRATION_PATH, NOMINAL_FLOW_RATE)
         self.status_flag = True
         self.current_direction = PumpDirection.stop
         self.current_speed = 0
+        # Set to "pour" or "dispense" while one of those owns the pump
+        self.busy: Optional[str] = None
+        self.aborted = asyncio.Event()
+        self.ramp_task: Optional[asyncio.Task] = None
 
         # Initialize GPIO pins
         self.pi.set_mode(FORWARD_PIN, pigpio.OUTPUT)
@@ -73,84 +127,324 @@ class PumpControlService:
             logging.warning("Cannot control pump due to error flag")
             return
 
-        self.current_direction = pump.direction
-        self.current_speed = pump.speed
+        self.drive(pump.direction, pump.speed)
+        logging.info(f"Pump set to {pump.direction} at {pump.speed}% speed")
 
-        duty_cycle = int(pump.speed * 255 / 100)  # Calculate the PWM duty cycle
+    def drive(self, direction: PumpDirection, speed: float):
+        """
+        Set the direction and PWM duty without validating or logging; ramps
+        and pours call this on every tick.
+        """
+        if direction == PumpDirection.stop:
+            self.stop_pump()
+            return
 
-        if pump.direction == PumpDirection.forward:
+        self.current_direction = direction
+        self.current_speed = speed
+        if direction == PumpDirection.forward:
             self.pi.write(REVERSE_PIN, 0)
-            self.pi.set_PWM_dutycycle(FORWARD_PIN, duty_cycle)
-        elif pump.direction == PumpDirection.reverse:
+            self.set_duty(FORWARD_PIN, speed)
+        else:
             self.pi.write(FORWARD_PIN, 0)
-            self.pi.set_PWM_dutycycle(REVERSE_PIN, duty_cycle)
-        elif pump.direction == PumpDirection.stop:
-            self.stop_pump()
+            self.set_duty(REVERSE_PIN, speed)
 
-        logging.info(f"Pump set to {pump.direction} at {pump.speed}% speed")
+    def set_duty(self, pin: int, speed: float):
+        if PWM_MODE == 'hardware':
+            self.pi.hardware_PWM(pin, PWM_FREQUENCY, duty_cycle(speed, HARDWARE_DUTY_RANGE))
+        else:
+            self.pi.set_PWM_dutycycle(pin, duty_cycle(speed, SOFTWARE_DUTY_RANGE))
 
     def stop_pump(self):
-        self.pi.set_PWM_dutycycle(FORWARD_PIN, 0)
-        self.pi.set_PWM_dutycycle(REVERSE_PIN, 0)
+        self.set_duty(FORWARD_PIN, 0)
+        self.set_duty(REVERSE_PIN, 0)
         self.current_direction = PumpDirection.stop
         self.current_speed = 0
         logging.info("Pump stopped")
 
+    @property
+    def ramping(self) -> bool:
+        return self.ramp_task is not None and not self.ramp_task.done()
+
+    def cancel_ramp(self):
+        # The task only drives the pump between sleeps, so once cancelled it never touches it again
+        if self.ramping:
+            self.ramp_task.cancel()
+        self.ramp_task = None
+
+    def start_ramp(self, ramp: PumpRamp):
+        """
+        Start ramping from the current speed (or from MIN_FLOW_RATE if the
+        pump is stopped or running the other way) to ramp.speed, and return
+        straight away; the ramp runs as a task on the service's loop.
+        """
+        self.cancel_ramp()
+        if self.current_direction == ramp.direction:
+            start = self.current_speed
+        elif ramp.speed == 0:
+            # Nothing running in this direction to ramp down
+            self.stop_pump()
+            return
+        else:
+            start = MIN_FLOW_RATE
+        end = max(ramp.speed, MIN_FLOW_RATE)
+        self.ramp_task = asyncio.create_task(
+            self.run_ramp(ramp.direction, start, end, ramp.duration, ramp.profile, stop_at_end=ramp.speed == 0))
+        logging.info(f"Ramping pump {ramp.direction} from {start}% to {ramp.speed}% "
+                     f"over {ramp.duration}s ({ramp.profile})")
+
+    async def run_ramp(self, direction: PumpDirection, start: float, end: float, duration: float,
+                       profile: str, stop_at_end: bool = False):
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        tick = 0
+        while True:
+            elapsed = loop.time() - started
+            self.drive(direction, ramp_speed(profile, start, end, duration, elapsed))
+            if elapsed >= duration:
+                break
+            # Ticks sit on absolute deadlines, so a late wake-up doesn't delay
+            # every later step; ticks that were missed entirely are skipped.
+            tick = max(tick + 1, int(elapsed / RAMP_INTERVAL) + 1)
+            await asyncio.sleep(max(0.0, started + tick * RAMP_INTERVAL - loop.time()))
+        if stop_at_end:
+            self.stop_pump()
+
+    def abort(self):
+        # Pours check this before every speed change and dispenses wait on it, so the pump stays off
+        if self.busy:
+            self.aborted.set()
+
+    async def pour_to_weight(self, pour: PourToWeight, scale_socket: str = POUR_SCALE_SOCKET) -> dict:
+        """
+        Pour until pour.target_weight of water has landed in the mug, holding
+        pour.flow_rate on the way, and report how close it landed. Weights
+        count from the first streamed frame rather than a tare, which would
+        reset the readings of everyone else streaming from the mug scale.
+        """
+        if self.busy:
+            raise RuntimeError(f"Pump is busy with a {self.busy}")
+        # Claim the pump before the first await, so a stop or a second pour meanwhile sees the pour
+        self.busy = 'pour'
+        self.aborted.clear()
+        pid = PIDController(POUR_KP, POUR_KI, POUR_KD, MIN_FLOW_RATE, 100, bias=POUR_BASE_SPEED)
+        controller = PourController(pour.target_weight, pour.flow_rate, pid, in_flight=POUR_IN_FLIGHT)
+        status = 'timeout'
+        started = time.monotonic()
+        baseline = None
+        writer = None
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(scale_socket), SCALE_TIMEOUT)
+            writer.write((json.dumps({'command': 'stream_start', 'flow_window': POUR_FLOW_WINDOW}) + '\n').encode())
+            await writer.drain()
+            while time.monotonic() - started < pour.timeout:
+                line = await asyncio.wait_for(reader.readline(), SCALE_TIMEOUT)
+                if not line:
+                    raise ConnectionError("Mug scale closed the stream")
+                frame = json.loads(line)
+                if 'error' in frame:
+                    raise RuntimeError(f"Mug scale error: {frame['error']}")
+                if 'weight' not in frame:
+                    continue
+                if baseline is None:
+                    # The pump hasn't run yet, so this is the mug and whatever was already in it
+                    baseline = frame['weight']
+                if self.aborted.is_set():
+                    status = 'aborted'
+                    break
+                speed = controller.update(frame['weight'] - baseline, frame.get('flow_rate'), frame['timestamp'])
+                if speed is None:
+                    status = 'complete'
+                    break
+                self.drive(PumpDirection.forward, speed)
+        finally:
+            self.stop_pump()
+            self.busy = None
+            if writer is not None:
+                writer.close()
+
+        settled = await self.wait_settled(scale_socket)
+        final_weight = settled - baseline if settled is not None and baseline is not None else None
+        report = controller.report(final_weight, time.monotonic() - started, status)
+        logging.info(f"Pour {status}: {report['final_weight']}g of {pour.target_weight}g, "
+                     f"overshoot {report['overshoot']}g")
+        return report
+
+    async def dispense(self, dispense: Dispense, scale_socket: str = POUR_SCALE_SOCKET) -> dict:
+        """
+        Run the pump at dispense.speed for as long as the calibration table
+        says dispense.ml takes. With learn set, the mug scale is read settled
+        before and after, and the measured volume updates the table.
+        """
+        if self.busy:
+            raise RuntimeError(f"Pump is busy with a {self.busy}")
+        self.busy = 'dispense'
+        self.aborted.clear()
+        try:
+            baseline = await self.wait_settled(scale_socket) if dispense.learn else None
+            flow = self.calibration.flow_rate(dispense.speed)
+            seconds = dispense.ml / flow
+            loop = asyncio.get_running_loop()
+            started = loop.time()
+            self.drive(PumpDirection.forward, dispense.speed)
+            try:
+                await asyncio.wait_for(self.aborted.wait(), seconds)
+                status = 'aborted'
+            except asyncio.TimeoutError:
+                status = 'complete'
+            finally:
+                self.stop_pump()
+                ran = loop.time() - started
+        finally:
+            self.busy = None
+
+        report = {'status': status, 'ml': dispense.ml, 'speed': dispense.speed,
+                  'expected_flow_rate': round(flow, 4), 'seconds': round(ran, 3)}
+        if baseline is None or status != 'complete':
+            logging.info(f"Dispense {status}: {dispense.ml}ml at {dispense.speed}% for {ran:.2f}s")
+            return report
+
+        final = await self.wait_settled(scale_socket)
+        if final is None:
+            return report
+        measured = (final - baseline) / WATER_DENSITY
+        report.update(measured_ml=round(measured, 2), error_ml=round(measured - dispense.ml, 2))
+        if measured <= 0:
+            # Mug taken off or scale re-tared mid-run: not a measurement of the pump
+            logging.warning(f"Ignoring dispense measurement of {measured:.2f}ml")
+            return report
+        point = self.calibration.update(dispense.speed, ran, measured)
+        self.calibration.save()
+        report.update(measured_flow_rate=round(measured / ran, 4), calibrated_flow_rate=round(point.flow, 4),
+                      calibration_samples=point.samples)
+        logging.info(f"Dispense {status}: {measured:.2f}ml of {dispense.ml}ml at {dispense.speed}%, "
+                     f"flow now {point.flow:.3f}ml/s")
+        return report
+
+    async def wait_settled(self, scale_socket: str) -> Optional[float]:
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_unix_connection(scale_socket), SCALE_TIMEOUT)
+        except (OSError, asyncio.TimeoutError) as e:
+            logging.warning(f"Could not reach mug scale: {e}")
+            return None
+        try:
+            command = {'command': 'wait_settled', 'tolerance': SETTLE_TOLERANCE,
+                       'duration': SETTLE_DURATION, 'timeout': SETTLE_TIMEOUT}
+            writer.write((json.dumps(command) + '\n').encode())
+            await writer.drain()
+            reply = json.loads(await asyncio.wait_for(reader.readline(), SETTLE_TIMEOUT + SCALE_TIMEOUT))
+        except (OSError, ValueError, asyncio.TimeoutError) as e:
+            logging.warning(f"Mug scale did not answer wait_settled: {e}")
+            return None
+        finally:
+            writer.close()
+        if 'error' in reply:
+            logging.warning(f"Mug scale did not settle: {reply['error']}")
+            return None
+        return reply['weight']
+
     def get_status(self) -> PumpStatus:
         return PumpStatus(
             direction=self.current_direction,
             speed=self.current_speed,
-            status_flag=self.status_flag
+            status_flag=self.status_flag,
+            ramping=self.ramping
         )
 
-def handle_client(pump_service: PumpControlService, client_socket: socket.socket):
+async def handle_command(pump_service: PumpControlService, command: dict) -> dict:
+    """
+    Run one command and return its reply. Every command answers with the pump
+    status after it ran, so callers don't need a second round trip to check.
+    Pours and dispenses answer once they have finished, with their report
+    under "pour" or "dispense"; "stop" from any connection aborts them. A ramp answers as soon as it has started,
+    and any command that sets the pump takes over from it.
+    """
+    action = command.get('action')
+    if action in ('control', 'control_speed', 'pour_to_weight', 'dispense', 'ramp') and pump_service.busy:
+        return {'error': f"Pump is busy with a {pump_service.busy}"}
+    if action in ('control', 'control_speed', 'pour_to_weight', 'dispense', 'stop'):
+        pump_service.cancel_ramp()
+    if action == 'control':
+        pump_service.control_pump(PumpControl(**command['params']))
+    elif action == 'control_speed':
+        pump_service.control_pump_speed(PumpSpeedControl(**command['params']))
+    elif action == 'pour_to_weight':
+        report = await pump_service.pour_to_weight(PourToWeight(**command['params']))
+        return {**pump_service.get_status().model_dump(mode='json'), 'pour': report}
+    elif action == 'dispense':
+        report = await pump_service.dispense(Dispense(**command['params']))
+        return {**pump_service.get_status().model_dump(mode='json'), 'dispense': report}
+    elif action == 'calibration':
+        return {**pump_service.get_status().model_dump(mode='json'),
+                'calibration': pump_service.calibration.as_dict()}
+    elif action == 'ramp':
+        pump_service.start_ramp(PumpRamp(**command['params']))
+    elif action == 'stop':
+        pump_service.abort()
+        pump_service.stop_pump()
+    elif action == 'status':
+        pass
+    else:
+        logging.warning(f"Unknown command: {action}")
+        return {'error': f"Unknown command: {action}"}
+    return pump_service.get_status().model_dump(mode='json')
+
+async def handle_client(pump_service: PumpControlService, reader: asyncio.StreamReader,
+                        writer: asyncio.StreamWriter) -> None:
+    """
+    Serve one connection: newline-framed JSON commands, one JSON reply line
+    each, until the client disconnects.
+    """
     try:
-        data = client_socket.recv(1024).decode('utf-8')
-        command = json.loads(data)
-
-        if command['action'] == 'control':
-            pump = PumpControl(**command['params'])
-            pump_service.control_pump(pump)
-        elif command['action'] == 'control_speed':
-            pump = PumpSpeedControl(**command['params'])
-            pump_service.control_pump_speed(pump)
-        elif command['action'] == 'stop':
-            pump_service.stop_pump()
-        elif command['action'] == 'status':
-            status = pump_service.get_status()
-            client_socket.send(status.model_dump_json().encode('utf-8'))
-        else:
-            logging.warning(f"Unknown command: {command['action']}")
-    except Exception as e:
-        logging.error(f"Error handling client request: {e}")
+        while True:
+            data = await reader.readline()
+            if not data:
+                break
+            try:
+                reply = await handle_command(pump_service, json.loads(data))
+            except Exception as e:
+                logging.error(f"Error handling client request: {e}")
+                reply = {'error': str(e)}
+            writer.write((json.dumps(reply) + '\n').encode('utf-8'))
+            await writer.drain()
+    except ConnectionError as e:
+        logging.debug(f"Client connection lost: {e}")
     finally:
-        client_socket.close()
-
-def main():
-    pump_service = PumpControlService()
+        writer.close()
 
+async def serve(pump_service: PumpControlService) -> None:
     if os.path.exists(SOCKET_PATH):
         os.remove(SOCKET_PATH)
 
-    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
-    server.bind(SOCKET_PATH)
-    server.listen(1)
-
+    server = await asyncio.start_unix_server(
+        lambda reader, writer: handle_client(pump_service, reader, writer),
+        path=SOCKET_PATH
+    )
     logging.info(f"Pump control service started. Listening on {SOCKET_PATH}")
 
-    def signal_handler(signum, frame):
-        logging.info("Shutting down pump control service...")
-        pump_service.stop_pump()
-        server.close()
-        os.remove(SOCKET_PATH)
-        sys.exit(0)
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stopped.set)
+
+    async with server:
+        await stopped.wait()
+    logging.info("Shutting down pump control service...")
 
-    signal.signal(signal.SIGINT, signal_handler)
-    signal.signal(signal.SIGTERM, signal_handler)
+async def run_service() -> None:
+    # Built on the running loop: before Python 3.10 the service's asyncio.Event
+    # binds to whichever loop exists when it is created
+    pump_service = PumpControlService()
+    try:
+        await serve(pump_service)
+    finally:
+        pump_service.stop_pump()
 
-    while True:
-        client, _ = server.accept()
-        handle_client(pump_service, client)
+def main():
+    try:
+        asyncio.run(run_service())
+    finally:
+        if os.path.exists(SOCKET_PATH):
+            os.remove(SOCKET_PATH)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
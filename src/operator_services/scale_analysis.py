@@ -0,0 +1,62 @@
+import numpy as np
+from typing import Any, Dict, Optional
+from scale_stream import SampleRingBuffer
+
+DEFAULT_STABLE_TOLERANCE = 0.1
+DEFAULT_STABLE_DURATION = 0.5
+DEFAULT_FLOW_WINDOW = 1.0
+MIN_FLOW_SAMPLES = 3
+
+def settled_weight(buffer: SampleRingBuffer, now: float, tolerance: float, duration: float) -> Optional[float]:
+    """
+    Return the mean weight if every buffered sample from the last `duration`
+    seconds is within ±tolerance of it, otherwise None. The buffer has to
+    reach back at least `duration` seconds before the scale counts as settled.
+    """
+    timestamps, weights, _ = buffer.arrays()
+    start = now - duration
+    if not len(timestamps) or timestamps[0] > start:
+        return None
+    window = weights[timestamps >= start]
+    if not len(window):
+        return None
+    mean = window.mean()
+    if np.max(np.abs(window - mean)) > tolerance:
+        return None
+    return float(mean)
+
+def flow_rate(buffer: SampleRingBuffer, now: float, window: float = DEFAULT_FLOW_WINDOW) -> Optional[float]:
+    """
+    Least-squares slope of weight against time over the last `window`
+    seconds, in weight units per second. Returns None until the window holds
+    enough samples to fit a line.
+    """
+    timestamps, weights, _ = buffer.arrays(since=now - window)
+    if len(timestamps) < MIN_FLOW_SAMPLES:
+        return None
+    t = timestamps - timestamps.mean()
+    denominator = np.dot(t, t)
+    if denominator == 0:
+        return None
+    return float(np.dot(t, weights - weights.mean()) / denominator)
+
+class StabilityDetector:
+    """
+    Turns the rolling settle check into events: "stable" (with the settled
+    weight and the time it settled at) when the scale settles, and
+    "unstable" when it starts moving again.
+    """
+    def __init__(self, tolerance: float = DEFAULT_STABLE_TOLERANCE, duration: float = DEFAULT_STABLE_DURATION):
+        self.tolerance = float(tolerance)
+        self.duration = float(duration)
+        self.stable = False
+
+    def update(self, buffer: SampleRingBuffer, now: float) -> Optional[Dict[str, Any]]:
+        weight = settled_weight(buffer, now, self.tolerance, self.duration)
+        if weight is not None and not self.stable:
+            self.stable = True
+            return {"event": "stable", "weight": weight, "settled_at": now - self.duration, "timestamp": now}
+        if weight is None and self.stable:
+            self.stable = False
+            return {"event": "unstable", "timestamp": now}
+        return None
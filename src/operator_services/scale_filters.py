@@ -0,0 +1,144 @@
+import numpy as np
+from typing import Dict, List, Optional, Type
+
+# Scale MAD to a standard deviation for normally distributed noise
+MAD_TO_SIGMA = 1.4826
+
+class WindowedFilter:
+    """
+    Base for filters that look at the last `window` input values. The window
+    is a NumPy ring so each update is a single vectorised reduction.
+    """
+    def __init__(self, window: int = 15):
+        if window < 1:
+            raise ValueError("window must be at least 1")
+        self.window = int(window)
+        self.reset()
+
+    def reset(self) -> None:
+        self._values = np.zeros(self.window)
+        self._index = 0
+        self._count = 0
+
+    def _push(self, value: float) -> np.ndarray:
+        self._values[self._index] = value
+        self._index = (self._index + 1) % self.window
+        self._count = min(self._count + 1, self.window)
+        return self._values[:self._count] if self._count < self.window else self._values
+
+class MovingMedianFilter(WindowedFilter):
+    def update(self, value: float) -> float:
+        return float(np.median(self._push(value)))
+
+class MADOutlierFilter(WindowedFilter):
+    """
+    Replaces a value with the window median when it is more than `threshold`
+    robust standard deviations away from it. Rejected values are not added to
+    the window, so a burst of glitch reads cannot drag the median with it.
+    """
+    def __init__(self, window: int = 15, threshold: float = 3.5):
+        self.threshold = float(threshold)
+        super().__init__(window)
+
+    def update(self, value: float) -> float:
+        if self._count >= 3:
+            history = self._values[:self._count]
+            median = np.median(history)
+            mad = np.median(np.abs(history - median)) * MAD_TO_SIGMA
+            if mad > 0 and abs(value - median) > self.threshold * mad:
+                return float(median)
+        self._push(value)
+        return float(value)
+
+class EMAFilter:
+    def __init__(self, alpha: float = 0.3):
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be in (0, 1]")
+        self.alpha = float(alpha)
+        self.reset()
+
+    def reset(self) -> None:
+        self._value = None
+
+    def update(self, value: float) -> float:
+        if self._value is None:
+            self._value = value
+        else:
+            self._value += self.alpha * (value - self._value)
+        return float(self._value)
+
+class KalmanFilter:
+    """
+    One-dimensional constant-weight Kalman filter. process_variance is how
+    much the true weight is expected to move between samples, and
+    measurement_variance is the sensor noise, both in unit^2.
+    """
+    def __init__(self, process_variance: float = 0.01, measurement_variance: float = 0.25):
+        self.process_variance = float(process_variance)
+        self.measurement_variance = float(measurement_variance)
+        self.reset()
+
+    def reset(self) -> None:
+        self._estimate = None
+        self._error = 1.0
+
+    def update(self, value: float) -> float:
+        if self._estimate is None:
+            self._estimate = value
+            self._error = self.measurement_variance
+            return float(value)
+        self._error += self.process_variance
+        gain = self._error / (self._error + self.measurement_variance)
+        self._estimate += gain * (value - self._estimate)
+        self._error *= (1 - gain)
+        return float(self._estimate)
+
+FILTERS: Dict[str, Type] = {
+    'median': MovingMedianFilter,
+    'mad': MADOutlierFilter,
+    'ema': EMAFilter,
+    'kalman': KalmanFilter,
+}
+
+class FilterChain:
+    """
+    Runs each raw sample through a sequence of filters. Chains are described
+    as "name:param=value,param=value|name..." e.g. "mad:window=15|ema:alpha=0.2".
+    """
+    def __init__(self, filters: Optional[List] = None):
+        self.filters = filters or []
+
+    @classmethod
+    def parse(cls, spec: Optional[str]) -> 'FilterChain':
+        filters = []
+        for stage in (spec or '').split('|'):
+            stage = stage.strip()
+            if not stage or stage == 'none':
+                continue
+            name, _, params = stage.partition(':')
+            name = name.strip().lower()
+            if name not in FILTERS:
+                raise ValueError(f"Unknown filter: {name}")
+            kwargs = {}
+            for param in filter(None, (p.strip() for p in params.split(','))):
+                key, _, value = param.partition('=')
+                kwargs[key.strip()] = float(value)
+            if 'window' in kwargs:
+                kwargs['window'] = int(kwargs['window'])
+            try:
+                filters.append(FILTERS[name](**kwargs))
+            except TypeError as e:
+                raise ValueError(f"Invalid parameters for {name} filter: {e}")
+        return cls(filters)
+
+    def update(self, value: float) -> float:
+        for f in self.filters:
+            value = f.update(value)
+        return value
+
+    def reset(self) -> None:
+        for f in self.filters:
+            f.reset()
+
+    def __bool__(self) -> bool:
+        return bool(self.filters)
@@ -0,0 +1,348 @@
+import asyncio
+import json
+import configparser
+import os
+import logging
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+import pigpio
+from scale_analysis import (DEFAULT_FLOW_WINDOW, DEFAULT_STABLE_DURATION, DEFAULT_STABLE_TOLERANCE,
+                            StabilityDetector, flow_rate, settled_weight)
+from scale_filters import FilterChain
+from scale_stream import PublishGate, SampleHub
+
+# Set up logging
+logging.basicConfig(level=logging.DEBUG, format='%(asctime)s - %(levelname)s - %(message)s')
+
+# Read configuration
+config = configparser.ConfigParser()
+config_path = os.path.join('src', 'operator_app', 'hardware_config.ini')
+config.read(config_path)
+
+SAMPLES_PER_READ = 1
+DEFAULT_FILTERS = "median:window=15"
+READ_TIMEOUT = 5.0
+SETTLE_TIMEOUT = 10.0
+SOCKET_PATH_TEMPLATE = "/tmp/{name}_scale_service.sock"
+
+@dataclass
+class ScaleConfig:
+    name: str
+    data_pin: int
+    clock_pin: int
+    reference_unit: int
+    zero_value: int
+    unit: str
+    socket_path: str
+    samples_per_read: int = SAMPLES_PER_READ
+    filters: str = DEFAULT_FILTERS
+    flow_window: float = DEFAULT_FLOW_WINDOW
+    backend: str = 'hardware'
+    simulation: Any = None
+
+def load_scale_configs(config: configparser.ConfigParser) -> List[ScaleConfig]:
+    """
+    Build a ScaleConfig for every <name>_scale_data_pin entry in [SCALES].
+    """
+    section = config['SCALES']
+    suffix = '_scale_data_pin'
+    names = sorted(key[:-len(suffix)] for key in section if key.endswith(suffix))
+    return [
+        ScaleConfig(
+            name=name,
+            data_pin=section.getint(f'{name}_scale_data_pin'),
+            clock_pin=section.getint(f'{name}_scale_clock_pin'),
+            reference_unit=int(section.getfloat(f'{name}_scale_reference_unit')),
+            zero_value=int(section.getfloat(f'{name}_scale_zero_value')),
+            unit=section.get(f'{name}_scale_unit', 'g'),
+            socket_path=SOCKET_PATH_TEMPLATE.format(name=name),
+            samples_per_read=section.getint(f'{name}_scale_samples_per_read', SAMPLES_PER_READ),
+            filters=section.get(f'{name}_scale_filters', DEFAULT_FILTERS),
+            flow_window=section.getfloat(f'{name}_scale_flow_window', DEFAULT_FLOW_WINDOW),
+            backend=section.get(f'{name}_scale_backend', 'hardware'),
+            simulation=load_simulation(section, name),
+        )
+        for name in names
+    ]
+
+def load_simulation(section: configparser.SectionProxy, name: str):
+    """
+    LoadModel for a scale with <name>_scale_backend = simulated, built from its
+    <name>_scale_sim_* keys. The simulator is only imported when it is used.
+    """
+    if section.get(f'{name}_scale_backend', 'hardware') != 'simulated':
+        return None
+    from libs.hx711_sim import LoadModel
+    return LoadModel.from_config(section, f'{name}_scale_sim_')
+
+def parse_command(line: str) -> Tuple[str, Dict[str, Any]]:
+    """
+    Commands are either a bare name ("zero") or a JSON object with a
+    "command" key and any parameters alongside it.
+    """
+    line = line.strip()
+    if line.startswith('{'):
+        params = json.loads(line)
+        return params.pop('command', ''), params
+    return line, {}
+
+def optional_float(value: Any) -> Optional[float]:
+    return None if value is None else float(value)
+
+class Scale:
+    """
+    One HX711 load cell, its acquisition hub and the socket protocol served for it.
+    """
+    def __init__(self, scale_config: ScaleConfig, pi: pigpio.pi):
+        self.config = scale_config
+        self.name = scale_config.name
+        self.pi = pi
+        self.hx = None
+        self.hub = SampleHub(self.read_weight, filter_chain=FilterChain.parse(scale_config.filters))
+
+    def read_weight(self) -> float:
+        return float(self.hx.weight(self.config.samples_per_read))
+
+    def initialize_hx711(self) -> None:
+        if self.hx:
+            return
+        cfg = self.config
+        logging.debug(f"[{self.name}] Initializing {cfg.backend} HX711 with DATA_PIN={cfg.data_pin}, CLOCK_PIN={cfg.clock_pin}, "
+                      f"REF_UNIT={cfg.reference_unit}, OFFSET={cfg.zero_value}")
+        if cfg.backend == 'simulated':
+            from libs.hx711_sim import SimulatedSimpleHX711
+            hx = SimulatedSimpleHX711(cfg.data_pin, cfg.clock_pin, cfg.reference_unit, cfg.zero_value, cfg.simulation)
+        else:
+            if not self.pi.connected:
+                raise ConnectionError("Failed to connect to pigpio daemon.")
+            from HX711 import SimpleHX711, Mass
+            hx = SimpleHX711(cfg.data_pin, cfg.clock_pin, cfg.reference_unit, cfg.zero_value)
+            hx.setUnit(getattr(Mass.Unit, cfg.unit.upper()))
+        self.hx = hx
+        self.zero_scale()
+        logging.info(f"[{self.name}] HX711 initialized")
+
+    def zero_scale(self) -> None:
+        if self.hx:
+            self.hx.zero()
+            self.hub.reset()
+            logging.info(f"[{self.name}] Scale zeroed")
+        else:
+            logging.error(f"[{self.name}] Cannot zero scale: HX711 not initialized")
+
+    async def wait_settled(self, tolerance: float, duration: float) -> Dict[str, Any]:
+        """
+        Wait until the scale has stayed within ±tolerance for `duration` seconds.
+        """
+        queue = self.hub.subscribe()
+        try:
+            while True:
+                sample = await queue.get()
+                weight = settled_weight(self.hub.buffer, sample.timestamp, tolerance, duration)
+                if weight is not None:
+                    return {"event": "stable", "weight": weight, "unit": self.config.unit,
+                            "settled_at": sample.timestamp - duration}
+        finally:
+            self.hub.unsubscribe(queue)
+
+    async def handle_client(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        unit = self.config.unit
+        if not self.hx:
+            try:
+                await self.hub.run_in_reader(self.initialize_hx711)
+            except Exception as e:
+                logging.error(f"[{self.name}] Failed to initialize HX711: {e}")
+                writer.write(json.dumps({"error": "Failed to initialize scale"}).encode() + b"\n")
+                await writer.drain()
+                writer.close()
+                return
+
+        try:
+            while True:
+                logging.debug(f"[{self.name}] Waiting for command...")
+                data = await reader.readline()
+                if not data:
+                    logging.debug(f"[{self.name}] Client disconnected")
+                    break
+
+                logging.debug(f"[{self.name}] Received command: {data.decode().strip()}")
+                try:
+                    command, params = parse_command(data.decode())
+                except ValueError as e:
+                    logging.warning(f"[{self.name}] Invalid command: {e}")
+                    writer.write((json.dumps({"error": "Invalid command"}) + "\n").encode())
+                    await writer.drain()
+                    continue
+
+                if command == "single_read":
+                    logging.debug(f"[{self.name}] Performing single read")
+                    try:
+                        sample = await asyncio.wait_for(self.hub.next_sample(), timeout=READ_TIMEOUT)
+                        response = json.dumps({"weight": sample.weight, "unit": unit}) + "\n"
+                        logging.debug(f"[{self.name}] Read weight: {sample.weight}")
+                    except Exception as e:
+                        logging.error(f"[{self.name}] Error reading weight: {e}")
+                        response = json.dumps({"error": "Failed to read weight"}) + "\n"
+                    writer.write(response.encode())
+                    await writer.drain()
+                    logging.debug(f"[{self.name}] Sent response: {response.strip()}")
+
+                elif command == "flow_rate":
+                    try:
+                        window = float(params.get('window', self.config.flow_window))
+                        sample = await asyncio.wait_for(self.hub.next_sample(), timeout=READ_TIMEOUT)
+                        response = json.dumps({"flow_rate": flow_rate(self.hub.buffer, sample.timestamp, window),
+                                               "unit": f"{unit}/s", "window": window}) + "\n"
+                    except (TypeError, ValueError) as e:
+                        response = json.dumps({"error": f"Invalid parameters: {e}"}) + "\n"
+                    except Exception as e:
+                        logging.error(f"[{self.name}] Error reading flow rate: {e}")
+                        response = json.dumps({"error": "Failed to read flow rate"}) + "\n"
+                    writer.write(response.encode())
+                    await writer.drain()
+
+                elif command == "stream_start":
+                    try:
+                        chain = FilterChain.parse(params['filters']) if 'filters' in params else None
+                        flow_window = float(params.get('flow_window', self.config.flow_window))
+                        gate = PublishGate(optional_float(params.get('max_rate')),
+                                           optional_float(params.get('min_delta')),
+                                           optional_float(params.get('heartbeat')))
+                        detector = None
+                        if params.get('events'):
+                            detector = StabilityDetector(params.get('tolerance', DEFAULT_STABLE_TOLERANCE),
+                                                         params.get('duration', DEFAULT_STABLE_DURATION))
+                    except (TypeError, ValueError) as e:
+                        writer.write((json.dumps({"error": str(e)}) + "\n").encode())
+                        await writer.drain()
+                        continue
+                    # Taring resets the shared chip and every subscriber's buffer, so it is opt-in
+                    if params.get('zero'):
+                        logging.debug(f"[{self.name}] Zeroing scale before starting stream")
+                        await self.hub.run_in_reader(self.zero_scale)
+                    logging.debug(f"[{self.name}] Starting stream")
+                    queue = self.hub.subscribe()
+                    try:
+                        while True:
+                            sample = await queue.get()
+                            weight = chain.update(sample.raw) if chain is not None else sample.weight
+                            event = detector.update(self.hub.buffer, sample.timestamp) if detector else None
+                            response = ""
+                            # Unchanged readings are dropped here, but stability events always go out
+                            if gate.should_send(weight, sample.timestamp):
+                                rate = flow_rate(self.hub.buffer, sample.timestamp, flow_window)
+                                response = json.dumps({"weight": weight, "unit": unit, "timestamp": sample.timestamp,
+                                                       "flow_rate": rate}) + "\n"
+                            if event:
+                                response += json.dumps(event) + "\n"
+                            if not response:
+                                continue
+                            try:
+                                writer.write(response.encode())
+                                await writer.drain()
+                            except ConnectionResetError:
+                                logging.warning(f"[{self.name}] Client disconnected during stream")
+                                break
+                            except BrokenPipeError:
+                                logging.warning(f"[{self.name}] Broken pipe, client likely disconnected")
+                                break
+                    except asyncio.CancelledError:
+                        logging.info(f"[{self.name}] Stream cancelled")
+                    except Exception as e:
+                        logging.error(f"[{self.name}] Error in weight streaming: {e}")
+                    finally:
+                        self.hub.unsubscribe(queue)
+                        logging.info(f"[{self.name}] Streaming stopped")
+
+                elif command == "stream_stop":
+                    logging.debug(f"[{self.name}] Stopping stream")
+                    break
+
+                elif command == "wait_settled":
+                    try:
+                        tolerance = float(params.get('tolerance', DEFAULT_STABLE_TOLERANCE))
+                        duration = float(params.get('duration', DEFAULT_STABLE_DURATION))
+                        timeout = float(params.get('timeout', SETTLE_TIMEOUT))
+                        result = await asyncio.wait_for(self.wait_settled(tolerance, duration), timeout=timeout)
+                    except (TypeError, ValueError) as e:
+                        result = {"error": f"Invalid parameters: {e}"}
+                    except asyncio.TimeoutError:
+                        logging.warning(f"[{self.name}] Scale did not settle within {timeout}s")
+                        result = {"error": "Scale did not settle", "timeout": timeout}
+                    writer.write((json.dumps(result) + "\n").encode())
+                    await writer.drain()
+
+                elif command == "ping":
+                    response = json.dumps({"status": "ok"}) + "\n"
+                    writer.write(response.encode())
+                    await writer.drain()
+
+                elif command == "zero":
+                    logging.debug(f"[{self.name}] Zeroing scale")
+                    await self.hub.run_in_reader(self.zero_scale)
+                    response = json.dumps({"status": "Scale zeroed"}) + "\n"
+                    writer.write(response.encode())
+                    await writer.drain()
+
+                else:
+                    logging.warning(f"[{self.name}] Unknown command: {command}")
+                    response = json.dumps({"error": "Unknown command"}) + "\n"
+                    writer.write(response.encode())
+                    await writer.drain()
+
+        except (ConnectionResetError, BrokenPipeError) as e:
+            logging.warning(f"[{self.name}] Client disconnected: {e}")
+        except Exception as e:
+            logging.error(f"[{self.name}] Error handling client: {e}", exc_info=True)
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception as e:
+                logging.warning(f"[{self.name}] Error while closing writer: {e}")
+            logging.debug(f"[{self.name}] Client connection closed")
+
+class ScaleService:
+    """
+    Serves every scale declared in [SCALES] from one process and one pigpio
+    connection, with a Unix socket per scale so existing clients keep their
+    /tmp/<name>_scale_service.sock paths.
+    """
+    def __init__(self, scale_configs: List[ScaleConfig]):
+        self.pi = pigpio.pi()
+        self.scales: Dict[str, Scale] = {cfg.name: Scale(cfg, self.pi) for cfg in scale_configs}
+
+    async def start_server(self) -> None:
+        servers = []
+        for scale in self.scales.values():
+            try:
+                os.unlink(scale.config.socket_path)
+            except FileNotFoundError:
+                pass
+            servers.append(await asyncio.start_unix_server(scale.handle_client, scale.config.socket_path))
+            logging.info(f"[{scale.name}] Server started on {scale.config.socket_path}")
+
+        await asyncio.gather(*(server.serve_forever() for server in servers))
+
+    def cleanup(self) -> None:
+        for scale in self.scales.values():
+            scale.hub.stop()
+            try:
+                os.unlink(scale.config.socket_path)
+            except FileNotFoundError:
+                pass
+        if self.pi:
+            self.pi.stop()
+
+if __name__ == "__main__":
+    service = ScaleService(load_scale_configs(config))
+
+    try:
+        asyncio.run(service.start_server())
+    except KeyboardInterrupt:
+        logging.info("Service stopped by user.")
+    except Exception as e:
+        logging.error(f"Unexpected error: {e}", exc_info=True)
+    finally:
+        service.cleanup()
+        logging.info("Service shut down.")
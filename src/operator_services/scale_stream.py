@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass
+from queue import Empty, Queue
+from typing import Any, Callable, Optional, Tuple
+import numpy as np
+from scale_filters import FilterChain
+
+RING_BUFFER_SIZE = 512
+SUBSCRIBER_QUEUE_SIZE = 32
+
+@dataclass
+class Sample:
+    timestamp: float
+    weight: float
+    raw: Optional[float] = None
+
+class SampleRingBuffer:
+    """
+    Fixed-size NumPy history of timestamped samples. Filtered and raw weights
+    are kept side by side so consumers can run vectorised maths over them.
+    """
+    def __init__(self, capacity: int = RING_BUFFER_SIZE):
+        self.capacity = capacity
+        self._timestamps = np.zeros(capacity)
+        self._weights = np.zeros(capacity)
+        self._raw = np.zeros(capacity)
+        self._index = 0
+        self._count = 0
+
+    def append(self, sample: Sample) -> None:
+        self._timestamps[self._index] = sample.timestamp
+        self._weights[self._index] = sample.weight
+        self._raw[self._index] = sample.weight if sample.raw is None else sample.raw
+        self._index = (self._index + 1) % self.capacity
+        self._count = min(self._count + 1, self.capacity)
+
+    def latest(self) -> Optional[Sample]:
+        if not self._count:
+            return None
+        i = self._index - 1
+        return Sample(self._timestamps[i], self._weights[i], self._raw[i])
+
+    def arrays(self, since: Optional[float] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Return (timestamps, weights, raw) oldest first, optionally only the
+        samples taken at or after `since`.
+        """
+        order = (np.arange(self._count) + self._index - self._count) % self.capacity
+        timestamps, weights, raw = self._timestamps[order], self._weights[order], self._raw[order]
+        if since is not None:
+            start = np.searchsorted(timestamps, since)
+            timestamps, weights, raw = timestamps[start:], weights[start:], raw[start:]
+        return timestamps, weights, raw
+
+    def clear(self) -> None:
+        self._index = 0
+        self._count = 0
+
+    def __len__(self) -> int:
+        return self._count
+
+class PublishGate:
+    """
+    Decides which samples a streaming subscriber is actually sent. A sample
+    goes out when it differs from the last one sent by more than min_delta,
+    or when heartbeat seconds have passed without sending anything, and
+    never more often than max_rate times a second. With no limits set every
+    sample is sent.
+    """
+    def __init__(self, max_rate: Optional[float] = None, min_delta: Optional[float] = None,
+                 heartbeat: Optional[float] = None):
+        self.min_interval = 1.0 / max_rate if max_rate else 0.0
+        self.min_delta = min_delta
+        self.heartbeat = heartbeat
+        self._last_weight = None
+        self._last_sent_at = None
+
+    def should_send(self, weight: float, now: float) -> bool:
+        if self._last_sent_at is not None:
+            elapsed = now - self._last_sent_at
+            if elapsed < self.min_interval:
+                return False
+            changed = self.min_delta is None or abs(weight - self._last_weight) > self.min_delta
+            if not changed and (self.heartbeat is None or elapsed < self.heartbeat):
+                return False
+        self._last_weight = weight
+        self._last_sent_at = now
+        return True
+
+class SampleHub:
+    """
+    Runs a single acquisition loop for one scale and fans every sample out to
+    any number of subscribers. Each subscriber owns a bounded queue; when a
+    slow subscriber falls behind its oldest samples are dropped so it can
+    never hold back the acquisition loop or the other subscribers.
+
+    The HX711 calls block, so the acquisition loop lives on a dedicated
+    reader thread. Samples are handed to the event loop with
+    call_soon_threadsafe, and anything else that has to touch the chip
+    (zeroing, initialisation) is queued to the same thread with run_in_reader
+    so it is serialised with the reads instead of racing them.
+
+    Every raw reading is passed through the scale's filter chain on the
+    reader thread, so samples carry both the raw and the filtered weight.
+    """
+    def __init__(self, read_weight: Callable[[], float], capacity: int = RING_BUFFER_SIZE,
+                 queue_size: int = SUBSCRIBER_QUEUE_SIZE, filter_chain: Optional[FilterChain] = None):
+        self.read_weight = read_weight
+        self.filter_chain = filter_chain or FilterChain()
+        self.buffer = SampleRingBuffer(capacity)
+        self.queue_size = queue_size
+        self._subscribers = set()
+        self._streaming = threading.Event()
+        self._stopped = threading.Event()
+        self._jobs = Queue()
+        self._loop = None
+        self._thread = None
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def subscribe(self, maxsize: Optional[int] = None) -> asyncio.Queue:
+        self._ensure_thread()
+        queue = asyncio.Queue(maxsize or self.queue_size)
+        self._subscribers.add(queue)
+        if not self._streaming.is_set():
+            self._streaming.set()
+            self._jobs.put(None)  # Wake the reader thread if it is idle
+        logging.debug(f"Subscriber added ({self.subscriber_count} active)")
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue) -> None:
+        self._subscribers.discard(queue)
+        if not self._subscribers:
+            self._streaming.clear()
+        logging.debug(f"Subscriber removed ({self.subscriber_count} active)")
+
+    def publish(self, sample: Sample) -> None:
+        self.buffer.append(sample)
+        for queue in self._subscribers:
+            if queue.full():
+                queue.get_nowait()  # Drop the oldest sample for this subscriber only
+            queue.put_nowait(sample)
+
+    async def next_sample(self) -> Sample:
+        queue = self.subscribe(maxsize=1)
+        try:
+            return await queue.get()
+        finally:
+            self.unsubscribe(queue)
+
+    async def run_in_reader(self, func: Callable[..., Any], *args) -> Any:
+        """
+        Run func on the reader thread between two reads and await its result.
+        """
+        self._ensure_thread()
+        future = Future()
+        self._jobs.put((future, func, args))
+        return await asyncio.wrap_future(future)
+
+    def reset(self) -> None:
+        """
+        Forget filter state and buffered history, e.g. after the scale has
+        been tared. Must be called from the reader thread.
+        """
+        self.filter_chain.reset()
+        self._loop.call_soon_threadsafe(self.buffer.clear)
+
+    def stop(self) -> None:
+        self._stopped.set()
+        self._jobs.put(None)
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._loop = asyncio.get_running_loop()
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._acquire, name="scale-reader", daemon=True)
+            self._thread.start()
+
+    def _run_job(self, job) -> None:
+        if job is None:
+            return
+        future, func, args = job
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+
+    def _acquire(self) -> None:
+        logging.info("Acquisition thread started")
+        while not self._stopped.is_set():
+            # Queued commands always run before the next read
+            try:
+                job = self._jobs.get(block=not self._streaming.is_set())
+                self._run_job(job)
+                continue
+            except Empty:
+                pass
+
+            try:
+                raw = float(self.read_weight())
+            except Exception as e:
+                logging.error(f"Error reading weight: {e}")
+                time.sleep(0.1)
+                continue
+            sample = Sample(time.time(), self.filter_chain.update(raw), raw)
+            self._loop.call_soon_threadsafe(self.publish, sample)
+        logging.info("Acquisition thread stopped")
@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, AsyncMock
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
 from operator_app.api.v1.pump.pump_routes import router as pump_router
@@ -17,7 +17,7 @@ def mock_auth(monkeypatch):
         return {"sub": "test_user"}
     monkeypatch.setattr(auth_handler, "decode_token", mock_decode_token)
 
-@patch('operator_app.api.v1.pump.pump_service_client.send_command')
+@patch('operator_app.api.v1.pump.pump_service_client.send_command', new_callable=AsyncMock)
 def test_control_pump(mock_send_command):
     mock_send_command.return_value = {"status": "success"}
     response = client.post("/", json={"direction": "forward"})
@@ -28,7 +28,7 @@ def test_control_pump(mock_send_command):
         'params': {'direction': 'forward'}
     })
 
-@patch('operator_app.api.v1.pump.pump_service_client.send_command')
+@patch('operator_app.api.v1.pump.pump_service_client.send_command', new_callable=AsyncMock)
 def test_control_pump_speed(mock_send_command):
     mock_send_command.return_value = {"status": "success"}
     response = client.post("/flow-rate", json={"direction": "forward", "speed": 50})
@@ -39,7 +39,7 @@ def test_control_pump_speed(mock_send_command):
         'params': {'direction': 'forward', 'speed': 50}
     })
 
-@patch('operator_app.api.v1.pump.pump_service_client.send_command')
+@patch('operator_app.api.v1.pump.pump_service_client.send_command', new_callable=AsyncMock)
 def test_get_pump_status(mock_send_command):
     mock_send_command.return_value = {"direction": "forward", "speed": 75, "status_flag": True}
     response = client.get("/status")
@@ -47,21 +47,21 @@ def test_get_pump_status(mock_send_command):
     assert response.json() == {"direction": "forward", "speed": 75, "status_flag": True}
     mock_send_command.assert_called_once_with({'action': 'status'})
 
-@patch('operator_app.api.v1.pump.pump_service_client.send_command')
+@patch('operator_app.api.v1.pump.pump_service_client.send_command', new_callable=AsyncMock)
 def test_control_pump_error(mock_send_command):
     mock_send_command.side_effect = Exception("Connection error")
     response = client.post("/", json={"direction": "forward"})
     assert response.status_code == 500
     assert response.json() == {"detail": "Error controlling pump: Connection error"}
 
-@patch('operator_app.api.v1.pump.pump_service_client.send_command')
+@patch('operator_app.api.v1.pump.pump_service_client.send_command', new_callable=AsyncMock)
 def test_control_pump_speed_error(mock_send_command):
     mock_send_command.side_effect = Exception("Connection error")
     response = client.post("/flow-rate", json={"direction": "forward", "speed": 50})
     assert response.status_code == 500
     assert response.json() == {"detail": "Error controlling pump speed: Connection error"}
 
-@patch('operator_app.api.v1.pump.pump_service_client.send_command')
+@patch('operator_app.api.v1.pump.pump_service_client.send_command', new_callable=AsyncMock)
 def test_get_pump_status_error(mock_send_command):
     mock_send_command.side_effect = Exception("Connection error")
     response = client.get("/status")
@@ -0,0 +1,108 @@
+import pytest
+import pigpio
+from libs.hx711 import HX711
+
+class FakePi:
+    """
+    Minimal stand-in for pigpio.pi that clocks out queued 24-bit values.
+    """
+    def __init__(self, values=(), ready=True):
+        self.values = list(values)
+        self.ready = ready
+        self.value = 0
+        self.pulses = 0
+        self.reads = 0
+        self.callbacks = []
+
+    def set_mode(self, gpio, mode):
+        pass
+
+    def callback(self, gpio, edge, func):
+        self.callbacks.append((gpio, edge, func))
+        return self
+
+    def cancel(self):
+        self.callbacks.clear()
+
+    def gpio_trigger(self, gpio, pulse_len, level):
+        if self.pulses == 0:
+            self.value = self.values.pop(0) if self.values else 0
+        self.pulses += 1
+
+    def read(self, gpio):
+        self.reads += 1
+        if 0 < self.pulses <= 24:
+            return (self.value >> (24 - self.pulses)) & 1
+        self.pulses = 0  # DOUT ready check before the next conversion
+        return 0 if self.ready else 1
+
+def make_hx711(values, **kwargs):
+    pi = FakePi([0, 0] + list(values))  # set_gain and select_channel each discard one read
+    return HX711(pi, 5, 6, **kwargs), pi
+
+def test_read_decodes_signed_24_bit_values():
+    hx, _ = make_hx711([0x000100, 0xFFFFFF])
+    assert hx.read() == 256
+    assert hx.read() == -1
+
+def test_callback_mode_registers_falling_edge_and_times_out():
+    pi = FakePi([0, 0])
+    hx = HX711(pi, 5, 6, ready_mode='callback', ready_timeout=0.05)
+    assert pi.callbacks[0][:2] == (5, pigpio.FALLING_EDGE)
+
+    pi.ready = False
+    pi.reads = 0
+    assert hx.read() is False
+    assert pi.reads <= 2  # Slept on the event instead of polling DOUT
+
+    hx.cleanup()
+    assert not pi.callbacks
+
+class FakeScriptPi(FakePi):
+    def __init__(self, values=()):
+        super().__init__(values)
+        self.scripts = {}
+
+    def store_script(self, script):
+        self.scripts[0] = script.decode()
+        return 0
+
+    def delete_script(self, script_id):
+        self.scripts.pop(script_id, None)
+
+    def run_script(self, script_id, params=None):
+        self.value = self.values.pop(0) if self.values else 0
+
+    def script_status(self, script_id):
+        return pigpio.PI_SCRIPT_HALTED, [self.value] + [0] * 9
+
+def test_script_mode_reads_value_from_script_params():
+    pi = FakeScriptPi([0, 0, 0xFFFF00])
+    hx = HX711(pi, 5, 6, read_mode='script')
+    assert "trig 6 1 1" in pi.scripts[0] and "r 5" in pi.scripts[0]
+    assert hx.read() == -256
+    hx.cleanup()
+    assert not pi.scripts
+
+def test_zero_ignores_a_glitched_read():
+    readings = [1000, 1002, 998, 1001, 999, 0x7FFFF0, 1000, 1003, 997, 1000]
+    hx, _ = make_hx711(readings)
+    assert hx.zero(readings=len(readings)) is None
+    assert hx.offset == pytest.approx(1000, abs=2)
+
+def test_zero_rejects_saturated_reads_as_invalid():
+    hx, _ = make_hx711([0x7FFFFF])
+    assert hx.read() is False
+
+def test_zero_reuses_recent_buffered_reads():
+    hx, pi = make_hx711([500] * 10 + [900] * 10)
+    for _ in range(10):
+        hx.read()
+    assert hx.zero(readings=10, max_age=5.0) is None
+    assert hx.offset == 500
+    assert len(pi.values) == 10  # No fresh reads were needed
+
+def test_median_of_means_estimator_for_get_weight():
+    hx, _ = make_hx711([100, 102, 98, 101, 99], estimator='median_of_means')
+    hx.ratio = 2
+    assert hx.get_weight(readings=5) == pytest.approx(50, abs=1)
@@ -0,0 +1,27 @@
+import pytest
+from libs.hx711 import HX711
+from libs.hx711_sim import LoadModel, SimulatedChip, SimulatedPi, SimulatedSimpleHX711
+
+def test_load_model_adds_grind_and_pour_phases():
+    model = LoadModel(base_mass=100, grind_rate=2, grind_start=1, grind_duration=5,
+                      pour_rate=4, pour_start=10, pour_duration=5)
+    assert model.mass(0) == 100
+    assert model.mass(3) == pytest.approx(104)
+    assert model.mass(12) == pytest.approx(110 + 8)
+    assert model.mass(20) == pytest.approx(130)
+
+def test_simulated_simple_hx711_reports_grams_after_zero():
+    model = LoadModel(base_mass=50, noise=0.01, sps=2000, glitch_probability=0)
+    hx = SimulatedSimpleHX711(5, 6, 400, 0, model)
+    assert hx.weight(5) == pytest.approx(50, abs=0.1)
+    hx.zero(5)
+    assert hx.weight(5) == pytest.approx(0, abs=0.1)
+
+def test_hx711_driver_reads_simulated_chip():
+    model = LoadModel(base_mass=25, noise=0.0, sps=2000, glitch_probability=0)
+    pi = SimulatedPi(5, 6, SimulatedChip(model, reference_unit=400, offset=1000))
+    for read_mode in ("bitbang", "script"):
+        hx = HX711(pi, 5, 6, ready_mode="callback", read_mode=read_mode)
+        assert hx.read() == 1000 + 25 * 400
+        hx.cleanup()
+    pi.stop()
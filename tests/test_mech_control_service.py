@@ -0,0 +1,161 @@
+import asyncio
+import importlib.util
+import json
+import os
+import threading
+import time
+from contextlib import asynccontextmanager
+import pytest
+
+ROOT = os.path.join(os.path.dirname(__file__), '..', 'src')
+
+def load(name, path):
+    # Neither file is importable by name: one has a dot in it, the other lives in helpers
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+mech_control = load('mech_control_service', 'operator_services/mech_control.service.py')
+emulator = load('mech_control_emulator', 'helpers/mech_control_emulator.py')
+
+@asynccontextmanager
+async def emulated_board(tmp_path, time_scale=0.01, spout_start=0.0):
+    """
+    A mech-control service talking to the firmware emulator over a pty. The
+    emulator runs in its own thread, like the board runs on its own clock.
+    """
+    master, slave, path = emulator.open_pty()
+    board = emulator.FirmwareEmulator(master, time_scale, spout_start)
+    thread = threading.Thread(target=board.run, daemon=True)
+    thread.start()
+    service = mech_control.MechControlService(socket_path=str(tmp_path / 'mech.sock'), serial_port=path)
+    server = asyncio.create_task(service.start_server())
+    while not os.path.exists(service.socket_path):
+        await asyncio.sleep(0.01)
+    try:
+        yield service, board
+    finally:
+        server.cancel()
+        await asyncio.gather(server, return_exceptions=True)
+        service.cleanup()
+        board.stop()
+        os.close(slave)
+        thread.join(timeout=1)
+        os.close(master)
+
+def cone(steps=100, speed=2000):
+    return {'command': 'move_cone', 'steps': steps, 'speed': speed, 'direction': 0}
+
+@pytest.mark.asyncio
+async def test_error_frames_fail_the_command_that_raised_them(tmp_path):
+    async with emulated_board(tmp_path) as (service, board):
+        # The spout was never homed, so the firmware rejects the spout move but runs the cone moves
+        batch = [cone(), {'command': 'move_spout', 'degrees': 10, 'speed': 500, 'direction': 0}, cone()]
+        responses = await asyncio.wait_for(service.execute_pipelined(batch), timeout=5)
+        assert [response[0] for response in responses] == ['cone_done', 'error', 'cone_done']
+        assert responses[1][1] == "Arduino error: Spout not zeroed"
+        assert not service.state.spout_trusted and service.state.cone_trusted
+        assert not service._pending
+
+@pytest.mark.asyncio
+async def test_late_acknowledgments_stall_without_losing_their_command(tmp_path):
+    # The board runs three times slower than planned, so every queued move misses its deadline
+    async with emulated_board(tmp_path, time_scale=3) as (service, board):
+        service.schedule = mech_control.MotionSchedule(ack_margin=0.05)
+        lines = []
+
+        async def send(line):
+            lines.append(line)
+
+        await asyncio.wait_for(service.stream_batch([cone()] * 5, True, send), timeout=10)
+        for index in range(1, 5):
+            statuses = [line['status'] for line in lines if line.get('index') == index]
+            # The stall is reported when the deadline passes, before the late acknowledgment
+            assert statuses == ['stalled', 'cone_done']
+            stall = next(line for line in lines if line.get('index') == index)
+            assert stall['data']['limit_seconds'] == mech_control.STALL_LIMIT_MIN
+        assert lines[-1]['summary']['completed'] == 5
+        # Every late acknowledgment resolved its own command and handed its credit back
+        assert not service._pending
+        assert service.available_credits == mech_control.FIRMWARE_QUEUE_SLOTS
+        assert service.state.cone_trusted
+
+@pytest.mark.asyncio
+async def test_silent_commands_are_given_up_after_the_stall_limit(tmp_path):
+    async with emulated_board(tmp_path) as (service, board):
+        future = asyncio.get_running_loop().create_future()
+        deadline = time.time()
+        stalls = []
+
+        async def on_stall(late_by):
+            stalls.append(late_by)
+
+        with pytest.raises(TimeoutError):
+            await asyncio.wait_for(service.wait_for_ack('move_cone', future, lambda: deadline, 0.05, on_stall),
+                                   timeout=2)
+        assert len(stalls) == 1 and future.cancelled()
+
+@pytest.mark.asyncio
+async def test_sequential_commands_are_acknowledged_from_the_reader_thread(tmp_path):
+    async with emulated_board(tmp_path, spout_start=30) as (service, board):
+        batch = [{'command': 'zero_spout'}, {'command': 'move_spout', 'degrees': 10, 'speed': 500, 'direction': 0}]
+        responses = await asyncio.wait_for(service.execute_sequential(batch), timeout=5)
+        assert [response[0] for response in responses] == ['zero_done', 'spout_done']
+        assert service.state.spout_trusted and service.state.spout == 10
+
+@pytest.mark.asyncio
+async def test_pipelined_batches_larger_than_the_firmware_queue_wait_for_credits(tmp_path):
+    # Sending is instant and each move takes 20 ms, so without credits the 20th would find the queue full
+    async with emulated_board(tmp_path, time_scale=0.1) as (service, board):
+        responses = await asyncio.wait_for(service.execute_pipelined([cone()] * 25), timeout=10)
+        assert [response[0] for response in responses] == ['cone_done'] * 25
+        assert service.available_credits == mech_control.FIRMWARE_QUEUE_SLOTS
+
+@pytest.mark.asyncio
+async def test_streamed_batches_send_a_line_per_command_and_a_summary(tmp_path):
+    async with emulated_board(tmp_path) as (service, board):
+        reader, writer = await asyncio.open_unix_connection(service.socket_path)
+        request = {'id': 7, 'stream': True, 'pipelined': True, 'commands': [cone()] * 3}
+        writer.write((json.dumps(request) + '\n').encode())
+        await writer.drain()
+        lines = [json.loads(await asyncio.wait_for(reader.readline(), timeout=5)) for _ in range(4)]
+        assert [line['index'] for line in lines[:3]] == [0, 1, 2]
+        assert all(line['id'] == 7 and line['status'] == 'cone_done' for line in lines[:3])
+        assert lines[3] == {'id': 7, 'summary': {'total': 3, 'completed': 3, 'errors': 0,
+                                                 'elapsed': lines[3]['summary']['elapsed']}}
+        writer.close()
+        await writer.wait_closed()
+
+@pytest.mark.asyncio
+async def test_relay_multiplexes_requests_over_one_connection(tmp_path):
+    relay_module = load('mech_control_websocket', 'helpers/mech-control-websocket.py')
+    async with emulated_board(tmp_path) as (service, board):
+        relay = relay_module.WebSocketRelayServer(unix_socket_path=service.socket_path)
+        single, batch = await asyncio.wait_for(asyncio.gather(
+            relay.send_to_unix_socket([cone()]),
+            relay.send_to_unix_socket({'pipelined': True, 'commands': [cone()] * 3})), timeout=5)
+        assert [line['status'] for line in single] == ['cone_done']
+        assert [line['status'] for line in batch] == ['cone_done'] * 3
+        connection = relay._writer
+        streamed = [line async for line in relay.stream_from_unix_socket(
+            {'stream': True, 'pipelined': True, 'commands': [cone()] * 2})]
+        assert 'summary' in streamed[-1] and len(streamed) == 3
+        # Every request was answered on the same connection and released its id
+        assert relay._writer is connection and not relay._pending
+        relay._writer.close()
+        await relay._read_task
+
+@pytest.mark.asyncio
+async def test_cancelling_a_command_held_back_from_the_serial_link_returns_its_credit(tmp_path):
+    async with emulated_board(tmp_path) as (service, board):
+        # Writes are held back, as they are while the spout homes
+        service._serial_ready.clear()
+        request = asyncio.create_task(service.execute_command(cone()))
+        await asyncio.sleep(0.05)
+        assert service.available_credits == mech_control.FIRMWARE_QUEUE_SLOTS - 1
+        request.cancel()
+        await asyncio.gather(request, return_exceptions=True)
+        assert service.available_credits == mech_control.FIRMWARE_QUEUE_SLOTS
+        service._serial_ready.set()
+        assert (await asyncio.wait_for(service.execute_command(cone()), timeout=5))[0] == 'cone_done'
@@ -0,0 +1,139 @@
+import importlib.util
+import pytest
+import mech_motion
+from mech_motion import (CONE_STEPS_PER_REV, DURATION_TOLERANCE, MAX_STEP_RATE, SPOUT_STEPS_PER_DEGREE, KinematicState,
+                         MotionSchedule, compile_pattern, cruise_speed, estimate_seconds, move_duration, optimize_plan,
+                         plan_seconds)
+
+def cone(steps, speed=1000, direction=0):
+    return {'command': 'move_cone', 'steps': steps, 'speed': speed, 'direction': direction}
+
+def spout(degrees, speed=500, direction=0):
+    return {'command': 'move_spout', 'degrees': degrees, 'speed': speed, 'direction': direction}
+
+def test_cruise_speed_covers_ramps():
+    # 10000 steps in 2s at a=10000: v^2 - 20000v + 1e8 = 0 has a double root at 10000 (pure triangle)
+    assert cruise_speed(10000, 2.0) == 10000
+    # Long enough to cruise: slightly faster than steps / seconds to make up for the ramps
+    assert 1000 < cruise_speed(10000, 10.0) < 1020
+    assert cruise_speed(0, 1.0) == 1
+
+def test_optimize_drops_zero_length_and_merges():
+    plan = optimize_plan([
+        cone(0),
+        cone(100),
+        cone(200),
+        spout(10),
+        spout(10),
+        {'command': 'move_both', 'cone_steps': 0, 'cone_speed': 1, 'spout_degrees': 10,
+         'spout_speed': 1, 'direction': 0},
+        cone(50, speed=2000),
+    ])
+    assert plan == [
+        {'command': 'move_both', 'cone_steps': 300, 'cone_speed': 1000, 'spout_degrees': 10,
+         'spout_speed': 500, 'direction': 0},
+        cone(50, speed=2000),
+    ]
+
+def test_optimize_keeps_moves_with_different_directions_apart():
+    plan = optimize_plan([cone(100), spout(5, direction=1)])
+    assert [command['command'] for command in plan] == ['move_cone', 'move_spout']
+
+def test_spiral_turns_the_cone_and_reaches_the_radius():
+    plan = compile_pattern('spiral', radius=20, revolutions=3, duration=30)
+    cone_steps = sum(c.get('cone_steps', c.get('steps', 0)) for c in plan if c['command'] != 'move_spout')
+    assert cone_steps == 3 * CONE_STEPS_PER_REV
+    assert plan[-1]['spout_degrees'] == 20
+
+def test_compiled_plans_fit_their_duration_and_step_rate():
+    plan = compile_pattern('spiral', radius=20, revolutions=3, duration=30)
+    assert plan_seconds(plan) <= 30 * (1 + DURATION_TOLERANCE)
+    assert all(value <= MAX_STEP_RATE for c in plan for key, value in c.items() if key.endswith('speed'))
+    # Too little time for 24 stop-start segments: fewer, longer ones instead
+    shorter = compile_pattern('spiral', radius=20, revolutions=3, duration=25)
+    assert len(shorter) < len(plan)
+    assert plan_seconds(shorter) <= 25 * (1 + DURATION_TOLERANCE)
+
+def test_patterns_that_cannot_meet_their_duration_are_rejected():
+    # Three turns of the cone take over 19s at MAX_STEP_RATE
+    with pytest.raises(ValueError):
+        compile_pattern('spiral', radius=20, revolutions=3, duration=10)
+    with pytest.raises(ValueError):
+        compile_pattern('pulse', radius=10, pulses=2, duration=1)
+
+def test_compiled_plans_are_cached_by_parameters():
+    assert compile_pattern('pulse', radius=10, pulses=2, duration=3) is \
+        compile_pattern('pulse', radius=10.0, pulses=2.0, duration=3)
+
+def test_unknown_pattern_or_parameter_is_rejected():
+    with pytest.raises(ValueError):
+        compile_pattern('zigzag', radius=10)
+    with pytest.raises(ValueError):
+        compile_pattern('spiral', radius=10, revolutions=1, duration=1, wobble=3)
+
+def test_move_duration_matches_trapezoid_and_triangle_profiles():
+    # Cruise at 1000 steps/s with 0.1s ramps at each end
+    assert move_duration(10000, 1000) == pytest.approx(10.1)
+    # Too short to reach 1000 steps/s: accelerate for half, decelerate for half
+    assert move_duration(25, 1000) == pytest.approx(0.1)
+    assert move_duration(0, 1000) == 0
+    assert cruise_speed(10000, move_duration(10000, 1000)) == 1000
+
+def test_kinematic_state_tracks_moves_and_plans_shortest_cone_goto():
+    state = KinematicState()
+    state.apply(cone(CONE_STEPS_PER_REV // 4))
+    assert state.as_dict()['cone_angle'] == 90
+    # 90° -> 0° is a quarter turn back, not three quarters forward
+    assert state.goto_cone(0, speed=1000) == cone(CONE_STEPS_PER_REV // 4, direction=1)
+    assert state.goto_cone(450, speed=1000) is None
+
+def test_kinematic_state_spout_goto_needs_homing_and_handles_inverted_moves():
+    state = KinematicState()
+    with pytest.raises(ValueError):
+        state.goto_spout(10, speed=500)
+    state.apply({'command': 'zero_spout'})
+    state.apply(spout(20))
+    # An inverted move to firmware target 10 physically goes 10° further out
+    state.apply(spout(10, direction=1))
+    assert state.spout == 30
+    assert state.goto_spout(30, speed=500) is None
+    assert state.goto_spout(25, speed=500) == spout(5)
+    state.invalidate(['spout'])
+    assert not state.spout_trusted
+
+def test_schedule_sets_deadlines_and_measures_back_to_back_moves():
+    schedule = MotionSchedule(ack_margin=0.1)
+    first = schedule.add('move_cone', 1.0, now=0.0)
+    second = schedule.add('move_cone', 2.0, now=0.0)
+    assert schedule.deadline(first) == pytest.approx(0.1)
+    assert schedule.deadline(second) == pytest.approx(1.1)
+
+    assert schedule.acknowledged(first, 0.05) is None
+    # The first move ran long, so the second starts later than planned
+    measured = schedule.acknowledged(second, 1.55)
+    assert measured is first and measured.actual == pytest.approx(1.5)
+    assert schedule.busy_until == pytest.approx(3.55)
+
+def test_schedule_dropping_a_command_pulls_later_ones_forward():
+    schedule = MotionSchedule(ack_margin=0.1)
+    first = schedule.add('move_cone', 1.0, now=0.0)
+    rejected = schedule.add('move_spout', 2.0, now=0.0)
+    last = schedule.add('move_cone', 1.0, now=0.0)
+    schedule.dropped(rejected)
+    assert schedule.deadline(last) == pytest.approx(1.1)
+    assert schedule.acknowledged(first, 0.0) is None
+
+def test_estimate_uses_absolute_spout_targets():
+    move = spout(10, speed=2000)
+    assert estimate_seconds(move, spout_target=10) == 0
+    assert estimate_seconds(move, spout_target=0) == pytest.approx(move_duration(10 * SPOUT_STEPS_PER_DEGREE, 2000))
+
+def test_cone_steps_per_rev_can_be_set_for_the_real_cone_gearing(monkeypatch):
+    # Load a separate copy so the setting doesn't leak into the module the other tests use
+    monkeypatch.setenv('MECH_CONTROL_CONE_STEPS_PER_REV', '12800')
+    spec = importlib.util.spec_from_file_location('mech_motion_geared', mech_motion.__file__)
+    geared = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(geared)
+    state = geared.KinematicState()
+    state.apply(cone(3200))
+    assert state.as_dict()['cone_angle'] == 90
@@ -0,0 +1,35 @@
+import pytest
+from pump_calibration import MAX_SAMPLES, CalibrationTable
+
+def test_uncalibrated_table_scales_nominal_flow(tmp_path):
+    table = CalibrationTable(str(tmp_path / 'cal.ini'), nominal_flow=10.0)
+    assert table.flow_rate(50) == 5.0
+    assert table.duration_for(10.0, 50) == 2.0
+
+def test_interpolates_between_measured_speeds(tmp_path):
+    table = CalibrationTable(str(tmp_path / 'cal.ini'))
+    table.update(40, 10.0, 20.0)
+    table.update(80, 10.0, 60.0)
+    assert table.flow_rate(60) == pytest.approx(4.0)
+    # Outside the measured range flow follows the nearest point proportionally
+    assert table.flow_rate(100) == pytest.approx(7.5)
+    assert table.flow_rate(20) == pytest.approx(1.0)
+
+def test_updates_are_a_capped_running_mean(tmp_path):
+    table = CalibrationTable(str(tmp_path / 'cal.ini'))
+    table.update(60.2, 1.0, 4.0)
+    point = table.update(59.8, 1.0, 6.0)
+    assert point.flow == pytest.approx(5.0)
+    assert point.samples == 2
+    for _ in range(50):
+        point = table.update(60, 1.0, 8.0)
+    assert point.samples == MAX_SAMPLES
+    assert point.flow == pytest.approx(8.0, abs=0.05)
+
+def test_table_round_trips_through_the_file(tmp_path):
+    path = str(tmp_path / 'config' / 'pump_calibration.ini')
+    table = CalibrationTable(path)
+    table.update(55, 2.0, 9.0)
+    table.save()
+    loaded = CalibrationTable.load(path)
+    assert loaded.as_dict()['points'] == [{'speed': 55, 'flow_rate': 4.5, 'samples': 1}]
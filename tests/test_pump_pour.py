@@ -0,0 +1,48 @@
+import pytest
+from pump_pour import PIDController, PourController
+
+def make_pid():
+    return PIDController(kp=8.0, ki=4.0, kd=0.0, output_min=40, output_max=100, bias=70)
+
+def test_pid_speeds_up_when_flow_is_low_and_clamps():
+    pid = make_pid()
+    assert pid.update(1.0, 0.1) > 70
+    assert pid.update(100.0, 0.1) == 100
+    assert pid.update(-100.0, 0.1) == 40
+
+def test_pid_does_not_wind_up_while_saturated():
+    pid = make_pid()
+    for _ in range(100):
+        pid.update(10.0, 0.1)
+    # One step of negative error is enough to leave saturation again
+    assert pid.update(-1.0, 0.1) < 100
+
+def test_pour_runs_open_loop_until_flow_is_known():
+    controller = PourController(100.0, 5.0, make_pid(), in_flight=0.5)
+    assert controller.update(0.0, None, 0.0) == 70
+
+def test_pour_cuts_off_for_water_in_flight():
+    controller = PourController(100.0, 5.0, make_pid(), in_flight=0.5)
+    assert controller.update(97.0, 5.0, 1.0) is not None
+    # 98 g on the scale plus 2.5 g still falling reaches the target
+    assert controller.update(98.0, 5.0, 1.2) is None
+    assert controller.cutoff['predicted'] == pytest.approx(100.5)
+
+def test_report_accuracy_and_overshoot():
+    controller = PourController(100.0, 5.0, make_pid(), in_flight=0.5)
+    controller.update(0.0, None, 0.0)
+    controller.update(98.0, 5.0, 20.0)
+    report = controller.report(101.0, 22.0, 'complete')
+    assert report['error'] == 1.0
+    assert report['overshoot'] == 1.0
+    assert report['accuracy_pct'] == 99.0
+    assert report['mean_flow_rate'] == pytest.approx(4.9)
+    assert report['observed_in_flight'] == pytest.approx(0.6)
+
+def test_report_falls_back_to_last_weight_when_unsettled():
+    controller = PourController(50.0, 5.0, make_pid())
+    controller.update(30.0, 5.0, 1.0)
+    report = controller.report(None, 60.0, 'timeout')
+    assert report['settled'] is False
+    assert report['final_weight'] == 30.0
+    assert report['overshoot'] == 0.0
@@ -0,0 +1,25 @@
+import pytest
+from pump_ramp import RAMP_PROFILES, duty_cycle, ramp_speed
+
+@pytest.mark.parametrize('profile', sorted(RAMP_PROFILES))
+def test_profiles_run_from_start_to_end(profile):
+    curve = RAMP_PROFILES[profile]
+    assert curve(0.0) == 0.0
+    assert curve(1.0) == 1.0
+    points = [curve(i / 20) for i in range(21)]
+    assert points == sorted(points)
+
+def test_soft_start_and_s_curve_begin_gently():
+    assert RAMP_PROFILES['soft_start'](0.1) < RAMP_PROFILES['linear'](0.1)
+    assert RAMP_PROFILES['s_curve'](0.1) < RAMP_PROFILES['linear'](0.1)
+    # The S-curve eases out as well
+    assert RAMP_PROFILES['s_curve'](0.9) > RAMP_PROFILES['linear'](0.9)
+
+def test_ramp_speed_follows_elapsed_time():
+    assert ramp_speed('linear', 40, 80, 2.0, 0.5) == 50
+    assert ramp_speed('linear', 80, 40, 2.0, 1.0) == 60
+    assert ramp_speed('s_curve', 40, 80, 2.0, 3.0) == 80
+
+def test_duty_cycle_ranges():
+    assert duty_cycle(60, 255) == 153
+    assert duty_cycle(62.5, 1_000_000) == 625000
@@ -0,0 +1,237 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+import pytest
+import pump_service
+from pump_calibration import CalibrationTable
+from pump_service import PumpControlService, handle_client
+
+class FakePi:
+    """
+    Records the GPIO levels and PWM duty cycles the pump service sets.
+    """
+    def __init__(self):
+        self.levels = {}
+        self.duty = {}
+        self.hardware = {}
+
+    def set_mode(self, gpio, mode):
+        pass
+
+    def write(self, gpio, level):
+        self.levels[gpio] = level
+
+    def set_PWM_dutycycle(self, gpio, duty):
+        self.duty[gpio] = duty
+
+    def hardware_PWM(self, gpio, frequency, duty):
+        self.hardware[gpio] = (frequency, duty)
+
+async def start_pump_server(tmp_path, pi):
+    pump = PumpControlService(pi=pi)
+    path = str(tmp_path / 'pump.sock')
+    server = await asyncio.start_unix_server(lambda r, w: handle_client(pump, r, w), path=path)
+    return pump, server, path
+
+async def call(reader, writer, command):
+    writer.write((json.dumps(command) + '\n').encode())
+    await writer.drain()
+    return json.loads(await reader.readline())
+
+async def close(*writers):
+    for writer in writers:
+        writer.close()
+        await writer.wait_closed()
+    # Let the server's handlers see EOF and finish before the loop goes away
+    await asyncio.sleep(0.01)
+
+@pytest.mark.asyncio
+async def test_connection_stays_open_for_many_commands(tmp_path):
+    pi = FakePi()
+    pump, server, path = await start_pump_server(tmp_path, pi)
+    async with server:
+        reader, writer = await asyncio.open_unix_connection(path)
+        reply = await call(reader, writer, {'action': 'control_speed',
+                                            'params': {'direction': 'forward', 'speed': 60}})
+        assert reply == {'direction': 'forward', 'speed': 60, 'status_flag': True, 'ramping': False}
+        assert pi.duty[pump_service.FORWARD_PIN] == 153
+
+        assert (await call(reader, writer, {'action': 'status'}))['speed'] == 60
+        assert 'error' in await call(reader, writer, {'action': 'fly'})
+        assert (await call(reader, writer, {'action': 'stop'}))['direction'] == 'stop'
+        await close(writer)
+
+@pytest.mark.asyncio
+async def test_clients_are_served_concurrently(tmp_path):
+    pump, server, path = await start_pump_server(tmp_path, FakePi())
+    async with server:
+        # An idle connection must not hold up another client
+        idle_reader, idle_writer = await asyncio.open_unix_connection(path)
+        reader, writer = await asyncio.open_unix_connection(path)
+        reply = await asyncio.wait_for(call(reader, writer, {'action': 'status'}), timeout=1)
+        assert reply['direction'] == 'stop'
+        await close(idle_writer, writer)
+
+@pytest.mark.asyncio
+async def test_ramp_runs_in_the_service_until_taken_over(tmp_path):
+    pi = FakePi()
+    pump, server, path = await start_pump_server(tmp_path, pi)
+    async with server:
+        reader, writer = await asyncio.open_unix_connection(path)
+        ramp = {'direction': 'forward', 'speed': 80, 'duration': 0.1, 'profile': 'linear'}
+        reply = await call(reader, writer, {'action': 'ramp', 'params': ramp})
+        assert reply['ramping']
+        await asyncio.sleep(0.2)
+        status = await call(reader, writer, {'action': 'status'})
+        assert status == {'direction': 'forward', 'speed': 80, 'status_flag': True, 'ramping': False}
+        assert pi.duty[pump_service.FORWARD_PIN] == 204
+
+        # A slow ramp down is cut short by an explicit speed
+        await call(reader, writer, {'action': 'ramp', 'params': {**ramp, 'speed': 0, 'duration': 10}})
+        reply = await call(reader, writer, {'action': 'control_speed',
+                                            'params': {'direction': 'forward', 'speed': 50}})
+        assert not reply['ramping']
+        await asyncio.sleep(0.05)
+        assert (await call(reader, writer, {'action': 'status'}))['speed'] == 50
+
+        await call(reader, writer, {'action': 'ramp', 'params': {**ramp, 'speed': 0, 'duration': 0.05}})
+        await asyncio.sleep(0.15)
+        assert (await call(reader, writer, {'action': 'status'}))['direction'] == 'stop'
+        assert 'error' in await call(reader, writer, {'action': 'ramp', 'params': {**ramp, 'speed': 20}})
+        await close(writer)
+
+def test_hardware_pwm_uses_million_step_duty(monkeypatch):
+    monkeypatch.setattr(pump_service, 'PWM_MODE', 'hardware')
+    pi = FakePi()
+    pump = PumpControlService(pi=pi)
+    pump.control_pump_speed(pump_service.PumpSpeedControl(direction='reverse', speed=62.5))
+    assert pi.hardware[pump_service.REVERSE_PIN] == (pump_service.PWM_FREQUENCY, 625000)
+    assert pi.levels[pump_service.FORWARD_PIN] == 0
+    pump.stop_pump()
+    assert pi.hardware[pump_service.REVERSE_PIN][1] == 0
+
+class FakeMugScale:
+    """
+    Mug scale socket that turns the forward PWM duty into water landing in
+    the mug `lag` seconds later, simulated every `period` while run() runs.
+    """
+    def __init__(self, pi, grams_per_second_at_full=25.0, lag=0.1, period=0.01, weight=0.0):
+        self.pi = pi
+        self.full_flow = grams_per_second_at_full
+        self.lag_frames = round(lag / period)
+        self.period = period
+        self.weight = weight
+        self.flow = 0.0
+        self.timestamp = 0.0
+        self.falling = []
+
+    async def run(self):
+        while True:
+            duty = self.pi.duty.get(pump_service.FORWARD_PIN, 0)
+            self.falling.append(duty / 255 * self.full_flow * self.period)
+            landed = self.falling.pop(0) if len(self.falling) > self.lag_frames else 0.0
+            self.weight += landed
+            self.flow = landed / self.period
+            self.timestamp += self.period
+            await asyncio.sleep(self.period)
+
+    async def handle(self, reader, writer):
+        command = json.loads(await reader.readline())
+        if command['command'] == 'stream_start':
+            try:
+                while not reader.at_eof():
+                    writer.write((json.dumps({'weight': self.weight, 'unit': 'g', 'timestamp': self.timestamp,
+                                              'flow_rate': self.flow}) + '\n').encode())
+                    await writer.drain()
+                    await asyncio.sleep(self.period)
+            except ConnectionError:
+                pass
+        elif command['command'] == 'wait_settled':
+            settled = self.weight + sum(self.falling)
+            writer.write((json.dumps({'event': 'stable', 'weight': settled}) + '\n').encode())
+            await writer.drain()
+        writer.close()
+
+@asynccontextmanager
+async def mug_scale(tmp_path, pi, weight=0.0):
+    scale = FakeMugScale(pi, weight=weight)
+    path = str(tmp_path / 'scale.sock')
+    server = await asyncio.start_unix_server(scale.handle, path=path)
+    simulation = asyncio.create_task(scale.run())
+    async with server:
+        yield scale, path
+    simulation.cancel()
+
+@pytest.mark.asyncio
+async def test_pour_to_weight_reports_accuracy(tmp_path, monkeypatch):
+    # The fake scale's water lands 0.1 s after it is pumped
+    monkeypatch.setattr(pump_service, 'POUR_IN_FLIGHT', 0.1)
+    pi = FakePi()
+    pump, server, path = await start_pump_server(tmp_path, pi)
+    # Nothing tares the scale: the 250 g already on it is the pour's zero
+    async with server, mug_scale(tmp_path, pi, weight=250.0) as (scale, scale_path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        pour = asyncio.create_task(pump.pour_to_weight(
+            pump_service.PourToWeight(target_weight=8.0, flow_rate=15.0), scale_socket=scale_path))
+        await asyncio.sleep(0.1)
+        # The pour owns the pump until it finishes
+        assert 'error' in await call(reader, writer, {'action': 'control_speed',
+                                                      'params': {'direction': 'forward', 'speed': 60}})
+        report = await asyncio.wait_for(pour, timeout=5)
+        assert report['status'] == 'complete'
+        assert report['settled']
+        assert report['final_weight'] == pytest.approx(8.0, abs=1.0)
+        assert pi.duty[pump_service.FORWARD_PIN] == 0
+        assert (await call(reader, writer, {'action': 'status'}))['direction'] == 'stop'
+        await close(writer)
+        await asyncio.sleep(0.05)
+
+@pytest.mark.asyncio
+async def test_stop_aborts_a_pour(tmp_path):
+    pi = FakePi()
+    pump, server, path = await start_pump_server(tmp_path, pi)
+    async with server, mug_scale(tmp_path, pi) as (scale, scale_path):
+        reader, writer = await asyncio.open_unix_connection(path)
+        pour = asyncio.create_task(pump.pour_to_weight(
+            pump_service.PourToWeight(target_weight=500.0, flow_rate=15.0), scale_socket=scale_path))
+        await asyncio.sleep(0.1)
+        await call(reader, writer, {'action': 'stop'})
+        report = await asyncio.wait_for(pour, timeout=5)
+        assert report['status'] == 'aborted'
+        assert pi.duty[pump_service.FORWARD_PIN] == 0
+        await close(writer)
+        await asyncio.sleep(0.05)
+
+@pytest.mark.asyncio
+async def test_pour_owns_the_pump_before_reaching_the_scale(tmp_path):
+    pi = FakePi()
+    pump = PumpControlService(pi=pi)
+    async with mug_scale(tmp_path, pi) as (scale, scale_path):
+        pour = asyncio.create_task(pump.pour_to_weight(
+            pump_service.PourToWeight(target_weight=500.0, flow_rate=15.0), scale_socket=scale_path))
+        # Still connecting to the scale: a second pour is refused and a stop is not lost
+        await asyncio.sleep(0)
+        assert 'error' in await pump_service.handle_command(pump, {'action': 'pour_to_weight', 'params': {
+            'target_weight': 10.0, 'flow_rate': 15.0}})
+        await pump_service.handle_command(pump, {'action': 'stop'})
+        report = await asyncio.wait_for(pour, timeout=5)
+        assert report['status'] == 'aborted'
+        assert pi.duty[pump_service.FORWARD_PIN] == 0
+
+@pytest.mark.asyncio
+async def test_dispense_learns_flow_from_the_scale(tmp_path):
+    pi = FakePi()
+    calibration = CalibrationTable(str(tmp_path / 'pump_calibration.ini'), nominal_flow=10.0)
+    pump = PumpControlService(pi=pi, calibration=calibration)
+    async with mug_scale(tmp_path, pi) as (scale, scale_path):
+        # The table guesses 6 ml/s at 60%, the fake pump really gives 15 ml/s
+        first = await pump.dispense(pump_service.Dispense(ml=2.0, speed=60), scale_socket=scale_path)
+        assert first['measured_ml'] == pytest.approx(5.0, abs=1.0)
+        assert first['calibrated_flow_rate'] == pytest.approx(15.0, abs=2.0)
+
+        second = await pump.dispense(pump_service.Dispense(ml=2.0, speed=60), scale_socket=scale_path)
+        assert abs(second['error_ml']) < 0.5
+
+    stored = CalibrationTable.load(calibration.path)
+    assert stored.points[60.0].samples == 2
+    assert pi.duty[pump_service.FORWARD_PIN] == 0
@@ -2,6 +2,7 @@ import pytest
 from unittest.mock import patch, MagicMock, AsyncMock
 from fastapi.testclient import TestClient
 from fastapi import FastAPI
+import asyncio
 import time
 import pigpio
 from operator_app.api.v1.relay.relay_routes import router as relay_router, set_relay_off_after_timer
@@ -30,4 +31,41 @@ async def test_set_relay_off_after_timer(mock_sleep):
     with patch('operator_app.api.v1.relay.relay_routes.pi.write') as mock_write:
         await set_relay_off_after_timer(22, 5)
         mock_sleep.assert_awaited_with(5)
-        mock_write.assert_called_with(22, 1)
\ No newline at end of file
+        mock_write.assert_called_with(22, 1)
+class GrinderRelay:
+    """
+    Stands in for pigpio on the grinder relay and records how much had really
+    been ground, per the scale's load model, when the relay was switched off.
+    """
+    def __init__(self, scale):
+        self.scale = scale
+        self.ground_at_stop = None
+
+    def write(self, gpio, level):
+        if level == 1 and self.ground_at_stop is None:
+            chip = self.scale.hx.chip
+            self.ground_at_stop = chip.model.mass(time.monotonic() - chip.started)
+
+@pytest.mark.asyncio
+async def test_grind_stops_at_target_while_the_scale_streams_at_full_rate(tmp_path, monkeypatch):
+    from libs.hx711_sim import LoadModel
+    from scale_service import Scale, ScaleConfig
+    from operator_app.api.v1.relay import relay_routes
+
+    # 10 g/s of grounds from 0.5 s after the scale starts, streamed at 80 SPS
+    model = LoadModel(grind_rate=10.0, grind_start=0.5, grind_duration=1.0, noise=0.0, sps=80,
+                      glitch_probability=0)
+    config = ScaleConfig(name='cone', data_pin=5, clock_pin=6, reference_unit=400, zero_value=0, unit='g',
+                         socket_path=str(tmp_path / 'cone.sock'), filters='', backend='simulated',
+                         simulation=model)
+    scale = Scale(config, pi=None)
+    relay = GrinderRelay(scale)
+    monkeypatch.setattr(relay_routes, 'CONE_SCALE_SOCKET_PATH', config.socket_path)
+    monkeypatch.setattr(relay_routes, 'pi', relay)
+    server = await asyncio.start_unix_server(scale.handle_client, path=config.socket_path)
+    async with server:
+        await asyncio.wait_for(relay_routes.grind_to_weight(22, target_weight=5.0, timeout=5), timeout=10)
+        # Stale frames would switch it off seconds late, with the whole 10 g ground
+        assert relay.ground_at_stop == pytest.approx(5.0, abs=0.3)
+        await asyncio.sleep(0.1)
+    scale.hub.stop()
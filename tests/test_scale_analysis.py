@@ -0,0 +1,42 @@
+import pytest
+from scale_analysis import StabilityDetector, flow_rate, settled_weight
+from scale_stream import Sample, SampleRingBuffer
+
+def fill(buffer, weights, rate=10.0, start=0.0):
+    for i, weight in enumerate(weights):
+        buffer.append(Sample(start + i / rate, weight))
+    return start + (len(weights) - 1) / rate
+
+def test_settled_weight_requires_full_duration_within_tolerance():
+    buffer = SampleRingBuffer()
+    now = fill(buffer, [10.0, 10.05, 9.95])
+    assert settled_weight(buffer, now, tolerance=0.1, duration=0.5) is None
+
+    now = fill(buffer, [10.0, 10.05, 9.95, 10.0, 10.02, 9.98, 10.0], start=now + 0.1)
+    assert settled_weight(buffer, now, tolerance=0.1, duration=0.5) == pytest.approx(10.0, abs=0.02)
+
+def test_settled_weight_rejects_moving_scale():
+    buffer = SampleRingBuffer()
+    now = fill(buffer, [float(i) for i in range(20)])
+    assert settled_weight(buffer, now, tolerance=0.1, duration=0.5) is None
+
+def test_detector_emits_stable_then_unstable_once():
+    buffer = SampleRingBuffer()
+    detector = StabilityDetector(tolerance=0.1, duration=0.5)
+    events = []
+    for i, weight in enumerate([5.0] * 10 + [8.0] * 3):
+        buffer.append(Sample(i / 10, weight))
+        event = detector.update(buffer, i / 10)
+        if event:
+            events.append(event["event"])
+    assert events == ["stable", "unstable"]
+
+def test_flow_rate_fits_slope_over_window():
+    buffer = SampleRingBuffer()
+    now = fill(buffer, [2.5 * i / 10 + (0.05 if i % 2 else -0.05) for i in range(30)])
+    assert flow_rate(buffer, now, window=1.0) == pytest.approx(2.5, abs=0.2)
+
+def test_flow_rate_needs_enough_samples():
+    buffer = SampleRingBuffer()
+    now = fill(buffer, [1.0, 2.0])
+    assert flow_rate(buffer, now, window=1.0) is None
@@ -0,0 +1,40 @@
+import pytest
+from scale_filters import FilterChain, MADOutlierFilter, MovingMedianFilter, EMAFilter, KalmanFilter
+
+def test_parse_builds_filters_in_order_with_parameters():
+    chain = FilterChain.parse("mad:window=9,threshold=3|ema:alpha=0.5")
+    assert [type(f) for f in chain.filters] == [MADOutlierFilter, EMAFilter]
+    assert chain.filters[0].window == 9
+    assert chain.filters[1].alpha == 0.5
+
+def test_parse_empty_or_none_gives_passthrough_chain():
+    for spec in (None, "", "none"):
+        chain = FilterChain.parse(spec)
+        assert not chain
+        assert chain.update(4.2) == 4.2
+
+def test_parse_rejects_unknown_filter():
+    with pytest.raises(ValueError):
+        FilterChain.parse("lowpass:alpha=0.1")
+
+def test_moving_median_updates_every_sample():
+    f = MovingMedianFilter(window=3)
+    assert [f.update(v) for v in (1.0, 5.0, 2.0, 8.0, 3.0)] == [1.0, 3.0, 2.0, 5.0, 3.0]
+
+def test_mad_filter_replaces_glitch_read_with_median():
+    f = MADOutlierFilter(window=15, threshold=3.5)
+    for v in (10.0, 10.1, 9.9, 10.0, 10.2, 9.8):
+        f.update(v)
+    assert f.update(8388607.0) == pytest.approx(10.0)
+    assert f.update(10.1) == 10.1
+
+def test_ema_and_kalman_converge_on_step():
+    ema = EMAFilter(alpha=0.5)
+    kalman = KalmanFilter(process_variance=0.01, measurement_variance=0.25)
+    ema.update(0.0)
+    kalman.update(0.0)
+    for _ in range(50):
+        e = ema.update(10.0)
+        k = kalman.update(10.0)
+    assert e == pytest.approx(10.0, abs=1e-3)
+    assert k == pytest.approx(10.0, abs=0.5)
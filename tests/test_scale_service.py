@@ -0,0 +1,42 @@
+import asyncio
+import json
+import pytest
+from libs.hx711_sim import LoadModel
+from scale_service import Scale, ScaleConfig
+
+def simulated_scale(tmp_path, base_mass=120.0):
+    model = LoadModel(base_mass=base_mass, noise=0.0, sps=200, glitch_probability=0)
+    config = ScaleConfig(name='mug', data_pin=5, clock_pin=6, reference_unit=400, zero_value=0, unit='g',
+                         socket_path=str(tmp_path / 'mug.sock'), filters='', backend='simulated',
+                         simulation=model)
+    return Scale(config, pi=None)
+
+async def next_frame(reader):
+    return json.loads(await asyncio.wait_for(reader.readline(), timeout=2))
+
+@pytest.mark.asyncio
+async def test_new_stream_does_not_tare_other_subscribers(tmp_path):
+    scale = simulated_scale(tmp_path)
+    server = await asyncio.start_unix_server(scale.handle_client, path=scale.config.socket_path)
+    async with server:
+        first_reader, first_writer = await asyncio.open_unix_connection(scale.config.socket_path)
+        first_writer.write(b'{"command": "stream_start", "zero": true}\n')
+        await first_writer.drain()
+        assert (await next_frame(first_reader))['weight'] == pytest.approx(0, abs=0.5)
+
+        # The scale's load goes up, then a second client (e.g. the dashboard) starts streaming
+        scale.hx.chip.model.base_mass += 30
+        second_reader, second_writer = await asyncio.open_unix_connection(scale.config.socket_path)
+        second_writer.write(b"stream_start\n")
+        await second_writer.drain()
+        assert (await next_frame(second_reader))['weight'] == pytest.approx(30, abs=0.5)
+        for _ in range(5):
+            frame = await next_frame(first_reader)
+        assert frame['weight'] == pytest.approx(30, abs=0.5)
+
+        for writer in (first_writer, second_writer):
+            writer.close()
+            await writer.wait_closed()
+        # Stream handlers notice the disconnect on their next write
+        await asyncio.sleep(0.1)
+    scale.hub.stop()
@@ -0,0 +1,78 @@
+import asyncio
+import threading
+import pytest
+from scale_stream import PublishGate, SampleHub, SampleRingBuffer, Sample
+
+@pytest.mark.asyncio
+async def test_hub_fans_each_sample_out_to_every_subscriber():
+    readings = iter([1.0, 2.0, 3.0])
+    released = threading.Event()
+
+    def read_weight():
+        # Three readings, then the reader thread waits for teardown
+        return next(readings, None) or (released.wait() and 0.0)
+
+    hub = SampleHub(read_weight)
+    try:
+        grinder = hub.subscribe()
+        dashboard = hub.subscribe()
+
+        first = [await grinder.get() for _ in range(3)]
+        second = [await dashboard.get() for _ in range(3)]
+        hub.unsubscribe(grinder)
+        hub.unsubscribe(dashboard)
+    finally:
+        released.set()
+        hub.stop()
+
+    assert [s.weight for s in first] == [1.0, 2.0, 3.0]
+    assert [s.weight for s in second] == [1.0, 2.0, 3.0]
+    assert hub.subscriber_count == 0
+    assert len(hub.buffer) >= 3
+
+@pytest.mark.asyncio
+async def test_publish_drops_oldest_sample_for_full_subscriber_only():
+    # The reader thread waits on this, so only the samples published below reach the queues
+    released = threading.Event()
+    hub = SampleHub(lambda: released.wait() and 0.0)
+    try:
+        slow = hub.subscribe(maxsize=2)
+        fast = hub.subscribe(maxsize=10)
+        for i in range(4):
+            hub.publish(Sample(float(i), float(i)))
+        assert [slow.get_nowait().weight for _ in range(slow.qsize())] == [2.0, 3.0]
+        assert fast.qsize() == 4
+
+        hub.unsubscribe(slow)
+        hub.publish(Sample(4.0, 4.0))
+        assert slow.empty() and fast.qsize() == 5
+        hub.unsubscribe(fast)
+    finally:
+        released.set()
+        hub.stop()
+
+def test_ring_buffer_returns_samples_oldest_first_after_wrapping():
+    buffer = SampleRingBuffer(capacity=4)
+    for i in range(6):
+        buffer.append(Sample(float(i), float(i) * 10, float(i)))
+
+    timestamps, weights, raw = buffer.arrays()
+    assert list(timestamps) == [2.0, 3.0, 4.0, 5.0]
+    assert list(weights) == [20.0, 30.0, 40.0, 50.0]
+    assert list(buffer.arrays(since=4.0)[0]) == [4.0, 5.0]
+    assert buffer.latest().timestamp == 5.0
+
+def test_publish_gate_suppresses_unchanged_readings_until_heartbeat():
+    gate = PublishGate(min_delta=0.05, heartbeat=1.0)
+    sent = [t for t, w in [(0.0, 10.0), (0.1, 10.01), (0.2, 10.2), (0.5, 10.2), (1.3, 10.21)]
+            if gate.should_send(w, t)]
+    assert sent == [0.0, 0.2, 1.3]
+
+def test_publish_gate_caps_rate():
+    gate = PublishGate(max_rate=2)
+    sent = [i / 8 for i in range(16) if gate.should_send(float(i), i / 8)]
+    assert sent == [0.0, 0.5, 1.0, 1.5]
+
+def test_publish_gate_without_limits_sends_everything():
+    gate = PublishGate()
+    assert all(gate.should_send(1.0, i / 100) for i in range(10))